@@ -1,22 +1,52 @@
 import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# One concurrency model for the whole process, shared with gunicorn_config.py.
+# eventlet/gevent must patch the standard library before anything else imports
+# it, so pymongo's socket I/O yields to other green threads instead of blocking.
+ASYNC_MODE = os.getenv('ASYNC_MODE', 'eventlet')
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+elif ASYNC_MODE != 'threading':
+    raise RuntimeError(f"Unsupported ASYNC_MODE {ASYNC_MODE!r}: use eventlet, gevent or threading")
+
 import re
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
-from flask_socketio import SocketIO, emit
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, make_response, Response, stream_with_context
+from flask_socketio import SocketIO, emit, join_room
 from werkzeug.exceptions import HTTPException
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 from bson import ObjectId
-from dotenv import load_dotenv
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-import io
+import tempfile
 import pandas as pd
 import logging
 from logging.handlers import RotatingFileHandler
-import html
+import threading
+import time
+import hashlib
+import base64
+from collections import OrderedDict, deque
+import multiprocessing
+import uuid
+import click
+import hmac
+import metrics
+import responses
+import migrations
+from migrations import migration
+import query_audit
+import rollups
+from query_audit import AUDIT_EVENT_ID, AUDIT_BRANCH
+from message_queue import socketio_queue_options
+from exports import iter_attendance_csv, run_export_job, ExportCache, EXPORT_PROJECTION
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -28,29 +58,83 @@ formatter = logging.Formatter(
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-# Load environment variables
-load_dotenv()
-
 app = Flask(__name__)
+metrics.init_app(app)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'default_secret')
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=10)
 MONGO_URI = os.getenv('MONGO_URI')
 ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'GDGADMIN')
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'DEPLOYX@2025')
+# Minimum gap between two update_counts broadcasts to the same event room (0 = emit immediately)
+COUNTS_FLUSH_INTERVAL = float(os.getenv('COUNTS_FLUSH_INTERVAL_MS', '250')) / 1000
+# How long a validated session is trusted before re-checking the admin in MongoDB
+SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', '30'))
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '1024'))
+# How often buffered last_active timestamps are written back to MongoDB
+LAST_ACTIVE_FLUSH_INTERVAL = float(os.getenv('LAST_ACTIVE_FLUSH_INTERVAL', '15'))
+# Rendered PDF/Excel/CSV files are cached on disk per attendance version
+EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'gdgoc_exports'))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv('EXPORT_CACHE_MAX_MB', '200')) * 1024 * 1024
+# How long an event roster stays in memory before it is reloaded, and how many events are kept
+ROSTER_INDEX_TTL = float(os.getenv('ROSTER_INDEX_TTL', '300'))
+ROSTER_INDEX_EVENTS = int(os.getenv('ROSTER_INDEX_EVENTS', '16'))
+# How long stored responses for Idempotency-Key replays are kept (TTL index)
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+# A key still 'pending' after this many seconds belongs to a crashed request and may be retried
+IDEMPOTENCY_PENDING_TIMEOUT = 30
+# Worker processes rendering exports, and how long export job records are kept
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '1'))
+EXPORT_JOB_TTL = int(os.getenv('EXPORT_JOB_TTL', '86400'))
+# Pub/sub backend shared by all workers (e.g. redis://host:6379/0); required for more than one worker
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+# How often the participation rollups fold in new attendance (0 disables), and how often they are rebuilt in full
+ROLLUP_INTERVAL = float(os.getenv('ROLLUP_INTERVAL', '900'))
+ROLLUP_FULL_INTERVAL = float(os.getenv('ROLLUP_FULL_INTERVAL', '86400'))
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+# Lets Prometheus scrape /metrics with "Authorization: Bearer <token>" instead of a GDGADMIN session
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
 
-# Connect to MongoDB with connection pooling
-client = MongoClient(MONGO_URI, maxPoolSize=100, retryWrites=True)
+responses.init_app(app, min_size=COMPRESS_MIN_BYTES)
+
+def connect_mongo(uri):
+    if uri and uri.startswith('mongomock://'):
+        # In-memory stand-in for benchmarks and trying the app without a database
+        # (pip install mongomock). Nothing is persisted and export workers cannot see it.
+        import inspect
+        import mongomock
+        import mongomock.collection
+        add_update = mongomock.collection.BulkOperationBuilder.add_update
+        if 'sort' not in inspect.signature(add_update).parameters:
+            # pymongo >= 4.11 passes sort= to bulk updates
+            mongomock.collection.BulkOperationBuilder.add_update = (
+                lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+            )
+        return mongomock.MongoClient()
+    # Connect to MongoDB with connection pooling
+    return MongoClient(uri, maxPoolSize=100, retryWrites=True, event_listeners=[metrics.MongoCommandListener()])
+
+client = connect_mongo(MONGO_URI)
 try:
     db = client.get_database()
 except:
     db = client['attendance_db']
+# Per-event roster membership; names and branches live once per student in student_registry
 students_col = db['students']
+registry_col = db['student_registry']
 attendance_col = db['attendance']
 events_col = db['events']
 admins_col = db['admins']
+event_stats_col = db['event_stats']
+arrival_buckets_col = db['arrival_buckets']
+participation_col = db[rollups.STUDENTS]
+event_participation_col = db[rollups.EVENTS]
+idempotency_col = db['idempotency_keys']
+export_jobs_col = db['export_jobs']
+migrations_col = db['migrations']
 
 # Initialize SocketIO with better concurrency settings
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE, **socketio_queue_options(SOCKETIO_MESSAGE_QUEUE))
 
 from functools import wraps
 def requires_super_admin(f):
@@ -61,6 +145,145 @@ def requires_super_admin(f):
         return f(*args, **kwargs)
     return decorated
 
+def idempotent(f):
+    """Replay the stored response when a write is retried with the same Idempotency-Key.
+
+    Keys are scoped to the endpoint and the admin. The first request stores a
+    pending marker, then its JSON response; retries get that response back
+    without running the handler again.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key or not session.get('logged_in'):
+            return f(*args, **kwargs)
+
+        doc_id = f"{request.endpoint}:{session.get('admin_id') or session.get('username')}:{key}"
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        now = datetime.now()
+        try:
+            idempotency_col.insert_one({'_id': doc_id, 'state': 'pending', 'request_hash': request_hash, 'created_at': now})
+        except DuplicateKeyError:
+            stored = idempotency_col.find_one({'_id': doc_id})
+            if stored and stored.get('request_hash') != request_hash:
+                return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+            if stored and stored.get('state') == 'done':
+                response = jsonify(stored['body'])
+                response.status_code = stored['status']
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            # Take over keys left pending by a request that never finished
+            claimed = idempotency_col.find_one_and_update(
+                {'_id': doc_id, 'state': 'pending', 'created_at': {'$lt': now - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT)}},
+                {'$set': {'created_at': now}}
+            )
+            if not claimed:
+                return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+
+        response = make_response(f(*args, **kwargs))
+        try:
+            if response.status_code < 500 and response.is_json:
+                idempotency_col.update_one(
+                    {'_id': doc_id},
+                    {'$set': {'state': 'done', 'status': response.status_code, 'body': response.get_json()}}
+                )
+            else:
+                # Let the client retry failed requests with the same key
+                idempotency_col.delete_one({'_id': doc_id})
+        except Exception as e:
+            logger.error(f"Error storing idempotent response for {request.endpoint}: {e}")
+        return response
+    return decorated
+
+class SessionCache:
+    """TTL + LRU cache of validated (admin_id, session_token) pairs.
+
+    A hit means the admin still exists and the token is the active one, so the
+    request can skip the admins_col lookup. Entries are dropped whenever login,
+    logout or admin deletion change the account.
+    """
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, admin_id, session_token):
+        with self.lock:
+            entry = self.entries.get(admin_id)
+            if not entry:
+                self.misses += 1
+                return None
+            if entry['expires'] < time.monotonic() or entry['session_token'] != session_token:
+                del self.entries[admin_id]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(admin_id)
+            self.hits += 1
+            return entry
+
+    def put(self, admin_id, session_token, last_active):
+        entry = {
+            'session_token': session_token,
+            'last_active': last_active,
+            'expires': time.monotonic() + self.ttl
+        }
+        with self.lock:
+            self.entries[admin_id] = entry
+            self.entries.move_to_end(admin_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, admin_id):
+        with self.lock:
+            self.entries.pop(str(admin_id), None)
+
+class LastActiveWriter:
+    """Buffers last_active updates and writes them back in one bulk_write per interval."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.started = False
+
+    def touch(self, admin_id, when):
+        with self.lock:
+            self.pending[admin_id] = when
+            if not self.started:
+                self.started = True
+                socketio.start_background_task(self._run)
+
+    def discard(self, admin_id):
+        with self.lock:
+            self.pending.pop(str(admin_id), None)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        ops = [
+            UpdateOne({'_id': ObjectId(admin_id)}, {'$max': {'last_active': when}})
+            for admin_id, when in pending.items()
+        ]
+        admins_col.bulk_write(ops, ordered=False)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing last_active updates: {e}")
+
+session_cache = SessionCache(SESSION_CACHE_TTL, SESSION_CACHE_SIZE)
+last_active_writer = LastActiveWriter(LAST_ACTIVE_FLUSH_INTERVAL)
+
 @app.before_request
 def check_session_timeout():
     if request.endpoint in ['static', 'login', 'logout']: 
@@ -72,28 +295,36 @@ def check_session_timeout():
         
         if admin_id:
             try:
-                admin = admins_col.find_one({'_id': ObjectId(admin_id)})
-                if not admin:
-                     session.clear()
-                     return redirect(url_for('login', error="Account disabled."))
-                
-                # Check for single device login via session token
-                # This ensures if the DB thinks token B is active, token A is kicked out
-                if admin.get('session_token') and admin.get('session_token') != session_token:
-                     session.clear()
-                     if request.path.startswith('/api/'):
-                         from flask import jsonify
-                         return jsonify({'error': 'Session ended because you logged in on another device.'}), 401
-                     return redirect(url_for('login', error="You were securely logged out because your account was accessed from another device."))
+                cached = session_cache.get(admin_id, session_token)
+                if cached is None:
+                    admin = admins_col.find_one(
+                        {'_id': ObjectId(admin_id)},
+                        {'session_token': 1, 'last_active': 1}
+                    )
+                    if not admin:
+                         session.clear()
+                         return redirect(url_for('login', error="Account disabled."))
+                    
+                    # Check for single device login via session token
+                    # This ensures if the DB thinks token B is active, token A is kicked out
+                    if admin.get('session_token') and admin.get('session_token') != session_token:
+                         session.clear()
+                         if request.path.startswith('/api/'):
+                             from flask import jsonify
+                             return jsonify({'error': 'Session ended because you logged in on another device.'}), 401
+                         return redirect(url_for('login', error="You were securely logged out because your account was accessed from another device."))
+
+                    cached = session_cache.put(admin_id, session_token, admin.get('last_active'))
                      
                 now = datetime.now()
                 # Roll the session cookie for the 10 min inactivity timeout
                 session.modified = True
                 
-                # Update last active in DB periodically (every 1 min)
-                last_active = admin.get('last_active')
+                # Update last active in DB periodically (every 1 min), written back in batches
+                last_active = cached['last_active']
                 if not last_active or (now - last_active) > timedelta(minutes=1):
-                     admins_col.update_one({'_id': ObjectId(admin_id)}, {'$set': {'last_active': now}})
+                     cached['last_active'] = now
+                     last_active_writer.touch(admin_id, now)
                 
             except Exception as e:
                 logger.error(f"Error checking session timeout: {e}")
@@ -142,17 +373,57 @@ BRANCH_MAP = {
     '06': 'CST'
 }
 
+# Legacy/short branch names merged into their canonical name
+BRANCH_ALIASES = {
+    'AIM': 'AIML',
+    'ME': 'MECH',
+    'CE': 'CIVIL'
+}
+
+# Students per bulk_write batch when importing a roster
+ROSTER_BULK_CHUNK = 1000
+
+# Largest number of roll numbers accepted by one /api/mark_attendance/batch call
+ATTENDANCE_BATCH_LIMIT = 500
+# attendee_delta entries sent per event and push; beyond that dashboards reload the list
+ATTENDEE_DELTA_LIMIT = 1000
+
+# Largest page size of /api/attendees
+ATTENDEES_PAGE_LIMIT = 1000
+
+# Cursor batch size for exports
+EXPORT_BATCH_SIZE = 1000
+
+# How often running export jobs are polled for progress
+EXPORT_PROGRESS_INTERVAL = 0.5
+# Unfinished export jobs whose server stopped renewing this lease are reported as failed
+EXPORT_JOB_LEASE = 30
+EXPORT_FORMATS = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv'
+}
+
+# Deleted events are purged in batches of this many documents, pausing in between
+PURGE_BATCH_SIZE = 1000
+PURGE_BATCH_PAUSE = 0.05
+# How often the purger looks for deleted events, and how long its claim on one lasts
+PURGE_POLL_INTERVAL = 5
+PURGE_LEASE_SECONDS = 60
+
+# Fields read by the roster index and the attendee list
+ROSTER_PROJECTION = {'_id': 0, 'rollNumber': 1}
+REGISTRY_PROJECTION = {'name': 1, 'branch': 1}
+ATTENDEE_PROJECTION = {'rollNumber': 1, 'name': 1, 'branch': 1, 'timestamp': 1}
+ARRIVAL_BUCKET_PROJECTION = {'_id': 0, 'minute': 1, 'total': 1, 'branch_counts': 1}
+# Most frequent attendees listed by the analytics summary
+ANALYTICS_TOP_STUDENTS = 10
+
 def normalize_branch(branch):
     if not branch:
         return branch
     b = str(branch).strip().upper()
-    if b in ('AIM', 'AIML'):
-        return 'AIML'
-    if b == 'ME':
-        return 'MECH'
-    if b == 'CE':
-        return 'CIVIL'
-    return b
+    return BRANCH_ALIASES.get(b, b)
 
 def clean_roll_number(roll):
     if not roll:
@@ -169,6 +440,92 @@ def detect_branch(roll_number):
     code = roll_number[6:8]
     return BRANCH_MAP.get(code, 'UNKNOWN')
 
+def prepare_roster(df):
+    """Clean, validate and de-duplicate an uploaded roster with vectorized pandas ops.
+
+    Applies the same rules as clean_roll_number/detect_branch/normalize_branch and
+    returns the student records plus a report with the skipped Excel row numbers.
+    """
+    # Excel row numbers (row 1 is the header)
+    row_numbers = pd.Series(range(2, len(df) + 2), index=df.index)
+
+    missing = df['Roll Number'].isna() | df['Name'].isna()
+    roll = (df['Roll Number'].astype(str).str.strip().str.upper()
+            .str.replace(r'\.0$', '', regex=True))
+    valid = ~missing & (roll != '')
+    duplicate = valid & roll.where(valid).duplicated(keep='first')
+    keep = valid & ~duplicate
+
+    roll = roll[keep]
+    detected = roll.str[6:8].map(BRANCH_MAP).where(roll.str.len() >= 8).fillna('UNKNOWN')
+    if 'Branch' in df.columns:
+        raw_branch = df.loc[keep, 'Branch']
+        branch = raw_branch.astype(str).str.strip().str.upper().where(raw_branch.notna(), detected)
+    else:
+        branch = detected
+    branch = branch.replace(BRANCH_ALIASES)
+
+    records = pd.DataFrame({
+        'rollNumber': roll,
+        'name': df.loc[keep, 'Name'].astype(str).str.strip(),
+        'branch': branch
+    }).to_dict('records')
+
+    report = {
+        'rows': len(df),
+        'duplicates': int(duplicate.sum()),
+        'duplicate_rows': row_numbers[duplicate].tolist(),
+        'invalid': int((~valid).sum()),
+        'invalid_rows': row_numbers[~valid].tolist()
+    }
+    return records, report
+
+def registry_lookup(roll_numbers):
+    """Name and branch of every registered student among roll_numbers."""
+    roll_numbers = list(roll_numbers)
+    found = {}
+    for start in range(0, len(roll_numbers), ROSTER_BULK_CHUNK):
+        chunk = roll_numbers[start:start + ROSTER_BULK_CHUNK]
+        for doc in registry_col.find({'_id': {'$in': chunk}}, REGISTRY_PROJECTION):
+            found[doc.pop('_id')] = doc
+    return found
+
+def bulk_upsert_students(records, event_id):
+    """Add roster records to an event in chunks of unordered bulk writes.
+
+    Only students that are new or whose name/branch changed are written to the
+    registry, and only roll numbers not yet on the event's roster get a
+    membership document. Re-uploading the same roster writes nothing.
+    """
+    result = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    members = {m['rollNumber'] for m in students_col.find({'eventId': event_id}, ROSTER_PROJECTION)}
+    for start in range(0, len(records), ROSTER_BULK_CHUNK):
+        chunk = records[start:start + ROSTER_BULK_CHUNK]
+        known = registry_lookup(r['rollNumber'] for r in chunk)
+        changed = [r for r in chunk if known.get(r['rollNumber']) != {'name': r['name'], 'branch': r['branch']}]
+        if changed:
+            now = datetime.now()
+            registry_col.bulk_write([
+                UpdateOne({'_id': r['rollNumber']}, {'$set': {'name': r['name'], 'branch': r['branch'], 'updated_at': now}}, upsert=True)
+                for r in changed
+            ], ordered=False)
+
+        new = [r['rollNumber'] for r in chunk if r['rollNumber'] not in members]
+        inserted = 0
+        if new:
+            try:
+                inserted = len(students_col.insert_many([{'rollNumber': r, 'eventId': event_id} for r in new], ordered=False).inserted_ids)
+            except BulkWriteError as e:
+                # Members added meanwhile (add_student) collide on the unique index
+                if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+                    raise
+                inserted = e.details['nInserted']
+        updated = sum(1 for r in changed if r['rollNumber'] in members)
+        result['inserted'] += inserted
+        result['updated'] += updated
+        result['unchanged'] += len(chunk) - len(new) - updated
+    return result
+
 def get_today_str():
     return datetime.now().strftime('%Y-%m-%d')
 
@@ -178,6 +535,10 @@ def index():
         return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
+def username_key(username):
+    """Normalized form of a username that logins match on and that must be unique."""
+    return username.strip().casefold()
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     error_msg = request.args.get('error')
@@ -197,8 +558,8 @@ def login():
         
         # Priority: Check database for admins
         try:
-            # Case insensitive username search
-            admin = admins_col.find_one({'username': {'$regex': f'^{username}$', '$options': 'i'}})
+            # Case insensitive username search on the normalized, uniquely indexed key
+            admin = admins_col.find_one({'username_key': username_key(username)})
             if admin:
                 # 1. Verify password first
                 if admin.get('password') != password:
@@ -217,6 +578,7 @@ def login():
                 new_token = secrets.token_hex(16)
                 
                 admins_col.update_one({'_id': admin['_id']}, {'$set': {'is_logged_in': True, 'session_token': new_token, 'last_active': now}})
+                session_cache.invalidate(admin['_id'])
                 session.clear() # Clear any residual session info
                 session.permanent = True # Uses PERMANENT_SESSION_LIFETIME for idle timeout
                 session['logged_in'] = True
@@ -236,8 +598,6 @@ def login():
 def admins_api():
     if request.method == 'GET':
         admins = list(admins_col.find({}, {'password': 0})) # Don't send passwords
-        for a in admins:
-            a['_id'] = str(a['_id'])
         return jsonify(admins)
         
     if request.method == 'POST':
@@ -245,15 +605,19 @@ def admins_api():
         if not data:
             return jsonify({'error': 'Invalid JSON or empty payload'}), 400
             
-        username = data.get('username')
+        username = (data.get('username') or '').strip()
         password = data.get('password')
         if not username or not password:
             return jsonify({'error': 'Username and Password required'}), 400
             
-        if admins_col.find_one({'username': username}):
+        # The unique username_key index rejects names differing only in case
+        try:
+            admins_col.insert_one({
+                'username': username, 'username_key': username_key(username),
+                'password': password, 'is_logged_in': False
+            })
+        except DuplicateKeyError:
             return jsonify({'error': 'Username already exists'}), 400
-            
-        admins_col.insert_one({'username': username, 'password': password, 'is_logged_in': False})
         return jsonify({'status': 'SUCCESS'})
 
 @app.route('/api/admins/<admin_id>', methods=['DELETE'])
@@ -269,6 +633,8 @@ def delete_admin_api(admin_id):
         return jsonify({'error': 'GDGADMIN cannot be deleted'}), 400
         
     res = admins_col.delete_one({'_id': ObjectId(admin_id)})
+    session_cache.invalidate(admin_id)
+    last_active_writer.discard(admin_id)
     if res.deleted_count > 0:
         return jsonify({'status': 'SUCCESS'})
     return jsonify({'error': 'Admin not found'}), 404
@@ -287,12 +653,125 @@ def logout():
             admins_col.update_one({'_id': ObjectId(admin_id)}, {'$set': {'is_logged_in': False}})
         except Exception:
             pass
+        session_cache.invalidate(admin_id)
     session.pop('logged_in', None)
     session.pop('admin_id', None)
     session.pop('username', None)
     return redirect(url_for('login'))
 
+class RosterIndex:
+    """In-memory roster (roll number -> name/branch) per event, loaded on the first scan.
+
+    A roster is the event's membership list joined with the student registry.
+    Each entry also remembers whether the event exists and is not deleted, so
+    writes to a deleted event are refused without another query.
+
+    Kept in sync by the roster endpoints of this process. Rosters are reloaded
+    after ROSTER_INDEX_TTL, and a miss is re-checked in MongoDB so students added
+    through another worker are still found.
+    """
+
+    def __init__(self, ttl, max_events):
+        self.ttl = ttl
+        self.max_events = max_events
+        self.events = OrderedDict()
+        self.load_locks = {}
+        self.lock = threading.Lock()
+
+    def _cached(self, event_id):
+        entry = self.events.get(event_id)
+        if entry and entry['expires'] > time.monotonic():
+            self.events.move_to_end(event_id)
+            return entry
+        return None
+
+    def _entry(self, event_id):
+        with self.lock:
+            entry = self._cached(event_id)
+            if entry is not None:
+                return entry
+            load_lock = self.load_locks.setdefault(event_id, threading.Lock())
+
+        # Only one request loads a given roster, the others wait for it
+        with load_lock:
+            with self.lock:
+                entry = self._cached(event_id)
+                if entry is not None:
+                    return entry
+
+            try:
+                live = event_exists(event_id)
+                students = registry_lookup(
+                    m['rollNumber'] for m in students_col.find({'eventId': event_id}, ROSTER_PROJECTION)
+                ) if live else {}
+
+                with self.lock:
+                    entry = {'students': students, 'live': live, 'expires': time.monotonic() + self.ttl}
+                    self.events[event_id] = entry
+                    self.events.move_to_end(event_id)
+                    while len(self.events) > self.max_events:
+                        self.events.popitem(last=False)
+                return entry
+            finally:
+                # Also after a failed load (e.g. a MongoDB timeout); the next scan retries it
+                with self.lock:
+                    self.load_locks.pop(event_id, None)
+
+    def _roster(self, event_id):
+        return self._entry(event_id)['students']
+
+    def is_live(self, event_id):
+        """False for unknown and deleted events."""
+        return self._entry(event_id)['live']
+
+    def lookup(self, event_id, roll_number):
+        student = self._roster(event_id).get(roll_number)
+        if student is None and students_col.find_one({'rollNumber': roll_number, 'eventId': event_id}, ROSTER_PROJECTION):
+            student = registry_lookup([roll_number]).get(roll_number)
+            if student:
+                self.add(event_id, roll_number, student)
+        return student
+
+    def lookup_many(self, event_id, roll_numbers):
+        roster = self._roster(event_id)
+        found = {r: roster[r] for r in roll_numbers if r in roster}
+        missing = [r for r in roll_numbers if r not in found]
+        if missing:
+            members = students_col.find({'eventId': event_id, 'rollNumber': {'$in': missing}}, ROSTER_PROJECTION)
+            for roll_number, student in registry_lookup(m['rollNumber'] for m in members).items():
+                self.add(event_id, roll_number, student)
+                found[roll_number] = student
+        return found
+
+    def add(self, event_id, roll_number, student):
+        with self.lock:
+            entry = self.events.get(event_id)
+            if entry:
+                entry['students'][roll_number] = student
+
+    def add_many(self, event_id, records):
+        """Add records to the event's roster; other cached rosters holding them see the new registry data too."""
+        with self.lock:
+            for cached_id, entry in self.events.items():
+                students = entry['students']
+                for r in records:
+                    if cached_id == event_id or r['rollNumber'] in students:
+                        students[r['rollNumber']] = {'name': r['name'], 'branch': r['branch']}
+
+    def remove(self, event_id, roll_number):
+        with self.lock:
+            entry = self.events.get(event_id)
+            if entry:
+                entry['students'].pop(roll_number, None)
+
+    def drop(self, event_id):
+        with self.lock:
+            self.events.pop(event_id, None)
+
+roster_index = RosterIndex(ROSTER_INDEX_TTL, ROSTER_INDEX_EVENTS)
+
 @app.route('/api/mark_attendance', methods=['POST'])
+@idempotent
 def mark_attendance_api():
     if not session.get('logged_in'):
         return jsonify({'error': 'Unauthorized'}), 401
@@ -316,19 +795,17 @@ def mark_attendance_api():
     today = get_today_str()
 
     try:
-        # Check for duplicate in this event
-        existing = attendance_col.find_one({'rollNumber': roll_number, 'eventId': event_id})
-        if existing:
-            return jsonify({'error': 'Duplicate attendance', 'already_marked': True}), 409
+        if not roster_index.is_live(event_id):
+            return jsonify({'error': 'Event not found'}), 404
 
-        # Check existence in students collection for this event
-        student = students_col.find_one({'rollNumber': roll_number, 'eventId': event_id})
+        # Check existence in the event roster
+        student = roster_index.lookup(event_id, roll_number)
         
         if not student:
             # Not found -> prompt to add
             return jsonify({'status': 'NOT_FOUND', 'roll_number': roll_number}), 404
         
-        # Mark attendance
+        # Mark attendance, duplicates are rejected by the unique (rollNumber, eventId) index
         attendance_record = {
             'rollNumber': roll_number,
             'name': student.get('name', 'Unknown'),
@@ -338,27 +815,116 @@ def mark_attendance_api():
             'timestamp': datetime.now()
         }
         attendance_col.insert_one(attendance_record)
+        version = update_event_stats(event_id, attendance={attendance_record['branch']: 1})
+        record_arrivals(event_id, [attendance_record])
+        record_attendee_deltas(event_id, version, [attendance_record], 'add')
         
         # Emit update
         emit_counts(event_id)
         
         return jsonify({'status': 'SUCCESS', 'name': student.get('name'), 'branch': student.get('branch')})
+    except DuplicateKeyError:
+        return jsonify({'error': 'Duplicate attendance', 'already_marked': True}), 409
     except Exception as e:
-        # Check for duplicate key error from MongoDB if race condition occurs
-        if 'duplicate key error' in str(e).lower():
-            return jsonify({'error': 'Duplicate attendance', 'already_marked': True}), 409
         logger.error(f"Error in mark_attendance_api for {roll_number}: {e}")
         return jsonify({'error': 'Internal Server Error', 'details': "Could not record attendance"}), 500
 
+@app.route('/api/mark_attendance/batch', methods=['POST'])
+@idempotent
+def mark_attendance_batch_api():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    data = request.json
+    if not data:
+        return jsonify({'error': 'Invalid JSON or empty payload'}), 400
+
+    event_id = data.get('event_id')
+    roll_numbers = data.get('roll_numbers')
+    if not event_id or not isinstance(roll_numbers, list) or not roll_numbers:
+        return jsonify({'error': 'Event ID and a list of roll numbers required'}), 400
+    if len(roll_numbers) > ATTENDANCE_BATCH_LIMIT:
+        return jsonify({'error': f'At most {ATTENDANCE_BATCH_LIMIT} roll numbers per batch'}), 400
+
+    # Same validation rules as the single scan endpoint
+    results = []
+    valid = {}
+    for raw in roll_numbers:
+        roll_number = clean_roll_number(raw)
+        result = {'roll_number': roll_number}
+        results.append(result)
+        if not roll_number:
+            result.update(status='INVALID', error='Roll number required')
+        elif len(roll_number) < 8:
+            result.update(status='INVALID', error='Roll Number too short')
+        elif roll_number in valid:
+            result['status'] = 'DUPLICATE'
+        else:
+            valid[roll_number] = result
+
+    try:
+        if not roster_index.is_live(event_id):
+            return jsonify({'error': 'Event not found'}), 404
+        students = roster_index.lookup_many(event_id, list(valid))
+        today = get_today_str()
+        now = datetime.now()
+        records = []
+        for roll_number, result in valid.items():
+            student = students.get(roll_number)
+            if not student:
+                result['status'] = 'NOT_FOUND'
+                continue
+            result.update(status='SUCCESS', name=student.get('name'), branch=student.get('branch'))
+            records.append({
+                'rollNumber': roll_number,
+                'name': student.get('name', 'Unknown'),
+                'branch': normalize_branch(student.get('branch', detect_branch(roll_number))),
+                'date': today,
+                'eventId': event_id,
+                'timestamp': now
+            })
+
+        failed = {}
+        if records:
+            try:
+                attendance_col.insert_many(records, ordered=False)
+            except BulkWriteError as e:
+                failed = {err['index']: err.get('code') for err in e.details.get('writeErrors', [])}
+
+        branch_deltas = {}
+        inserted = []
+        for idx, record in enumerate(records):
+            result = valid[record['rollNumber']]
+            if idx in failed:
+                result.pop('name', None)
+                result.pop('branch', None)
+                result['status'] = 'DUPLICATE' if failed[idx] == 11000 else 'ERROR'
+                continue
+            branch_deltas[record['branch']] = branch_deltas.get(record['branch'], 0) + 1
+            inserted.append(record)
+
+        if branch_deltas:
+            version = update_event_stats(event_id, attendance=branch_deltas)
+            record_arrivals(event_id, inserted)
+            record_attendee_deltas(event_id, version, inserted, 'add')
+            emit_counts(event_id)
+    except Exception as e:
+        logger.error(f"Error in mark_attendance_batch_api for event {event_id}: {e}")
+        return jsonify({'error': 'Internal Server Error', 'details': "Could not record attendance"}), 500
+
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return jsonify({'status': 'SUCCESS', 'results': results, 'summary': summary})
+
 @app.route('/api/events', methods=['GET', 'POST'])
 def events_api():
     if not session.get('logged_in'):
         return jsonify({'error': 'Unauthorized'}), 401
         
     if request.method == 'GET':
-        events = list(events_col.find().sort('created_at', -1))
-        for e in events:
-            e['_id'] = str(e['_id'])
+        # Deleted events stay behind as tombstones until they are purged
+        events = list(events_col.find({'deleted_at': {'$exists': False}}, {'purge': 0}).sort('created_at', -1))
         return jsonify(events)
         
     if request.method == 'POST':
@@ -381,6 +947,152 @@ def events_api():
         res = events_col.insert_one(event)
         return jsonify({'status': 'SUCCESS', 'event_id': str(res.inserted_id)})
 
+def find_event(event_id):
+    """The event document, or None for unknown and deleted events."""
+    return events_col.find_one({'_id': ObjectId(event_id), 'deleted_at': {'$exists': False}})
+
+def event_exists(event_id):
+    return ObjectId.is_valid(event_id) and find_event(event_id) is not None
+
+class EventPurger:
+    """Removes the roster and attendance of deleted events in the background.
+
+    Deleting an event only marks it as a tombstone. The purger claims one
+    tombstone at a time with a lease on the event document, so a single
+    worker purges each event, and deletes its documents in batches of
+    PURGE_BATCH_SIZE ids, recording progress on the tombstone. Batches only
+    ever remove what is left, so a purge interrupted by a restart is picked up
+    again by the next worker that polls. Workers that cached the event before
+    it was deleted may accept writes for up to ROSTER_INDEX_TTL, so the purge
+    sweeps once more after that before it is done.
+    """
+
+    def __init__(self, batch_size, pause, interval, lease):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.lease = lease
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        socketio.start_background_task(self._run)
+
+    def pending(self):
+        return events_col.count_documents({'purge.state': {'$in': ['pending', 'running']}})
+
+    def _claim(self):
+        now = datetime.now()
+        return events_col.find_one_and_update(
+            {
+                'purge.state': {'$in': ['pending', 'running']},
+                '$or': [{'purge.lease_until': None}, {'purge.lease_until': {'$lt': now}}]
+            },
+            {'$set': {
+                'purge.state': 'running',
+                'purge.owner': self.owner,
+                'purge.lease_until': now + timedelta(seconds=self.lease)
+            }},
+            sort=[('deleted_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def purge(self, event):
+        """Purge one claimed event; returns False when the lease was lost to another worker."""
+        event_id = str(event['_id'])
+        while True:
+            event = self._sweep(event)
+            if event is None:
+                return False
+            settle = (event['deleted_at'] + timedelta(seconds=ROSTER_INDEX_TTL) - datetime.now()).total_seconds()
+            if settle <= 0:
+                break
+            socketio.sleep(min(settle, self.lease / 2))
+            event = self._renew(event)
+            if event is None:
+                return False
+
+        event_stats_col.delete_one({'_id': event_id})
+        arrival_buckets_col.delete_many({'eventId': event_id})
+        roster_index.drop(event_id)
+        event = events_col.find_one_and_update(
+            {'_id': event['_id'], 'purge.owner': self.owner},
+            {'$set': {'purge.state': 'done', 'purge.finished_at': datetime.now()}, '$unset': {'purge.lease_until': ''}},
+            return_document=ReturnDocument.AFTER
+        )
+        if event is None:
+            return False
+        self._notify(event)
+        logger.info(f"Purged deleted event {event_id}: {event['purge'].get('deleted', {})}")
+        return True
+
+    def _renew(self, event):
+        return events_col.find_one_and_update(
+            {'_id': event['_id'], 'purge.owner': self.owner},
+            {'$set': {'purge.lease_until': datetime.now() + timedelta(seconds=self.lease)}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _sweep(self, event):
+        """Delete the event's remaining roster and attendance; returns None when the lease was lost."""
+        event_id = str(event['_id'])
+        for name, collection in (('students', students_col), ('attendance', attendance_col)):
+            while True:
+                ids = [d['_id'] for d in collection.find({'eventId': event_id}, {'_id': 1}).limit(self.batch_size)]
+                if not ids:
+                    break
+                res = collection.delete_many({'_id': {'$in': ids}, 'eventId': event_id})
+                event = events_col.find_one_and_update(
+                    {'_id': event['_id'], 'purge.owner': self.owner},
+                    {
+                        '$inc': {f'purge.deleted.{name}': res.deleted_count},
+                        '$set': {'purge.lease_until': datetime.now() + timedelta(seconds=self.lease)}
+                    },
+                    return_document=ReturnDocument.AFTER
+                )
+                if event is None:
+                    return None
+                self._notify(event)
+                socketio.sleep(self.pause)
+        return event
+
+    def _notify(self, event):
+        requested_by = event['purge'].get('requested_by')
+        if requested_by:
+            socketio.emit('event_purge', purge_payload(event), room=admin_room(requested_by))
+            metrics.SOCKETIO_EMITS.inc(event='event_purge')
+
+    def _run(self):
+        while True:
+            try:
+                while True:
+                    event = self._claim()
+                    if event is None:
+                        break
+                    self.purge(event)
+            except Exception as e:
+                logger.error(f"ERROR: event purge failed: {e}")
+            socketio.sleep(self.interval)
+
+event_purger = EventPurger(PURGE_BATCH_SIZE, PURGE_BATCH_PAUSE, PURGE_POLL_INTERVAL, PURGE_LEASE_SECONDS)
+
+def purge_payload(event):
+    purge = event.get('purge', {})
+    return {
+        'event_id': str(event['_id']),
+        'name': event.get('name'),
+        'state': purge.get('state'),
+        'deleted': purge.get('deleted', {}),
+        'total': purge.get('total', {}),
+        'deleted_at': event['deleted_at'].isoformat() if event.get('deleted_at') else None,
+        'finished_at': purge['finished_at'].isoformat() if purge.get('finished_at') else None
+    }
+
 @app.route('/api/events/<event_id>', methods=['DELETE'])
 @requires_super_admin
 def delete_event_api(event_id):
@@ -388,21 +1100,46 @@ def delete_event_api(event_id):
     if not ObjectId.is_valid(event_id):
         return jsonify({'error': 'Invalid Event ID'}), 400
     try:
-        # Cascade delete
-        # 1. Delete Students
-        students_col.delete_many({'eventId': event_id})
-        # 2. Delete Attendance
-        attendance_col.delete_many({'eventId': event_id})
-        # 3. Delete Event
-        res = events_col.delete_one({'_id': ObjectId(event_id)})
-        
-        if res.deleted_count > 0:
-            return jsonify({'status': 'SUCCESS', 'message': f'Event {event_id} and all associated data deleted.'})
-        else:
+        # Tombstone the event now; its roster and attendance are purged in the background
+        totals = {
+            'students': students_col.count_documents({'eventId': event_id}),
+            'attendance': attendance_col.count_documents({'eventId': event_id})
+        }
+        event = events_col.find_one_and_update(
+            {'_id': ObjectId(event_id), 'deleted_at': {'$exists': False}},
+            {'$set': {
+                'deleted_at': datetime.now(),
+                'purge': {
+                    'state': 'pending',
+                    'requested_by': session.get('admin_id'),
+                    'total': totals,
+                    'deleted': {'students': 0, 'attendance': 0}
+                }
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+        if event is None:
             return jsonify({'error': 'Event not found'}), 404
+        roster_index.drop(event_id)
+        event_purger.start()
+        return jsonify({
+            'status': 'SUCCESS',
+            'message': f'Event {event_id} deleted. Its {totals["students"]} students and {totals["attendance"]} attendance records are being removed.',
+            'purge': purge_payload(event)
+        }), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/events/<event_id>/purge')
+@requires_super_admin
+def event_purge_status_api(event_id):
+    if not ObjectId.is_valid(event_id):
+        return jsonify({'error': 'Invalid Event ID'}), 400
+    event = events_col.find_one({'_id': ObjectId(event_id), 'deleted_at': {'$exists': True}})
+    if not event:
+        return jsonify({'error': 'No deletion found for this event'}), 404
+    return jsonify(purge_payload(event))
+
 @app.route('/api/upload_students', methods=['POST'])
 @requires_super_admin
 def upload_students():
@@ -411,6 +1148,8 @@ def upload_students():
     event_id = request.form.get('event_id')
     if not event_id:
         return jsonify({'error': 'No event selected'}), 400
+    if not event_exists(event_id):
+        return jsonify({'error': 'Event not found'}), 404
         
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
@@ -429,54 +1168,21 @@ def upload_students():
             if not all(c in df.columns for c in required):
                 return jsonify({'error': f'Excel must contain: {", ".join(required)}'}), 400
                 
-            student_records = []
-            seen_rolls = set()
-            duplicates_count = 0
-            
-            for _, row in df.iterrows():
-                roll_raw = row.get('Roll Number')
-                name_raw = row.get('Name')
-                
-                if pd.isna(roll_raw) or pd.isna(name_raw):
-                    continue
-                    
-                roll = clean_roll_number(roll_raw)
-                
-                if not roll:
-                    continue
-                    
-                if roll in seen_rolls:
-                    duplicates_count += 1
-                    continue
-                    
-                seen_rolls.add(roll)
-                name = str(name_raw).strip()
-                raw_branch = row.get('Branch')
-                if pd.isna(raw_branch) or raw_branch is None:
-                    branch = normalize_branch(detect_branch(roll))
-                else:
-                    branch = normalize_branch(str(raw_branch).strip().upper())
-                
-                student_records.append({
-                    'rollNumber': roll,
-                    'name': name,
-                    'branch': branch,
-                    'eventId': event_id
-                })
-            
-            if student_records:
-                for s in student_records:
-                    students_col.update_one(
-                        {'rollNumber': s['rollNumber'], 'eventId': event_id},
-                        {'$set': s},
-                        upsert=True
-                    )
+            with metrics.UPLOAD_DURATION.time():
+                student_records, report = prepare_roster(df)
+                report.update(bulk_upsert_students(student_records, event_id))
+                roster_index.add_many(event_id, student_records)
+                update_event_stats(event_id, students=report['inserted'])
+            for outcome in ('inserted', 'updated', 'unchanged', 'duplicates', 'invalid'):
+                metrics.UPLOAD_ROWS.inc(report[outcome], outcome=outcome)
                     
             msg = f"Successfully registered {len(student_records)} students."
-            if duplicates_count > 0:
-                msg += f" (Note: {duplicates_count} duplicate roll numbers were ignored in Excel)"
+            if report['duplicates'] > 0:
+                msg += f" (Note: {report['duplicates']} duplicate roll numbers were ignored in Excel)"
+            if report['invalid'] > 0:
+                msg += f" ({report['invalid']} rows without a roll number or name were skipped)"
                 
-            return jsonify({'status': 'SUCCESS', 'count': len(student_records), 'message': msg})
+            return jsonify({'status': 'SUCCESS', 'count': len(student_records), 'message': msg, 'result': report})
         except Exception as e:
             logger.error(f"Excel parsing error for event {event_id}: {str(e)}")
             return jsonify({'error': f'Invalid or corrupted Excel file. Details: {str(e)}'}), 400
@@ -484,6 +1190,7 @@ def upload_students():
     return jsonify({'error': 'Invalid file format'}), 400
 
 @app.route('/api/add_student', methods=['POST'])
+@idempotent
 def add_student_api():
     if not session.get('logged_in'):
         return jsonify({'error': 'Unauthorized'}), 401
@@ -499,27 +1206,49 @@ def add_student_api():
     if not roll_number or not name or not event_id:
         return jsonify({'error': 'Roll number, Name and Event ID required'}), 400
     try:
-        # Insert to students with normalization
-        branch = normalize_branch(detect_branch(roll_number))
-        students_col.update_one(
-            {'rollNumber': roll_number, 'eventId': event_id},
-            {'$set': {'name': name, 'branch': branch}},
-            upsert=True
-        )
-        
-        # Automatically mark attendance
+        if not roster_index.is_live(event_id):
+            return jsonify({'error': 'Event not found'}), 404
+        # A student already in the registry keeps their name and branch (e.g. from a roster sheet)
+        registered = registry_col.find_one({'_id': roll_number}, REGISTRY_PROJECTION) or {}
+        name = registered.get('name') or name
+        branch = normalize_branch(registered.get('branch') or detect_branch(roll_number))
+
+        # Attendance first: a duplicate (409) leaves the registry and roster untouched
         today = get_today_str()
         attendance_record = {
             'rollNumber': roll_number,
             'name': name,
-            'branch': normalize_branch(branch),
+            'branch': branch,
             'date': today,
             'eventId': event_id,
             'timestamp': datetime.now()
         }
         attendance_col.insert_one(attendance_record)
+
+        # Register new students and add them to the event roster
+        registry_col.update_one(
+            {'_id': roll_number},
+            {'$setOnInsert': {'name': name, 'branch': branch, 'updated_at': datetime.now()}},
+            upsert=True
+        )
+        res = students_col.update_one(
+            {'rollNumber': roll_number, 'eventId': event_id},
+            {'$setOnInsert': {'rollNumber': roll_number, 'eventId': event_id}},
+            upsert=True
+        )
+        roster_index.add_many(event_id, [{'rollNumber': roll_number, 'name': name, 'branch': branch}])
+
+        version = update_event_stats(
+            event_id,
+            attendance={branch: 1},
+            students=1 if res.upserted_id is not None else 0
+        )
+        record_arrivals(event_id, [attendance_record])
+        record_attendee_deltas(event_id, version, [attendance_record], 'add')
         emit_counts(event_id)
         return jsonify({'status': 'SUCCESS', 'message': 'Student added and attendance marked'})
+    except DuplicateKeyError:
+        return jsonify({'error': 'Duplicate attendance', 'already_marked': True}), 409
     except Exception as e:
         logger.error(f"Error in add_student_api for {roll_number}: {e}")
         return jsonify({'error': 'Internal Server Error', 'details': "Could not add student"}), 500
@@ -539,13 +1268,27 @@ def delete_student_api():
         
         if not roll_number or not event_id:
             return jsonify({'error': 'Roll number and Event ID required'}), 400
+        if not roster_index.is_live(event_id):
+            return jsonify({'error': 'Event not found'}), 404
         
-        # Delete from students
+        # Remove from the event roster; the registry keeps the student for other events
         res_s = students_col.delete_one({'rollNumber': roll_number, 'eventId': event_id})
-        # Delete from attendance
-        res_a = attendance_col.delete_many({'rollNumber': roll_number, 'eventId': event_id})
+        roster_index.remove(event_id, roll_number)
+        # Delete from attendance (unique per roll number and event)
+        removed = attendance_col.find_one_and_delete(
+            {'rollNumber': roll_number, 'eventId': event_id},
+            projection={'rollNumber': 1, 'name': 1, 'branch': 1, 'timestamp': 1}
+        )
         
-        if res_s.deleted_count > 0 or res_a.deleted_count > 0:
+        if res_s.deleted_count > 0 or removed:
+            version = update_event_stats(
+                event_id,
+                attendance={removed.get('branch'): -1} if removed else None,
+                students=-res_s.deleted_count
+            )
+            if removed:
+                record_arrivals(event_id, [removed], -1)
+                record_attendee_deltas(event_id, version, [removed], 'remove')
             emit_counts(event_id)
             return jsonify({'status': 'SUCCESS', 'message': f'Deleted {roll_number}'})
         else:
@@ -565,20 +1308,71 @@ def get_attendees():
     if not event_id:
         return jsonify({'error': 'Event ID required'}), 400
         
+    # Every response is a page; without a limit it is as large as allowed
+    try:
+        limit = int(request.args.get('limit', ATTENDEES_PAGE_LIMIT))
+    except ValueError:
+        limit = 0
+    since = request.args.get('since')
+    if not 0 < limit <= ATTENDEES_PAGE_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {ATTENDEES_PAGE_LIMIT}'}), 400
+
+    # Attendance version changes on every attendance write, so it identifies the list
+    version = get_attendance_version(event_id)
+    etag = hashlib.md5(f"{version}:{request.full_path}".encode()).hexdigest()
+    # Compressed responses carry the tag weakly (see responses.py)
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+
     query = {'eventId': event_id}
     if branch and branch != 'ALL':
         query['branch'] = normalize_branch(branch)
-        
-    records = list(attendance_col.find(query))
+
+    position = 0
+    if since:
+        try:
+            since_ts, since_id, position = decode_attendee_cursor(since)
+        except Exception:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if since_ts is None:
+            query['$or'] = [{'timestamp': None, '_id': {'$gt': since_id}}, {'timestamp': {'$ne': None}}]
+        else:
+            query['$or'] = [{'timestamp': {'$gt': since_ts}}, {'timestamp': since_ts, '_id': {'$gt': since_id}}]
+
+    cursor = attendance_col.find(query, ATTENDEE_PROJECTION).sort([('timestamp', 1), ('_id', 1)]).limit(limit + 1)
+
     result = []
-    for idx, r in enumerate(records, 1):
+    next_cursor = since
+    has_more = False
+    for idx, r in enumerate(cursor, position + 1):
+        if len(result) == limit:
+            has_more = True
+            break
         result.append({
             's_no': idx,
             'rollResult': r.get('rollNumber'),
             'name': r.get('name'),
             'branch': r.get('branch')
         })
-    return jsonify(result)
+        next_cursor = encode_attendee_cursor(r, idx)
+
+    response = jsonify({'items': result, 'next_cursor': next_cursor, 'has_more': has_more, 'version': version})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def encode_attendee_cursor(record, position):
+    """Opaque keyset cursor: (timestamp, _id) of a record plus its S.No."""
+    ts = record.get('timestamp')
+    raw = f"{ts.isoformat() if isinstance(ts, datetime) else ''}|{record['_id']}|{position}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_attendee_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    ts, record_id, position = raw.split('|')
+    return (datetime.fromisoformat(ts) if ts else None), ObjectId(record_id), int(position)
 
 @app.route('/api/stats')
 def get_stats():
@@ -589,59 +1383,354 @@ def get_stats():
     if not event_id:
         return jsonify({'total': 0, 'branch_counts': {}, 'total_students': 0})
         
-    total = attendance_col.count_documents({'eventId': event_id})
+    return jsonify(get_event_stats(event_id))
+
+@app.route('/api/stats/timeline')
+def get_stats_timeline():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    event_id = request.args.get('event_id')
+    if not event_id:
+        return jsonify({'error': 'Event ID required'}), 400
+    branch = request.args.get('branch')
+    branch = normalize_branch(branch.upper()) if branch and branch.upper() != 'ALL' else None
+    since = request.args.get('since')
+    if since:
+        try:
+            since = _arrival_minute(datetime.fromisoformat(since))
+        except ValueError:
+            return jsonify({'error': 'Invalid since, expected an ISO timestamp'}), 400
+
+    return jsonify({
+        'event_id': event_id,
+        'branch': branch or 'ALL',
+        'bucket_seconds': 60,
+        'buckets': get_arrival_buckets(event_id, since=since or None, branch=branch)
+    })
+
+@socketio.on('join_event')
+def on_join(data):
+    event_id = data.get('event_id')
+    if event_id:
+        join_room(event_id)
+        # print(f"Client joined room: {event_id}")
+
+@socketio.on('connect')
+def on_connect():
+    # Personal room used for export progress
+    if session.get('logged_in') and session.get('admin_id'):
+        join_room(admin_room(session['admin_id']))
+
+def admin_room(admin_id):
+    return f"admin:{admin_id}"
+
+def _branch_counts_key(branch):
+    # Branch names become keys of the branch_counts sub-document
+    key = str(branch or 'UNKNOWN').replace('.', '').replace('$', '')
+    return key or 'UNKNOWN'
+
+def rebuild_event_stats(event_id):
+    """Recompute the materialized stats document of an event from attendance/students."""
     pipeline = [
         {'$match': {'eventId': event_id}},
         {'$group': {'_id': '$branch', 'count': {'$sum': 1}}}
     ]
-    branch_counts = {item['_id']: item['count'] for item in attendance_col.aggregate(pipeline)}
+    total = 0
+    branch_counts = {}
+    for item in attendance_col.aggregate(pipeline):
+        key = _branch_counts_key(item['_id'])
+        branch_counts[key] = branch_counts.get(key, 0) + item['count']
+        total += item['count']
+
+    stats = {
+        'total': total,
+        'branch_counts': branch_counts,
+        'total_students': students_col.count_documents({'eventId': event_id}),
+        'rebuilt_at': datetime.now()
+    }
+    # The version keeps increasing so clients never see an old version number again
+    return event_stats_col.find_one_and_update(
+        {'_id': event_id},
+        {'$set': stats, '$inc': {'version': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+def update_event_stats(event_id, attendance=None, students=0):
+    """Apply attendance ({branch: delta}) and roster size deltas with a single $inc.
+
+    Every attendance record added or removed also bumps the event's attendance version.
+    Returns the new version, or None when the stats had to be rebuilt or could not be updated.
+    """
+    inc = {}
+    for branch, delta in (attendance or {}).items():
+        if delta:
+            field = f'branch_counts.{_branch_counts_key(branch)}'
+            inc[field] = inc.get(field, 0) + delta
+            inc['total'] = inc.get('total', 0) + delta
+            inc['version'] = inc.get('version', 0) + abs(delta)
+    if students:
+        inc['total_students'] = students
+    if not inc:
+        return None
+
+    try:
+        stats = event_stats_col.find_one_and_update(
+            {'_id': event_id}, {'$inc': inc},
+            projection={'version': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if stats is None:
+            # No stats yet for this event (new event or created before stats existed)
+            load_event_stats(event_id)
+            return None
+        return stats.get('version')
+    except Exception as e:
+        logger.error(f"ERROR: update_event_stats failed for event {event_id}: {e}")
+        return None
+
+def record_attendee_deltas(event_id, version, records, op):
+    """Queue attendee_delta entries for records added (op='add') or removed (op='remove').
+
+    The $inc that returned `version` counted each record once, so the records
+    take the sequence numbers version - len(records) + 1 .. version in order.
+    """
+    if version is None or not records:
+        return
+    first = version - len(records) + 1
+    attendee_changes.add(event_id, [
+        {'seq': first + i, 'op': op, 'rollNumber': r.get('rollNumber'), 'name': r.get('name'), 'branch': r.get('branch')}
+        for i, r in enumerate(records)
+    ])
+
+def _arrival_minute(timestamp):
+    return timestamp.replace(second=0, microsecond=0)
+
+def record_arrivals(event_id, records, sign=1):
+    """Count attendance records added (sign=1) or removed (sign=-1) in the event's per-minute arrival buckets."""
+    deltas = {}
+    for record in records:
+        if not isinstance(record.get('timestamp'), datetime):
+            continue
+        bucket = deltas.setdefault(_arrival_minute(record['timestamp']), {})
+        key = _branch_counts_key(record.get('branch'))
+        bucket[key] = bucket.get(key, 0) + sign
+    if not deltas:
+        return
+    ops = []
+    for minute, branches in deltas.items():
+        inc = {f'branch_counts.{key}': delta for key, delta in branches.items()}
+        inc['total'] = sum(branches.values())
+        ops.append(UpdateOne({'eventId': event_id, 'minute': minute}, {'$inc': inc}, upsert=True))
+    try:
+        arrival_buckets_col.bulk_write(ops, ordered=False)
+        timeline_changes.add(event_id, deltas.keys())
+    except Exception as e:
+        logger.error(f"ERROR: record_arrivals failed for event {event_id}: {e}")
+
+def rebuild_arrival_buckets(event_id):
+    """Recompute an event's arrival buckets from its attendance records."""
+    buckets = {}
+    for record in attendance_col.find({'eventId': event_id}, {'_id': 0, 'branch': 1, 'timestamp': 1}):
+        if not isinstance(record.get('timestamp'), datetime):
+            continue
+        bucket = buckets.setdefault(_arrival_minute(record['timestamp']), {'total': 0, 'branch_counts': {}})
+        key = _branch_counts_key(record.get('branch'))
+        bucket['branch_counts'][key] = bucket['branch_counts'].get(key, 0) + 1
+        bucket['total'] += 1
+    arrival_buckets_col.delete_many({'eventId': event_id})
+    if buckets:
+        arrival_buckets_col.insert_many([
+            {'eventId': event_id, 'minute': minute, **bucket} for minute, bucket in sorted(buckets.items())
+        ])
+    return len(buckets)
+
+def get_arrival_buckets(event_id, since=None, minutes=None, branch=None):
+    """Per-minute check-in counts of an event, oldest first; minutes without check-ins are left out."""
+    query = {'eventId': event_id}
+    if minutes is not None:
+        query['minute'] = {'$in': sorted(minutes)}
+    elif since is not None:
+        query['minute'] = {'$gte': since}
+    result = []
+    for bucket in arrival_buckets_col.find(query, ARRIVAL_BUCKET_PROJECTION).sort('minute', 1):
+        branch_counts = bucket.get('branch_counts', {})
+        result.append({
+            'minute': bucket['minute'].isoformat(),
+            'count': branch_counts.get(_branch_counts_key(branch), 0) if branch else bucket.get('total', 0),
+            'branch_counts': branch_counts
+        })
+    return result
+
+class TimelineChanges:
+    """Minutes whose arrival buckets changed since the event's last update_timeline push."""
+
+    def __init__(self):
+        self.minutes = {}
+        self.lock = threading.Lock()
+
+    def add(self, event_id, minutes):
+        with self.lock:
+            self.minutes.setdefault(event_id, set()).update(minutes)
+
+    def pop(self, event_id):
+        with self.lock:
+            return self.minutes.pop(event_id, None)
+
+timeline_changes = TimelineChanges()
+
+class AttendeeChanges:
+    """attendee_delta entries queued since the event's last push, at most ATTENDEE_DELTA_LIMIT per event.
+
+    An event that overflows sends none; dashboards see its version jump in
+    update_counts and reload the list instead.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.deltas = {}
+        self.lock = threading.Lock()
+
+    def add(self, event_id, deltas):
+        with self.lock:
+            queued = self.deltas.setdefault(event_id, [])
+            if queued is not None and len(queued) + len(deltas) <= self.limit:
+                queued.extend(deltas)
+            else:
+                self.deltas[event_id] = None
+
+    def pop(self, event_id):
+        with self.lock:
+            deltas = self.deltas.pop(event_id, None)
+        return sorted(deltas, key=lambda d: d['seq']) if deltas else None
+
+attendee_changes = AttendeeChanges(ATTENDEE_DELTA_LIMIT)
+
+def load_event_stats(event_id, projection=None):
+    """The event's stats document, rebuilt when missing; empty for unknown and deleted events."""
+    stats = event_stats_col.find_one({'_id': event_id}, projection)
+    if stats is None and event_exists(event_id):
+        stats = rebuild_event_stats(event_id)
+    return stats or {}
+
+def get_event_stats(event_id):
+    stats = load_event_stats(event_id)
+
+    branch_counts = dict(stats.get('branch_counts', {}))
+    # Ensure all branches are present
     for dept in BRANCH_MAP.values():
         if dept not in branch_counts:
             branch_counts[dept] = 0
-            
-    total_students = students_col.count_documents({'eventId': event_id})
-    return jsonify({'total': total, 'branch_counts': branch_counts, 'total_students': total_students})
 
-@socketio.on('join_event')
-def on_join(data):
-    event_id = data.get('event_id')
-    if event_id:
-        from flask_socketio import join_room
-        join_room(event_id)
-        # print(f"Client joined room: {event_id}")
+    return {
+        'total': stats.get('total', 0),
+        'branch_counts': branch_counts,
+        'total_students': stats.get('total_students', 0),
+        'version': stats.get('version', 0)
+    }
 
-def emit_counts(event_id):
+def get_attendance_version(event_id):
+    return load_event_stats(event_id, {'version': 1}).get('version', 0)
+
+def _emit_counts_now(event_id):
     try:
-        # Use aggregation for efficiency
-        pipeline = [
-            {'$match': {'eventId': event_id}},
-            {'$facet': {
-                'total': [{'$count': 'count'}],
-                'by_branch': [
-                    {'$group': {'_id': '$branch', 'count': {'$sum': 1}}}
-                ]
-            }}
-        ]
-        results = list(attendance_col.aggregate(pipeline))[0]
-        
-        total = results['total'][0]['count'] if results['total'] else 0
-        branch_counts = {item['_id']: item['count'] for item in results['by_branch']}
-        
-        # Ensure all branches are present
-        for dept in BRANCH_MAP.values():
-            if dept not in branch_counts:
-                branch_counts[dept] = 0
-                
-        total_students = students_col.count_documents({'eventId': event_id})
-        
-        socketio.emit('update_counts', {
-            'total': total, 
-            'branch_counts': branch_counts,
-            'total_students': total_students,
-            'event_id': event_id
-        }, to=event_id)
+        # Deltas go first: the version in update_counts tells dashboards whether they missed any
+        deltas = attendee_changes.pop(event_id)
+        if deltas:
+            socketio.emit('attendee_delta', {'event_id': event_id, 'deltas': deltas}, to=event_id)
+            metrics.SOCKETIO_EMITS.inc(event='attendee_delta')
+        payload = get_event_stats(event_id)
+        payload['event_id'] = event_id
+        socketio.emit('update_counts', payload, to=event_id)
+        metrics.SOCKETIO_EMITS.inc(event='update_counts')
+        # Arrival buckets changed by the same scans ride along with the counts
+        minutes = timeline_changes.pop(event_id)
+        if minutes:
+            socketio.emit('update_timeline', {'event_id': event_id, 'buckets': get_arrival_buckets(event_id, minutes=minutes)}, to=event_id)
+            metrics.SOCKETIO_EMITS.inc(event='update_timeline')
+        return True
     except Exception as e:
         logger.error(f"ERROR: emit_counts failed for event {event_id}: {e}")
+        return False
+
+class CountsBroadcaster:
+    """Coalesces update_counts broadcasts so each event room is flushed at most once per interval.
+
+    Request handlers only mark an event as dirty; a background task reads the
+    stats and emits them for every dirty event on each tick.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.started = False
+        self.counters = {'requested': 0, 'coalesced': 0, 'emitted': 0, 'failed': 0}
+
+    def mark(self, event_id):
+        if self.interval <= 0:
+            with self.lock:
+                self.counters['requested'] += 1
+            self._emit(event_id)
+            return
+        with self.lock:
+            self.counters['requested'] += 1
+            if event_id in self.dirty:
+                self.counters['coalesced'] += 1
+            else:
+                self.dirty.add(event_id)
+            if not self.started:
+                self.started = True
+                socketio.start_background_task(self._run)
+
+    def flush(self):
+        with self.lock:
+            events, self.dirty = self.dirty, set()
+        for event_id in events:
+            self._emit(event_id)
+
+    def _emit(self, event_id):
+        key = 'emitted' if _emit_counts_now(event_id) else 'failed'
+        with self.lock:
+            self.counters[key] += 1
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"ERROR: counts broadcaster flush failed: {e}")
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counters, pending=len(self.dirty), interval_ms=int(self.interval * 1000))
+
+counts_broadcaster = CountsBroadcaster(COUNTS_FLUSH_INTERVAL)
+
+def emit_counts(event_id):
+    # Broadcast is coalesced and sent from the background broadcaster
+    counts_broadcaster.mark(event_id)
+
+@app.route('/api/broadcast_stats')
+@requires_super_admin
+def broadcast_stats_api():
+    return jsonify(counts_broadcaster.snapshot())
+
+@app.cli.command('rebuild-stats')
+@click.option('--event', 'event_ids', multiple=True, help='Event ID to rebuild (default: all events).')
+def rebuild_stats_command(event_ids):
+    """Recompute event_stats documents from the attendance collection."""
+    if not event_ids:
+        event_ids = [str(e['_id']) for e in events_col.find({'deleted_at': {'$exists': False}}, {'_id': 1})]
+        # Drop stats left behind by events that no longer exist
+        event_stats_col.delete_many({'_id': {'$nin': list(event_ids)}})
+        arrival_buckets_col.delete_many({'eventId': {'$nin': list(event_ids)}})
+    for event_id in event_ids:
+        stats = rebuild_event_stats(event_id)
+        minutes = rebuild_arrival_buckets(event_id)
+        print(f"Rebuilt stats for event {event_id}: {stats['total']} present / {stats['total_students']} registered, {minutes} arrival minutes")
 
 
 @app.route('/download_pdf/<event_id>/<department>')
@@ -653,87 +1742,17 @@ def download_pdf(event_id, department):
     department = normalize_branch(department.upper())
     if not ObjectId.is_valid(event_id):
         return "Invalid Event", 400
-    event = events_col.find_one({'_id': ObjectId(event_id)})
+    event = find_event(event_id)
     if not event:
         return "Invalid Event", 400
         
-    query = {'eventId': event_id}
-    if department != 'ALL':
-        query['branch'] = department
-        
-    records = list(attendance_col.find(query).sort('timestamp', 1))
-    
     try:
-        # Generate PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Title
-        title_style = styles['Title']
-        title_style.leading = 24
-        title_style.alignment = 1 # TA_CENTER
-        
-        # Escape event name for Paragraph
-        safe_event_name = html.escape(event['name'])
-        # Use proper tags and ensure no accidental content inside br
-        header_text = (
-            "ATTENDANCE FOR THE<br/>"
-            f"{safe_event_name}<br/>"
-            " BY<br/>"
-            "GDGoc SVEC X AIKYAM<br/>"
-        )
-        
-        logger.info(f"Generating PDF for event: {event['name']} ({event_id}), dept: {department}")
-        elements.append(Paragraph(header_text, title_style))
-        elements.append(Spacer(1, 12))
-        
-        safe_dept = html.escape('All Branches' if department == 'ALL' else department)
-        elements.append(Paragraph(f"Category: {safe_dept}", styles['Heading2']))
-        elements.append(Paragraph(f"Date: {get_today_str()}", styles['Normal']))
-        elements.append(Paragraph(f"Total Students: {len(records)}", styles['Normal']))
-        elements.append(Spacer(1, 12))
-       
-        # Table Data
-        data = [['S.No', 'Roll Number', 'Name', 'Branch' if department == 'ALL' else '']]
-        if department != 'ALL':
-            data = [['S.No', 'Roll Number', 'Name']]
-            
-        for idx, record in enumerate(records, 1):
-            if department == 'ALL':
-                data.append([str(idx), record.get('rollNumber', ''), record.get('name', ''), record.get('branch', '')])
-            else:
-                data.append([str(idx), record.get('rollNumber', ''), record.get('name', '')])
-            
-        # Set column widths
-        col_widths = [50, 150, 300]
-        if department == 'ALL':
-            col_widths = [40, 120, 240, 100]
-            
-        table = Table(data, colWidths=col_widths)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.whitesmoke),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        elements.append(table)
-        
-        doc.build(elements)
-        buffer.seek(0)
-        
-        today_str = get_today_str()
-        filename = f"Attendance_{department}_{today_str}.pdf"
-        return send_file(buffer, as_attachment=True, download_name=filename, mimetype='application/pdf')
+        # Rendered by an export worker; export_progress events lead the dashboard to the file
+        job = export_jobs.submit(session.get('admin_id'), event, department, 'pdf')
     except Exception as e:
-        import traceback
-        logger.error(f"PDF Generation Error for event {event_id}: {str(e)}\n{traceback.format_exc()}")
-        return render_template('error.html', error=f"PDF Error: {str(e)}"), 500
+        logger.error(f"ERROR: could not queue pdf export for event {event_id}, dept: {department}: {e}")
+        return jsonify({'status': 'error', 'message': 'Could not start export'}), 500
+    return jsonify(export_job_payload(job)), 202
 
 @app.route('/download_full_excel/<event_id>')
 @requires_super_admin
@@ -743,106 +1762,715 @@ def download_full_excel(event_id):
     
     if not ObjectId.is_valid(event_id):
         return "Invalid Event", 400
-    event = events_col.find_one({'_id': ObjectId(event_id)})
+    event = find_event(event_id)
     if not event:
         return "Invalid Event", 400
         
-    attendance_records = list(attendance_col.find({'eventId': event_id}, {'_id': 0}))
-    
-    data = []
-    for r in attendance_records:
-        data.append({
-            'Roll Number': r.get('rollNumber', 'UNKNOWN'),
-            'Name': r.get('name', ''),
-            'Branch': r.get('branch', ''),
-            'Time': r.get('timestamp', '').strftime('%Y-%m-%dT%H:%M:%SZ') if isinstance(r.get('timestamp'), datetime) else str(r.get('time', ''))
-        })
-        
-    df = pd.DataFrame(data)
-    
-    # Output to BytesIO
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Present Students')
-        
-    output.seek(0)
-    
+    try:
+        job = export_jobs.submit(session.get('admin_id'), event, 'ALL', 'xlsx')
+    except Exception as e:
+        logger.error(f"ERROR: could not queue xlsx export for event {event_id}: {e}")
+        return jsonify({'status': 'error', 'message': 'Could not start export'}), 500
+    return jsonify(export_job_payload(job)), 202
+
+@app.route('/download_csv/<event_id>')
+@requires_super_admin
+def download_csv(event_id):
+    if not ObjectId.is_valid(event_id):
+        return "Invalid Event", 400
+    event = find_event(event_id)
+    if not event:
+        return "Invalid Event", 400
+
+    # Rows are sent while the cursor is still being read, and cached once complete
     today_str = get_today_str()
-    return send_file(output, as_attachment=True, download_name=f"Full_Student_Data_{today_str}.xlsx", mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    chunks = export_cache.stream(
+        export_cache_key(event_id, 'ALL', 'csv'),
+        'csv',
+        iter_attendance_csv(export_cursor(event_id))
+    )
+    return Response(
+        stream_with_context(chunks),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="Full_Student_Data_{today_str}.csv"'}
+    )
+
+export_cache = ExportCache(EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES)
+
+def export_cache_key(event_id, department, fmt):
+    # Today's date is printed in the PDF and used in file names
+    return (event_id, department, fmt, get_attendance_version(event_id), get_today_str())
+
+def export_cursor(event_id):
+    return attendance_col.find({'eventId': event_id}, EXPORT_PROJECTION).sort('timestamp', 1).batch_size(EXPORT_BATCH_SIZE)
+
+def export_filename(department, fmt):
+    today_str = get_today_str()
+    if fmt == 'pdf':
+        return f"Attendance_{department}_{today_str}.pdf"
+    return f"Full_Student_Data_{today_str}.{fmt}"
+
+class ExportJobs:
+    """Renders exports in worker processes so reportlab/openpyxl never block the server.
+
+    Each job runs run_export_job in its own spawned process, at most `workers`
+    at a time; later jobs wait in a FIFO queue. (A ProcessPoolExecutor is not
+    used: its management thread deadlocks under eventlet's monkey patching.)
+    Job state lives in the export_jobs collection, where the worker writes its
+    progress; a background task starts queued jobs, moves finished files into
+    the export cache and pushes export_progress events to the owner's admin room.
+
+    Unfinished jobs carry a lease (lease_until) that the background task of the
+    process running them renews. If that process stops, any worker reports the
+    job as failed once the lease has passed (see expire_export_job).
+    """
+
+    def __init__(self, workers, interval):
+        self.workers = max(1, workers)
+        self.interval = interval
+        self.running = {}
+        self.queue = deque()
+        self.lock = threading.Lock()
+        self.started = False
+        self.renewed = 0
+
+    def submit(self, owner, event, department, fmt):
+        """Create a job for an export; a cached file completes it immediately."""
+        event_id = str(event['_id'])
+        key = export_cache_key(event_id, department, fmt)
+        job = {
+            '_id': uuid.uuid4().hex,
+            'owner': owner,
+            'event_id': event_id,
+            'department': department,
+            'format': fmt,
+            'key': list(key),
+            'state': 'queued',
+            'done': 0,
+            'total': None,
+            'created_at': datetime.now(),
+            'lease_until': datetime.now() + timedelta(seconds=EXPORT_JOB_LEASE)
+        }
+
+        cached = export_cache.lookup(key, fmt)
+        if cached:
+            cached.close()
+            job.update(state='done', finished_at=datetime.now())
+            export_jobs_col.insert_one(job)
+            return job
+
+        export_jobs_col.insert_one(job)
+        logger.info(f"Queued {fmt} export {job['_id']} for event {event_id}, dept: {department}")
+        entry = {'job': job, 'event_name': event['name'], 'date_str': get_today_str(), 'process': None, 'tmp_path': None, 'seen': None}
+        with self.lock:
+            self.running[job['_id']] = entry
+            self.queue.append(job['_id'])
+            if not self.started:
+                self.started = True
+                socketio.start_background_task(self._run)
+        self._dispatch()
+        return job
+
+    def open(self, job):
+        if not job or job.get('state') != 'done':
+            return None
+        return export_cache.lookup(tuple(job['key']), job['format'])
+
+    def _dispatch(self):
+        """Start queued jobs while fewer than `workers` processes are running."""
+        with self.lock:
+            active = sum(1 for entry in self.running.values() if entry['process'] is not None)
+            starting = []
+            while self.queue and active < self.workers:
+                starting.append(self.running[self.queue.popleft()])
+                active += 1
+
+        for entry in starting:
+            job = entry['job']
+            try:
+                entry['tmp_path'] = export_cache.reserve()
+                # spawn: forking a process that holds MongoClient and socket threads is unsafe
+                process = multiprocessing.get_context('spawn').Process(
+                    target=run_export_job,
+                    args=(MONGO_URI, db.name, job['_id'], job['format'], job['event_id'],
+                          job['department'], entry['event_name'], entry['date_str'], entry['tmp_path']),
+                    daemon=True
+                )
+                process.start()
+                entry['process'] = process
+                entry['started'] = time.perf_counter()
+            except Exception as e:
+                logger.error(f"ERROR: could not start {job['format']} export {job['_id']}: {e}")
+                self._finish(job['_id'], entry, state='failed', error=str(e))
+
+    def _check(self, job_id, entry):
+        process, job = entry['process'], entry['job']
+        if process is None:
+            return
+        doc = export_jobs_col.find_one({'_id': job_id}, {'state': 1, 'done': 1, 'total': 1, 'error': 1}) or {}
+        if process.is_alive():
+            seen = (doc.get('state'), doc.get('done'), doc.get('total'))
+            if doc and seen != entry['seen']:
+                entry['seen'] = seen
+                job.update(state=doc['state'], done=doc.get('done', 0), total=doc.get('total'))
+                self._notify(job)
+            return
+
+        if process.exitcode == 0 and doc.get('state') == 'rendered':
+            export_cache.commit(entry['tmp_path'], tuple(job['key']), job['format']).close()
+            self._finish(job_id, entry, state='done', done=doc.get('total', 0), total=doc.get('total', 0))
+        else:
+            # Also a worker that exited without recording its result
+            error = doc.get('error') or f"export worker stopped before finishing (exit code {process.exitcode})"
+            logger.error(f"ERROR: {job['format']} export {job_id} failed: {error}")
+            self._finish(job_id, entry, state='failed', error=error)
+
+    def _finish(self, job_id, entry, **fields):
+        job = entry['job']
+        if fields['state'] != 'done' and entry['tmp_path']:
+            export_cache.discard(entry['tmp_path'])
+        job.update(fields, finished_at=datetime.now())
+        if entry.get('started'):
+            metrics.EXPORT_DURATION.observe(time.perf_counter() - entry['started'], format=job['format'], state=job['state'])
+        export_jobs_col.update_one({'_id': job_id}, {'$set': {
+            k: job.get(k) for k in ('state', 'done', 'total', 'error', 'finished_at')
+        }})
+        with self.lock:
+            self.running.pop(job_id, None)
+        self._notify(job)
+
+    def _notify(self, job):
+        if job.get('owner'):
+            socketio.emit('export_progress', export_job_payload(job), to=admin_room(job['owner']))
+            metrics.SOCKETIO_EMITS.inc(event='export_progress')
+
+    def _renew(self, job_ids):
+        if job_ids and time.monotonic() - self.renewed >= EXPORT_JOB_LEASE / 3:
+            self.renewed = time.monotonic()
+            export_jobs_col.update_many(
+                {'_id': {'$in': job_ids}},
+                {'$set': {'lease_until': datetime.now() + timedelta(seconds=EXPORT_JOB_LEASE)}}
+            )
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.interval)
+            with self.lock:
+                running = list(self.running.items())
+            try:
+                self._renew([job_id for job_id, _ in running])
+            except Exception as e:
+                logger.error(f"ERROR: export job lease renewal failed: {e}")
+            for job_id, entry in running:
+                try:
+                    self._check(job_id, entry)
+                except Exception as e:
+                    logger.error(f"ERROR: export job {job_id} poll failed: {e}")
+            self._dispatch()
+
+export_jobs = ExportJobs(EXPORT_WORKERS, EXPORT_PROGRESS_INTERVAL)
+
+def expire_export_job(job):
+    """Mark an unfinished job failed once the server running it stopped renewing its lease."""
+    if job['state'] in ('done', 'failed') or job.get('lease_until', datetime.max) > datetime.now():
+        return job
+    fields = {'state': 'failed', 'error': 'The server rendering this export stopped', 'finished_at': datetime.now()}
+    export_jobs_col.update_one({'_id': job['_id'], 'state': job['state'], 'lease_until': {'$lt': datetime.now()}}, {'$set': fields})
+    return dict(job, **fields)
+
+def export_job_payload(job):
+    payload = {
+        'job_id': job['_id'],
+        'event_id': job['event_id'],
+        'department': job['department'],
+        'format': job['format'],
+        'state': job['state'],
+        'done': job.get('done', 0),
+        'total': job.get('total')
+    }
+    if job.get('error'):
+        payload['error'] = job['error']
+    if job['state'] == 'done':
+        # Built by hand: progress events are sent outside of any request context
+        payload['download_url'] = f"/api/exports/{job['_id']}/download"
+    return payload
+
+@app.route('/api/exports', methods=['POST'])
+@requires_super_admin
+def submit_export_api():
+    data = request.json or {}
+    event_id = data.get('event_id')
+    fmt = str(data.get('format', 'pdf')).lower()
+    department = normalize_branch(str(data.get('department', 'ALL')).upper())
+
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt != 'pdf' and department != 'ALL':
+        return jsonify({'status': 'error', 'message': 'Branch exports are only available as PDF'}), 400
+    if not event_id or not ObjectId.is_valid(event_id):
+        return jsonify({'status': 'error', 'message': 'Invalid Event ID'}), 400
+    event = find_event(event_id)
+    if not event:
+        return jsonify({'status': 'error', 'message': 'Event not found'}), 404
 
-if __name__ == '__main__':
-    # Ensure indexes
     try:
-        # Try to ensure indexes without dropping if they exist
-        # This is safer for production and avoids downtime
-        attendance_col.create_index([('rollNumber', 1), ('eventId', 1)], unique=True)
-        attendance_col.create_index('eventId')
-        attendance_col.create_index('branch')
-        students_col.create_index([('rollNumber', 1), ('eventId', 1)], unique=True)
-        print("Indexes ensured.")
-        
-        # Bootstrap required accounts
-        # GDGADMIN (Full access)
-        admins_col.update_one(
-            {'username': 'GDGADMIN'},
-            {'$set': {'username': 'GDGADMIN', 'password': 'COREADMIN#3'}},
-            upsert=True
-        )
-        # Batch add GDGMEMBER1 to GDGMEMBER40
-        print("Ensuring batch member accounts (1-40)...")
-        from pymongo import UpdateOne
-        bulk_ops = []
-        for i in range(1, 41):
-            u = f"GDGMEMBER{i}"
-            p = f"COREMEMBER#{i}"
-            bulk_ops.append(UpdateOne(
-                {'username': u},
-                {'$set': {'username': u, 'password': p}},
-                upsert=True
-            ))
-        
-        if bulk_ops:
-            res = admins_col.bulk_write(bulk_ops)
-            print(f"Batch admins ensured: {res.upserted_count + res.matched_count} total.")
-            
-        # Reset all login statuses on server start to prevent permanent lockouts
-        admins_col.update_many({}, {'$set': {'is_logged_in': False}})
-        
-        # Merging AIM and AIML into AIML (Normalization)
-        print("Ensuring branch normalization (AIM -> AIML)...")
-        res1 = students_col.update_many({'branch': 'AIM'}, {'$set': {'branch': 'AIML'}})
-        res2 = attendance_col.update_many({'branch': 'AIM'}, {'$set': {'branch': 'AIML'}})
-        if res1.modified_count > 0 or res2.modified_count > 0:
-            print(f"Normalized {res1.modified_count} students and {res2.modified_count} attendance records.")
-        
-        # Merging ME into MECH (Normalization)
-        print("Ensuring branch normalization (ME -> MECH)...")
-        res3 = students_col.update_many({'branch': 'ME'}, {'$set': {'branch': 'MECH'}})
-        res4 = attendance_col.update_many({'branch': 'ME'}, {'$set': {'branch': 'MECH'}})
-        if res3.modified_count > 0 or res4.modified_count > 0:
-            print(f"Normalized {res3.modified_count} students and {res4.modified_count} attendance records.")
-        
-        # Merging CE into CIVIL (Normalization)
-        print("Ensuring branch normalization (CE -> CIVIL)...")
-        res5 = students_col.update_many({'branch': 'CE'}, {'$set': {'branch': 'CIVIL'}})
-        res6 = attendance_col.update_many({'branch': 'CE'}, {'$set': {'branch': 'CIVIL'}})
-        if res5.modified_count > 0 or res6.modified_count > 0:
-            print(f"Normalized {res5.modified_count} students and {res6.modified_count} attendance records.")
-        
-        print("Default Admins ensured.")
-        
-        # DEBUG: Print counts
-        s_count = students_col.count_documents({})
-        a_count = attendance_col.count_documents({})
-        today_str = datetime.now().strftime('%Y-%m-%d')
-        a_today = attendance_col.count_documents({'date': today_str})
-        print(f"DEBUG: Total Students in DB: {s_count}")
-        print(f"DEBUG: Total Attendance (All Time): {a_count}")
-        print(f"DEBUG: Attendance Today ({today_str}): {a_today}")
-        
+        job = export_jobs.submit(session.get('admin_id'), event, department, fmt)
     except Exception as e:
-        print(f"Index creation failed: {e}")
-        
+        logger.error(f"ERROR: could not queue {fmt} export for event {event_id}: {e}")
+        return jsonify({'status': 'error', 'message': 'Could not start export'}), 500
+    return jsonify(export_job_payload(job)), 202
+
+@app.route('/api/exports/<job_id>')
+@requires_super_admin
+def export_job_status_api(job_id):
+    job = export_jobs_col.find_one({'_id': job_id})
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Export job not found'}), 404
+    return jsonify(export_job_payload(expire_export_job(job)))
+
+@app.route('/api/exports/<job_id>/download')
+@requires_super_admin
+def download_export_job(job_id):
+    job = export_jobs_col.find_one({'_id': job_id})
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Export job not found'}), 404
+    job = expire_export_job(job)
+    if job['state'] != 'done':
+        return jsonify({'status': 'error', 'message': f"Export is {job['state']}"}), 409
+    output = export_jobs.open(job)
+    if output is None:
+        # Evicted from the cache (or the attendance changed); submit a new job
+        return jsonify({'status': 'error', 'message': 'Export expired, please export again'}), 410
+    return send_file(
+        output,
+        as_attachment=True,
+        download_name=export_filename(job['department'], job['format']),
+        mimetype=EXPORT_FORMATS[job['format']]
+    )
+
+def socketio_rooms():
+    # Event rooms of this process with their member count (per-client and admin rooms left out)
+    rooms = socketio.server.manager.rooms.get('/', {})
+    return {
+        (room,): len(members) for room, members in rooms.items()
+        if room is not None and room not in members and not str(room).startswith('admin:')
+    }
+
+metrics.registry.callback('socketio_connected_clients', 'Socket.IO clients connected to this process.',
+                          lambda: len(socketio.server.manager.rooms.get('/', {}).get(None, {})))
+metrics.registry.callback('socketio_room_members', 'Clients in each event room.', socketio_rooms, ('room',))
+metrics.registry.callback('session_cache_lookups_total', 'Session checks answered from the cache (hit) or MongoDB (miss).',
+                          lambda: {('hit',): session_cache.hits, ('miss',): session_cache.misses}, ('result',), kind='counter')
+metrics.registry.callback('export_cache_lookups_total', 'Export downloads served from the disk cache (hit) or rendered (miss).',
+                          lambda: {('hit',): export_cache.hits, ('miss',): export_cache.misses}, ('result',), kind='counter')
+metrics.registry.callback('counts_broadcaster_events_total', 'update_counts broadcasts requested, coalesced, emitted and failed.',
+                          lambda: {(k,): v for k, v in counts_broadcaster.snapshot().items() if k in counts_broadcaster.counters},
+                          ('outcome',), kind='counter')
+metrics.registry.callback('counts_broadcaster_pending', 'Events waiting for the next update_counts flush.',
+                          lambda: counts_broadcaster.snapshot()['pending'])
+metrics.registry.callback('roster_index_events', 'Event rosters held in memory.', lambda: len(roster_index.events))
+metrics.registry.callback('export_jobs_active', 'Export jobs queued or rendering in this process.', lambda: len(export_jobs.running))
+
+@app.route('/metrics')
+def metrics_api():
+    token = request.headers.get('Authorization', '')
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(token, f"Bearer {METRICS_TOKEN}")
+    if not token_ok and (not session.get('logged_in') or session.get('username') != 'GDGADMIN'):
+        return jsonify({'error': 'Unauthorized: Only GDGADMIN can perform this action'}), 403
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+def run_rollups(full=False):
+    """Bring the participation summaries up to date; None when another process is running them."""
+    return rollups.run(db, f"{os.getpid()}:{uuid.uuid4().hex[:8]}", full=full)
+
+class RollupJob:
+    """Runs the participation rollups every ROLLUP_INTERVAL, and in full every ROLLUP_FULL_INTERVAL.
+
+    Every worker runs the job; the lease in the rollups collection lets only one of them work at a time.
+    """
+
+    def __init__(self, interval, full_interval):
+        self.interval = interval
+        self.full_interval = full_interval
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.interval)
+            try:
+                full_at = rollups.state(db).get('full_at')
+                full = full_at is None or (datetime.now() - full_at).total_seconds() > self.full_interval
+                result = run_rollups(full=full)
+                if result:
+                    logger.info(f"Participation rollups updated to {result['to']:%Y-%m-%d %H:%M:%S}{' (full rebuild)' if full else ''}")
+            except Exception as e:
+                logger.error(f"ERROR: participation rollups failed: {e}")
+
+rollup_job = RollupJob(ROLLUP_INTERVAL, ROLLUP_FULL_INTERVAL)
+
+@app.cli.command('rollup')
+@click.option('--full', is_flag=True, help='Rebuild the summaries from all attendance (picks up deletions).')
+def rollup_command(full):
+    """Update the cross-event participation summaries."""
+    result = run_rollups(full=full)
+    if result is None:
+        print("Rollups are being updated by another process.")
+        return
+    window = f"{result['from']:%Y-%m-%d %H:%M:%S}" if result['from'] else 'the beginning'
+    print(f"Rolled up attendance from {window} to {result['to']:%Y-%m-%d %H:%M:%S}"
+          + (" (full rebuild)." if result['full'] else f", {result['events']} event(s) touched."))
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def rollup_payload():
+    state = rollups.state(db)
+    return {'updated_at': _isoformat(state.get('updated_at')), 'watermark': _isoformat(state.get('watermark'))}
+
+@app.route('/api/analytics/summary')
+@requires_super_admin
+def analytics_summary_api():
+    # Counted by the rollup job
+    distribution = {d['events']: d['students'] for d in rollups.state(db).get('events_per_student', [])}
+    top = [
+        {
+            'roll_number': doc['_id'], 'name': doc.get('name'), 'branch': doc.get('branch'),
+            'events': doc.get('events', 0), 'last_at': _isoformat(doc.get('last_at'))
+        }
+        for doc in participation_col.find({}, {'history': 0}).sort('events', -1).limit(ANALYTICS_TOP_STUDENTS)
+    ]
+    return jsonify({
+        'students': sum(distribution.values()),
+        'repeat_students': sum(n for events, n in distribution.items() if events >= 2),
+        'events_per_student': {str(events): distribution[events] for events in sorted(distribution)},
+        'top_students': top,
+        'rollup': rollup_payload()
+    })
+
+@app.route('/api/analytics/branches')
+@requires_super_admin
+def analytics_branches_api():
+    events = list(events_col.find({'deleted_at': {'$exists': False}}, {'name': 1, 'created_at': 1}).sort('created_at', 1))
+    counts = {
+        doc['_id']: doc
+        for doc in event_participation_col.find({'_id': {'$in': [str(e['_id']) for e in events]}})
+    }
+    rows = []
+    for event in events:
+        doc = counts.get(str(event['_id']), {})
+        rows.append({
+            'event_id': str(event['_id']),
+            'name': event.get('name'),
+            'created_at': _isoformat(event.get('created_at')),
+            'total': doc.get('total', 0),
+            'branch_counts': doc.get('branch_counts', {})
+        })
+    # Per-branch series in event order, ready for a trend chart
+    branches = sorted({branch for row in rows for branch in row['branch_counts']})
+    trend = {branch: [row['branch_counts'].get(branch, 0) for row in rows] for branch in branches}
+    return jsonify({'events': rows, 'trend': trend, 'rollup': rollup_payload()})
+
+@app.route('/api/analytics/students/<roll_number>')
+@requires_super_admin
+def analytics_student_api(roll_number):
+    doc = participation_col.find_one({'_id': clean_roll_number(roll_number)})
+    if not doc:
+        return jsonify({'error': 'No attendance recorded for this roll number'}), 404
+    history = sorted(
+        ({'eventId': event_id, 'at': at} for event_id, at in doc.get('history', {}).items()),
+        key=lambda h: h['at'] or datetime.min
+    )
+    event_ids = [ObjectId(h['eventId']) for h in history if ObjectId.is_valid(h['eventId'])]
+    names = {
+        str(e['_id']): e.get('name')
+        for e in events_col.find({'_id': {'$in': event_ids}, 'deleted_at': {'$exists': False}}, {'name': 1})
+    }
+    return jsonify({
+        'roll_number': doc['_id'],
+        'name': doc.get('name'),
+        'branch': doc.get('branch'),
+        'events': doc.get('events', 0),
+        'first_at': _isoformat(doc.get('first_at')),
+        'last_at': _isoformat(doc.get('last_at')),
+        'history': [
+            {'event_id': h['eventId'], 'name': names[h['eventId']], 'at': _isoformat(h['at'])}
+            for h in history if h['eventId'] in names
+        ],
+        'rollup': rollup_payload()
+    })
+
+# Every index the app relies on, as (collection, keys, options); audit-queries checks QUERY_SHAPES against them
+INDEXES = [
+    ('attendance', [('rollNumber', 1), ('eventId', 1)], {'unique': True}),
+    ('attendance', [('eventId', 1)], {}),
+    ('attendance', [('branch', 1)], {}),
+    ('attendance', [('eventId', 1), ('timestamp', 1), ('_id', 1)], {}),
+    ('attendance', [('eventId', 1), ('branch', 1), ('timestamp', 1), ('_id', 1)], {}),
+    ('students', [('rollNumber', 1), ('eventId', 1)], {'unique': True}),
+    # Covers the roster load and the per-event student count
+    ('students', [('eventId', 1), ('rollNumber', 1)], {}),
+    ('events', [('created_at', -1)], {}),
+    ('arrival_buckets', [('eventId', 1), ('minute', 1)], {'unique': True}),
+    # Attendance newer than the rollup watermark
+    ('attendance', [('timestamp', 1)], {}),
+    *[(rollups.STUDENTS, keys, {}) for keys in rollups.STUDENT_INDEXES],
+    # Sparse so accounts left without a key (case-duplicates found by migration 4) do not collide
+    ('admins', [('username_key', 1)], {'unique': True, 'sparse': True}),
+    ('idempotency_keys', [('created_at', 1)], {'expireAfterSeconds': IDEMPOTENCY_TTL}),
+    ('export_jobs', [('created_at', 1)], {'expireAfterSeconds': EXPORT_JOB_TTL}),
+]
+
+# Scratch database created (and dropped) by audit-queries on the audit server
+QUERY_AUDIT_DB = 'gdgoc_query_audit'
+
+def ensure_indexes(database):
+    for name, keys, options in INDEXES:
+        database[name].create_index(keys, **options)
+
+# The queries the app sends, with sample values; keep in step with the code above
+QUERY_SHAPES = [
+    query_audit.query_shape('roster load', 'students', filter={'eventId': AUDIT_EVENT_ID},
+                            projection=ROSTER_PROJECTION, covered=True,
+                            index=[('eventId', 1), ('rollNumber', 1)]),
+    query_audit.query_shape('roster lookup', 'students', filter={'rollNumber': '23A00001', 'eventId': AUDIT_EVENT_ID},
+                            projection=ROSTER_PROJECTION, limit=1, covered=True, index=[('rollNumber', 1), ('eventId', 1)]),
+    query_audit.query_shape('roster batch lookup', 'students',
+                            filter={'eventId': AUDIT_EVENT_ID, 'rollNumber': {'$in': ['23A00001', '23A00002']}},
+                            projection=ROSTER_PROJECTION, covered=True,
+                            index=[('eventId', 1), ('rollNumber', 1)]),
+    query_audit.query_shape('registry lookup', 'student_registry', filter={'_id': {'$in': ['23A00001', '23A00002']}},
+                            projection=REGISTRY_PROJECTION),
+    query_audit.query_shape('student count', 'students', op='count', filter={'eventId': AUDIT_EVENT_ID},
+                            covered=True, index=[('eventId', 1), ('rollNumber', 1)]),
+    query_audit.query_shape('student delete (attendance)', 'attendance',
+                            filter={'rollNumber': '23A00001', 'eventId': AUDIT_EVENT_ID}, limit=1,
+                            index=[('rollNumber', 1), ('eventId', 1)]),
+    query_audit.query_shape('attendees', 'attendance', filter={'eventId': AUDIT_EVENT_ID},
+                            projection=ATTENDEE_PROJECTION, sort=[('timestamp', 1), ('_id', 1)], limit=101,
+                            index=[('eventId', 1), ('timestamp', 1), ('_id', 1)]),
+    query_audit.query_shape('attendees by branch', 'attendance', filter={'eventId': AUDIT_EVENT_ID, 'branch': AUDIT_BRANCH},
+                            projection=ATTENDEE_PROJECTION, sort=[('timestamp', 1), ('_id', 1)], limit=101,
+                            index=[('eventId', 1), ('branch', 1), ('timestamp', 1), ('_id', 1)]),
+    query_audit.query_shape('attendees after cursor', 'attendance',
+                            filter={'eventId': AUDIT_EVENT_ID, '$or': [
+                                {'timestamp': {'$gt': datetime(2025, 1, 1, 9, 5)}},
+                                {'timestamp': datetime(2025, 1, 1, 9, 5), '_id': {'$gt': ObjectId('5f0000000000000000000000')}}
+                            ]},
+                            projection=ATTENDEE_PROJECTION, sort=[('timestamp', 1), ('_id', 1)], limit=101,
+                            index=[('eventId', 1), ('timestamp', 1), ('_id', 1)]),
+    query_audit.query_shape('export', 'attendance', filter={'eventId': AUDIT_EVENT_ID},
+                            projection=EXPORT_PROJECTION, sort=[('timestamp', 1)],
+                            index=[('eventId', 1), ('timestamp', 1), ('_id', 1)]),
+    query_audit.query_shape('export by branch', 'attendance', filter={'eventId': AUDIT_EVENT_ID, 'branch': AUDIT_BRANCH},
+                            projection=EXPORT_PROJECTION, sort=[('timestamp', 1)],
+                            index=[('eventId', 1), ('branch', 1), ('timestamp', 1), ('_id', 1)]),
+    query_audit.query_shape('export row count', 'attendance', op='count',
+                            filter={'eventId': AUDIT_EVENT_ID, 'branch': AUDIT_BRANCH}, covered=True,
+                            index=[('eventId', 1), ('branch', 1), ('timestamp', 1), ('_id', 1)]),
+    query_audit.query_shape('stats rebuild', 'attendance', op='aggregate', pipeline=[
+                                {'$match': {'eventId': AUDIT_EVENT_ID}},
+                                {'$group': {'_id': '$branch', 'count': {'$sum': 1}}}
+                            ], covered=True, index=[('eventId', 1), ('branch', 1), ('timestamp', 1), ('_id', 1)]),
+    query_audit.query_shape('branch alias events', 'attendance', op='distinct', key='eventId',
+                            filter={'branch': {'$in': ['AIM', 'ME', 'CE']}}, index=[('branch', 1)]),
+    query_audit.query_shape('arrival timeline', 'arrival_buckets', filter={'eventId': AUDIT_EVENT_ID},
+                            projection=ARRIVAL_BUCKET_PROJECTION, sort=[('minute', 1)], index=[('eventId', 1), ('minute', 1)]),
+    query_audit.query_shape('arrival buckets pushed', 'arrival_buckets',
+                            filter={'eventId': AUDIT_EVENT_ID, 'minute': {'$in': [datetime(2025, 1, 1, 9, 5)]}},
+                            projection=ARRIVAL_BUCKET_PROJECTION, sort=[('minute', 1)], index=[('eventId', 1), ('minute', 1)]),
+    query_audit.query_shape('rollup window events', 'attendance', op='distinct', key='eventId',
+                            filter={'timestamp': {'$gte': datetime(2025, 1, 1, 9, 0), '$lt': datetime(2025, 1, 1, 9, 10)}},
+                            index=[('timestamp', 1)]),
+    query_audit.query_shape('rollup window', 'attendance', op='aggregate', pipeline=[
+                                {'$match': {'timestamp': {'$gte': datetime(2025, 1, 1, 9, 0), '$lt': datetime(2025, 1, 1, 9, 10)}}},
+                                {'$sort': {'timestamp': 1}},
+                                {'$group': {'_id': '$rollNumber', 'name': {'$last': '$name'}}}
+                            ], index=[('timestamp', 1)]),
+    query_audit.query_shape('frequent attendees', rollups.STUDENTS, projection={'history': 0},
+                            sort=[('events', -1)], limit=ANALYTICS_TOP_STUDENTS, index=[('events', -1)]),
+    query_audit.query_shape('student history', rollups.STUDENTS, filter={'_id': '23A00001'}),
+    # Once per rollup run, not per request
+    query_audit.query_shape('events per student', rollups.STUDENTS, op='aggregate', pipeline=[
+                                {'$group': {'_id': '$events', 'students': {'$sum': 1}}}, {'$sort': {'_id': 1}}
+                            ], allow=['COLLSCAN']),
+    query_audit.query_shape('event list', 'events', filter={'deleted_at': {'$exists': False}}, projection={'purge': 0},
+                            sort=[('created_at', -1)], index=[('created_at', -1)]),
+    query_audit.query_shape('event purge roster batch', 'students', filter={'eventId': AUDIT_EVENT_ID}, projection={'_id': 1},
+                            limit=1000, index=[('eventId', 1), ('rollNumber', 1)]),
+    query_audit.query_shape('event purge attendance batch', 'attendance', filter={'eventId': AUDIT_EVENT_ID},
+                            projection={'_id': 1}, limit=1000, index=[('eventId', 1)]),
+    query_audit.query_shape('event by id', 'events', filter={'_id': ObjectId(AUDIT_EVENT_ID)}),
+    query_audit.query_shape('event stats', 'event_stats', filter={'_id': AUDIT_EVENT_ID}),
+    query_audit.query_shape('export job', 'export_jobs', filter={'_id': 'audit-job'}),
+    query_audit.query_shape('idempotency key', 'idempotency_keys', filter={'_id': 'audit-key'}),
+    query_audit.query_shape('session check', 'admins', filter={'_id': ObjectId('5f0000000000000000000003')},
+                            projection={'session_token': 1, 'last_active': 1}),
+    query_audit.query_shape('login', 'admins', filter={'username_key': 'gdgadmin'}, limit=1, index=[('username_key', 1)]),
+    # The admins collection holds about 41 accounts
+    query_audit.query_shape('admin list', 'admins', projection={'password': 0}, allow=['COLLSCAN']),
+]
+
+@migration(1, 'Create indexes')
+def create_indexes():
+    ensure_indexes(db)
+
+@migration(2, 'Bootstrap GDGADMIN and GDGMEMBER1-40 accounts')
+def bootstrap_admins():
+    # GDGADMIN (Full access) and the scanning members
+    accounts = [('GDGADMIN', 'COREADMIN#3')] + [(f"GDGMEMBER{i}", f"COREMEMBER#{i}") for i in range(1, 41)]
+    admins_col.bulk_write([
+        UpdateOne({'username': u}, {'$set': {'username': u, 'password': p}}, upsert=True)
+        for u, p in accounts
+    ])
+
+@migration(3, 'Merge AIM/ME/CE branch names into AIML/MECH/CIVIL')
+def normalize_branch_aliases():
+    aliases = list(BRANCH_ALIASES)
+    event_ids = set(attendance_col.distinct('eventId', {'branch': {'$in': aliases}}))
+    event_ids |= set(students_col.distinct('eventId', {'branch': {'$in': aliases}}))
+    for alias, branch in BRANCH_ALIASES.items():
+        students_col.update_many({'branch': alias}, {'$set': {'branch': branch}})
+        attendance_col.update_many({'branch': alias}, {'$set': {'branch': branch}})
+    # branch_counts were keyed by the old names
+    for event_id in event_ids:
+        rebuild_event_stats(event_id)
+
+@migration(4, 'Add normalized username keys to admin accounts')
+def backfill_username_keys():
+    taken = {a['username_key'] for a in admins_col.find({'username_key': {'$exists': True}}, {'username_key': 1})}
+    updates = []
+    for admin in admins_col.find({'username_key': {'$exists': False}}, {'username': 1}).sort('_id', 1):
+        key = username_key(str(admin.get('username') or ''))
+        if not key or key in taken:
+            # Same name in another case: the older account keeps the login
+            logger.warning(f"Admin {admin['_id']} ({admin.get('username')!r}) has no unique username and cannot log in")
+            continue
+        taken.add(key)
+        updates.append(UpdateOne({'_id': admin['_id']}, {'$set': {'username_key': key}}))
+    if updates:
+        admins_col.bulk_write(updates, ordered=False)
+    ensure_indexes(db)
+
+@migration(5, 'Move student names and branches into the student registry')
+def build_student_registry():
+    # The most recently created roster copy of a student wins
+    pipeline = [
+        {'$match': {'name': {'$exists': True}}},
+        {'$sort': {'_id': 1}},
+        {'$group': {'_id': '$rollNumber', 'name': {'$last': '$name'}, 'branch': {'$last': '$branch'}}}
+    ]
+    now = datetime.now()
+    ops = []
+    for doc in students_col.aggregate(pipeline, allowDiskUse=True):
+        ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {'name': doc['name'], 'branch': doc['branch'], 'updated_at': now}}, upsert=True))
+        if len(ops) == ROSTER_BULK_CHUNK:
+            registry_col.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        registry_col.bulk_write(ops, ordered=False)
+    # Roster documents keep only the membership
+    students_col.update_many({'name': {'$exists': True}}, {'$unset': {'name': '', 'branch': ''}})
+
+@migration(6, 'Build per-minute arrival buckets of existing events')
+def build_arrival_buckets():
+    ensure_indexes(db)
+    for event in events_col.find({'deleted_at': {'$exists': False}}, {'_id': 1}):
+        rebuild_arrival_buckets(str(event['_id']))
+
+def prestart():
+    """Prepare the database once per deploy, before any worker serves (python app.py, gunicorn on_starting).
+
+    A failed migration raises, so the deploy stops instead of serving without it.
+    """
+    try:
+        applied = migrations.run(migrations_col, log=logger.info)
+    except Exception as e:
+        logger.error(f"ERROR: migrations failed: {e}")
+        raise
+    if applied:
+        logger.info(f"Applied migrations: {applied}")
+
+    # Reset all login statuses on server start to prevent permanent lockouts
+    admins_col.update_many({}, {'$set': {'is_logged_in': False}})
+
+def startup():
+    """Start this process's background jobs (python app.py, gunicorn post_worker_init)."""
+    # Resume purges of deleted events interrupted by a restart
+    if event_purger.pending():
+        event_purger.start()
+
+    if ROLLUP_INTERVAL > 0:
+        rollup_job.start()
+
+@app.cli.command('prestart')
+def prestart_command():
+    """Apply pending migrations and reset login flags; run once per deploy before the workers start."""
+    prestart()
+
+@app.cli.command('migrate')
+@click.option('--status', 'show_status', is_flag=True, help='List migrations and whether they were applied.')
+def migrate_command(show_status):
+    """Apply pending database migrations."""
+    if show_status:
+        for version, description, applied_at in migrations.status(migrations_col):
+            print(f"{version:>4}  {applied_at.strftime('%Y-%m-%d %H:%M') if applied_at else 'pending':<16}  {description}")
+        return
+    applied = migrations.run(migrations_col)
+    print(f"Applied migrations: {applied}" if applied else "Database is up to date.")
+
+@app.cli.command('audit-queries')
+@click.option('--mongo-uri', default=lambda: os.getenv('AUDIT_MONGO_URI', 'mongodb://localhost:27017'),
+              help='MongoDB server for the scratch database (a real server; mongomock cannot explain).')
+@click.option('--rows', default=2000, show_default=True, help='Students and attendance records seeded per event.')
+@click.option('--create', is_flag=True, help="Create the proposed indexes, also in the app's database.")
+def audit_queries_command(mongo_uri, rows, create):
+    """Explain every query shape against a seeded scratch database and flag slow plans.
+
+    Exits with status 1 while any plan is flagged, so it can gate CI.
+    """
+    audit_client = MongoClient(mongo_uri)
+    scratch = audit_client[QUERY_AUDIT_DB]
+    try:
+        audit_client.drop_database(QUERY_AUDIT_DB)
+        ensure_indexes(scratch)
+        query_audit.seed(scratch, rows)
+        results = query_audit.audit(scratch, QUERY_SHAPES)
+        print('\n'.join(query_audit.format_report(results)))
+
+        proposals = query_audit.proposed_indexes(results)
+        if proposals:
+            print("\nProposed indexes (add to INDEXES):")
+            for name, keys in proposals:
+                print(f"    ({name!r}, {keys!r}, {{}}),")
+        if create and proposals:
+            for name, keys in proposals:
+                scratch[name].create_index(keys)
+                db[name].create_index(keys)
+            print(f"\nCreated {len(proposals)} index(es); explaining again.")
+            results = query_audit.audit(scratch, QUERY_SHAPES)
+            print('\n'.join(query_audit.format_report(results)))
+    finally:
+        audit_client.drop_database(QUERY_AUDIT_DB)
+        audit_client.close()
+
+    flagged = [shape['name'] for shape, _, problems in results if problems]
+    if flagged:
+        print(f"\n{len(flagged)} of {len(results)} query shapes flagged.")
+        raise SystemExit(1)
+    print(f"\nAll {len(results)} query shapes use their indexes.")
+
+if __name__ == '__main__':
+    prestart()
+    startup()
+
     port = int(os.environ.get("PORT", 5000))
     socketio.run(
         app,
@@ -0,0 +1,790 @@
+"""Benchmarks for the attendance system hot paths.
+
+Usage:
+    python bench.py roster [--sizes 1000 10000 50000] [--mongo]
+    python bench.py pdf [--sizes 1000 10000 50000] [--skip-legacy] [--memory]
+    python bench.py fanout [--scans 20] [--timeout 5]
+    python bench.py concurrency [--modes threading eventlet] [--clients 50] [--requests 3000]
+    python bench.py json [--rows 5000] [--repeat 20]
+    python bench.py load [--scanners 40] [--scans 50] [--listeners 10] [--pollers 10] [--output load.json] [--baseline old.json]
+
+Benchmarks that write to MongoDB (--mongo, fanout) use the MONGO_URI from .env
+and only touch documents of a throw-away event id that is removed afterwards.
+
+fanout loads app.py twice, as two gunicorn workers sharing SOCKETIO_MESSAGE_QUEUE
+(the in-process loopback:// queue unless set), serves worker B on a local port,
+scans on worker A and checks that a dashboard socket connected to worker B
+receives the live counts. It exits non-zero if the counts never arrive.
+
+concurrency starts `python app.py` once per ASYNC_MODE and drives it over HTTP
+with concurrent scans, stats polls and attendee list reads, reporting
+throughput and p50/p99 latency per endpoint. MONGO_URI=mongomock:// works
+without a database, but only a real MongoDB shows the effect of non-blocking
+database I/O.
+
+json times serializing an attendee list with Flask's standard provider (after
+the _id stringify loop the views used to run) against responses.JSONProvider,
+and the size and time of each available compression of the result.
+
+load is the event-day rehearsal: the GDGMEMBER1..40 accounts each scan their
+own slice of a throw-away roster as fast as the server answers, while
+dashboards poll /api/stats and Socket.IO listeners watch the event room. It
+reports throughput, p50/p95/p99 per endpoint and the broadcast lag (time from
+a scan's response until every listener shows a count that includes it), and
+can save the results as JSON and compare them with an earlier run. load and
+concurrency log their accounts out and delete the event and its synthetic
+students when they finish, also after a failure.
+"""
+import argparse
+import http.cookiejar
+import importlib.util
+import io
+import itertools
+import json
+import os
+import random
+import socket
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+import simple_websocket
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+# In-process benchmarks run on plain threads; servers started by `concurrency` pick their own mode
+os.environ['ASYNC_MODE'] = 'threading'
+if sys.argv[1:2] == ['fanout']:
+    # Must be set before app.py is imported: both workers build their SocketIO from it
+    os.environ.setdefault('SOCKETIO_MESSAGE_QUEUE', 'loopback://')
+
+import app as attendance_app
+import exports
+import responses
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def make_roster(rows, duplicate_ratio=0.02, invalid_ratio=0.01):
+    """Synthetic roster shaped like the college Excel sheets."""
+    codes = list(attendance_app.BRANCH_MAP.keys())
+    rolls, names = [], []
+    for i in range(rows):
+        r = random.random()
+        if r < invalid_ratio:
+            rolls.append(None)
+        elif r < invalid_ratio + duplicate_ratio and rolls:
+            rolls.append(random.choice([x for x in rolls[-50:] if x] or ['22A21A0501']))
+        else:
+            rolls.append(f"2{i % 5}A21A{random.choice(codes)}{i:05d}")
+        names.append(''.join(random.choices(string.ascii_uppercase, k=12)))
+    return pd.DataFrame({'Roll Number': rolls, 'Name': names})
+
+
+def legacy_prepare_roster(df):
+    """The original per-row iterrows() import loop, kept for comparison."""
+    records, seen = [], set()
+    for _, row in df.iterrows():
+        roll_raw, name_raw = row.get('Roll Number'), row.get('Name')
+        if pd.isna(roll_raw) or pd.isna(name_raw):
+            continue
+        roll = attendance_app.clean_roll_number(roll_raw)
+        if not roll or roll in seen:
+            continue
+        seen.add(roll)
+        records.append({
+            'rollNumber': roll,
+            'name': str(name_raw).strip(),
+            'branch': attendance_app.normalize_branch(attendance_app.detect_branch(roll))
+        })
+    return records
+
+
+def bench_roster(args):
+    print(f"{'rows':>8} {'iterrows':>10} {'vectorized':>11}" + (f" {'bulk_write':>11}" if args.mongo else ''))
+    for size in args.sizes:
+        df = make_roster(size)
+        legacy_time, _ = timed(legacy_prepare_roster, df)
+        prepare_time, (records, _) = timed(attendance_app.prepare_roster, df)
+        line = f"{size:>8} {legacy_time:>9.3f}s {prepare_time:>10.3f}s"
+        if args.mongo:
+            event_id = f"bench-{ObjectId()}"
+            try:
+                write_time, _ = timed(attendance_app.bulk_upsert_students, records, event_id)
+            finally:
+                attendance_app.students_col.delete_many({'eventId': event_id})
+                remove_unused_registrations([r['rollNumber'] for r in records])
+            line += f" {write_time:>10.3f}s"
+        print(line)
+
+
+def remove_unused_registrations(roll_numbers):
+    """Delete registry entries the benchmark created that no event roster refers to."""
+    in_use = set(attendance_app.students_col.distinct('rollNumber', {'rollNumber': {'$in': roll_numbers}}))
+    attendance_app.registry_col.delete_many({'_id': {'$in': [r for r in roll_numbers if r not in in_use]}})
+
+
+def make_attendance(rows):
+    codes = list(attendance_app.BRANCH_MAP.items())
+    for i in range(rows):
+        code, branch = codes[i % len(codes)]
+        yield {
+            'rollNumber': f"22A21A{code}{i:05d}",
+            'name': ''.join(random.choices(string.ascii_uppercase + ' ', k=24)),
+            'branch': branch
+        }
+
+
+def legacy_render_pdf(records, out):
+    """The original single platypus Table over every row, kept for comparison."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    records = list(records)
+    doc = SimpleDocTemplate(out, pagesize=letter)
+    styles = getSampleStyleSheet()
+    elements = [
+        Paragraph("ATTENDANCE FOR THE<br/>Benchmark<br/> BY<br/>GDGoc SVEC X AIKYAM<br/>", styles['Title']),
+        Spacer(1, 12),
+        Paragraph(f"Total Students: {len(records)}", styles['Normal']),
+        Spacer(1, 12)
+    ]
+    data = [['S.No', 'Roll Number', 'Name', 'Branch']]
+    for idx, r in enumerate(records, 1):
+        data.append([str(idx), r['rollNumber'], r['name'], r['branch']])
+    table = Table(data, colWidths=[40, 120, 240, 100])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    elements.append(table)
+    doc.build(elements)
+
+
+def peak_memory(fn, *args):
+    """Peak traced Python memory (MB) of a call; tracing slows it down, so time it separately."""
+    tracemalloc.start()
+    try:
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def render_streaming_pdf(records, size):
+    with tempfile.TemporaryFile() as out:
+        exports.render_attendance_pdf(records, out, 'Benchmark', 'ALL', size, '2025-01-01')
+
+
+def make_attendee_documents(rows):
+    """Attendance documents as MongoDB returns them, with ObjectId and datetime values."""
+    start = datetime(2025, 1, 1, 9, 0)
+    return [
+        {**record, '_id': ObjectId(), 'eventId': str(ObjectId()), 'timestamp': start + timedelta(seconds=i)}
+        for i, record in enumerate(make_attendance(rows))
+    ]
+
+
+def legacy_dumps(provider, documents):
+    for document in documents:
+        document['_id'] = str(document['_id'])
+    return provider.dumps(documents)
+
+
+def bench_json(args):
+    documents = make_attendee_documents(args.rows)
+    standard = DefaultJSONProvider(attendance_app.app)
+    fast = responses.JSONProvider(attendance_app.app)
+    print(f"{args.rows} attendees, best of {args.repeat}; orjson {'installed' if responses.orjson else 'not installed'}")
+
+    # The loop mutates the documents, so each run gets its own copies
+    legacy_time = min(
+        timed(legacy_dumps, standard, [dict(d) for d in documents])[0] for _ in range(args.repeat)
+    )
+    fast_time = min(timed(fast.dumps, documents)[0] for _ in range(args.repeat))
+    body = fast.dumps(documents).encode()
+    print(f"{'stdlib + loop':>14} {legacy_time * 1000:>8.2f}ms")
+    print(f"{'JSONProvider':>14} {fast_time * 1000:>8.2f}ms")
+
+    print(f"\n{'encoding':>14} {'bytes':>9} {'ratio':>6} {'time':>9}")
+    print(f"{'identity':>14} {len(body):>9} {1:>6.2f} {'-':>9}")
+    for encoding in ['gzip'] + (['br'] if responses.brotli else []):
+        elapsed = min(timed(responses.compress, body, encoding)[0] for _ in range(args.repeat))
+        size = len(responses.compress(body, encoding))
+        print(f"{encoding:>14} {size:>9} {size / len(body):>6.2f} {elapsed * 1000:>7.2f}ms")
+
+
+def bench_pdf(args):
+    header = f"{'rows':>8} {'platypus':>10} {'canvas':>9}"
+    if args.memory:
+        header += f" {'platypus MB':>12} {'canvas MB':>10}"
+    print(header)
+    for size in args.sizes:
+        legacy_time = None
+        if not args.skip_legacy:
+            legacy_time, _ = timed(legacy_render_pdf, make_attendance(size), io.BytesIO())
+        new_time, _ = timed(render_streaming_pdf, make_attendance(size), size)
+        line = f"{size:>8} " + (f"{legacy_time:>9.2f}s" if legacy_time is not None else f"{'-':>10}") + f" {new_time:>8.2f}s"
+        if args.memory:
+            legacy_peak = None if args.skip_legacy else peak_memory(legacy_render_pdf, make_attendance(size), io.BytesIO())
+            new_peak = peak_memory(render_streaming_pdf, make_attendance(size), size)
+            line += (f" {legacy_peak:>12.1f}" if legacy_peak is not None else f" {'-':>12}") + f" {new_peak:>10.1f}"
+        print(line)
+
+
+def load_worker(name):
+    """Import an independent copy of app.py, like a second gunicorn worker process."""
+    spec = importlib.util.spec_from_file_location(name, attendance_app.__file__)
+    worker = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(worker)
+    return worker
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve_worker(worker):
+    """Run a worker's Socket.IO server on a free local port; returns its base URL."""
+    port = free_port()
+    threading.Thread(
+        target=worker.socketio.run,
+        args=(worker.app,),
+        kwargs={'host': '127.0.0.1', 'port': port, 'allow_unsafe_werkzeug': True, 'log_output': False},
+        daemon=True
+    ).start()
+    return f"http://127.0.0.1:{port}"
+
+
+class SocketListener:
+    """Minimal Socket.IO client over a raw websocket (engine.io v4), enough to watch broadcasts."""
+
+    def __init__(self, base_url, cookie=None, retries=50):
+        url = base_url.replace('http', 'ws', 1) + '/socket.io/?EIO=4&transport=websocket'
+        headers = {'Cookie': cookie} if cookie else None
+        for attempt in range(retries):
+            try:
+                self.ws = simple_websocket.Client.connect(url, headers=headers)
+                break
+            except (ConnectionError, OSError):
+                # The server thread may still be starting
+                if attempt == retries - 1:
+                    raise
+                time.sleep(0.1)
+        self.ws.receive()  # engine.io open packet
+        self.ws.send('40')
+        self.ws.receive()  # namespace connect ack
+
+    def emit(self, event, data):
+        self.ws.send('42' + json.dumps([event, data]))
+
+    def receive(self, timeout):
+        """Next (event, data) broadcast, or None after timeout seconds."""
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return None
+            packet = self.ws.receive(timeout=remaining)
+            if packet is None:
+                return None
+            if packet == '2':
+                self.ws.send('3')
+            elif packet.startswith('42'):
+                event, *data = json.loads(packet[2:])
+                return event, (data[0] if data else None)
+
+    def close(self):
+        self.ws.close()
+
+
+def bench_fanout(args):
+    worker_a, worker_b = attendance_app, load_worker('app_worker_b')
+    event_id = str(worker_a.events_col.insert_one({'name': 'bench fanout', 'date': worker_a.get_today_str()}).inserted_id)
+    rolls = [f"22A21A05{i:04d}" for i in range(args.scans)]
+    worker_a.bulk_upsert_students([{'rollNumber': roll, 'name': 'BENCH', 'branch': 'CSE'} for roll in rolls], event_id)
+
+    dashboard = SocketListener(serve_worker(worker_b))
+    dashboard.emit('join_event', {'event_id': event_id})
+    scanner = worker_a.app.test_client()
+    with scanner.session_transaction() as s:
+        s['logged_in'] = True
+        s['username'] = 'bench'
+
+    received, latest = 0, None
+    try:
+        start = time.perf_counter()
+        for roll in rolls:
+            res = scanner.post('/api/mark_attendance', json={'event_id': event_id, 'roll_number': roll})
+            if res.status_code != 200:
+                raise SystemExit(f"scan of {roll} on worker A failed: {res.status_code} {res.get_json()}")
+        scanned = time.perf_counter()
+
+        deadline = scanned + args.timeout
+        while time.perf_counter() < deadline:
+            message = dashboard.receive(deadline - time.perf_counter())
+            if message and message[0] == 'update_counts' and message[1].get('event_id') == event_id:
+                received += 1
+                latest = message[1]
+                if latest['total'] == len(rolls):
+                    break
+        delivered = time.perf_counter()
+    finally:
+        dashboard.close()
+        worker_a.attendance_col.delete_many({'eventId': event_id})
+        worker_a.students_col.delete_many({'eventId': event_id})
+        remove_unused_registrations(rolls)
+        worker_a.event_stats_col.delete_many({'_id': event_id})
+        worker_a.events_col.delete_one({'_id': ObjectId(event_id)})
+
+    print(f"queue: {worker_a.SOCKETIO_MESSAGE_QUEUE}")
+    print(f"scans on worker A: {len(rolls)} in {scanned - start:.3f}s")
+    print(f"update_counts on worker B: {received} (coalesced), last total {latest['total'] if latest else '-'}")
+    if not latest or latest['total'] != len(rolls):
+        print(f"FAIL: worker B did not receive the final count within {args.timeout}s")
+        sys.exit(1)
+    print(f"OK: final count reached worker B {delivered - scanned:.3f}s after the last scan")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class HttpClient:
+    """Cookie-keeping HTTP client (standard library only) for driving a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def request(self, method, path, json_body=None, data=None, headers=None):
+        """Send a request; returns (status, body, seconds)."""
+        headers = dict(headers or {})
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=30) as res:
+                status, body = res.status, res.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        return status, body, time.perf_counter() - start
+
+    def login(self, username, password):
+        form = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+        self.request('POST', '/login', data=form, headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        # The login form answers 200 either way; an API call tells whether the session is valid
+        status, _, _ = self.request('GET', '/api/events')
+        if status != 200:
+            raise SystemExit(f"login as {username} failed")
+
+    def upload(self, path, fields, filename, content):
+        boundary = uuid.uuid4().hex
+        parts = [
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, value in fields.items()
+        ]
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n'
+        )
+        parts.append(f'--{boundary}--\r\n'.encode())
+        return self.request('POST', path, data=b''.join(parts), headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+    def cookie_header(self):
+        return '; '.join(f"{c.name}={c.value}" for c in self.cookies)
+
+
+def start_server(async_mode, mongo_uri, env=None):
+    """Run `python app.py` in a subprocess; returns (process, base_url) once it answers."""
+    port = free_port()
+    server_env = dict(os.environ, ASYNC_MODE=async_mode, PORT=str(port), **(env or {}))
+    if mongo_uri:
+        server_env['MONGO_URI'] = mongo_uri
+    process = subprocess.Popen(
+        [sys.executable, 'app.py'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=server_env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(600):
+        if process.poll() is not None:
+            raise SystemExit(f"{async_mode} server exited with code {process.returncode}")
+        try:
+            urllib.request.urlopen(base_url + '/login', timeout=1).read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit(f"{async_mode} server did not start")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def prepare_event(admin, rolls, name):
+    """Create a throw-away event with rolls as its roster; returns the event id."""
+    status, body, _ = admin.request('POST', '/api/events', json_body={'name': name})
+    if status != 200:
+        raise SystemExit(f"could not create event: {status} {body[:200]}")
+    event_id = json.loads(body)['event_id']
+
+    roster = io.BytesIO()
+    pd.DataFrame({'Roll Number': rolls, 'Name': ['BENCH'] * len(rolls)}).to_excel(roster, index=False)
+    status, body, _ = admin.upload('/api/upload_students', {'event_id': event_id}, 'roster.xlsx', roster.getvalue())
+    if status != 200:
+        raise SystemExit(f"could not upload roster: {status} {body[:200]}")
+    return event_id
+
+
+def clean_up_event(clients, event_id, rolls, timeout=30):
+    """Delete a throw-away event, log every client out and drop the registrations only it used.
+
+    clients[0] is the admin that created the event. Logging out clears
+    is_logged_in, so the accounts are not locked out for the session timeout
+    on a shared server. The purge drops the roster in the background;
+    registrations are removed once it has (MONGO_URI from .env).
+    """
+    if event_id:
+        try:
+            clients[0].request('DELETE', f"/api/events/{event_id}")
+        except OSError as e:
+            print(f"could not delete event {event_id}: {e}")
+    for client in reversed(clients):
+        try:
+            client.request('GET', '/logout')
+        except OSError as e:
+            print(f"could not log out: {e}")
+    deadline = time.monotonic() + timeout
+    while event_id and attendance_app.students_col.count_documents({'eventId': event_id}, limit=1):
+        if time.monotonic() > deadline:
+            print(f"roster of event {event_id} not purged after {timeout}s; its registrations are kept")
+            return
+        time.sleep(0.5)
+    remove_unused_registrations(rolls)
+
+
+def run_load(clients, requests, make_request):
+    """Call make_request(index) from `clients` threads until `requests` calls were made.
+
+    make_request returns (endpoint, status, seconds). Returns per-endpoint
+    latencies, error counts and the wall-clock time.
+    """
+    counter = itertools.count()
+    latencies, errors = {}, {}
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            index = next(counter)
+            if index >= requests:
+                return
+            endpoint, status, seconds = make_request(index)
+            with lock:
+                latencies.setdefault(endpoint, []).append(seconds)
+                if status >= 400:
+                    errors[endpoint] = errors.get(endpoint, 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+def bench_concurrency(args):
+    rolls = [f"22A21A05{i:05d}" for i in range(args.requests)]
+    print(f"{'mode':>10} {'req/s':>8} {'endpoint':>16} {'count':>6} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode in args.modes:
+        process, base_url = start_server(mode, args.mongo_uri)
+        admin, event_id = HttpClient(base_url), None
+        try:
+            admin.login(args.username, args.password)
+            event_id = prepare_event(admin, rolls, f"bench concurrency {mode}")
+            scans = iter(rolls)
+            scan_lock = threading.Lock()
+
+            def make_request(index):
+                # 60% scans, 30% stats polls, 10% attendee list reads
+                kind = index % 10
+                if kind < 6:
+                    with scan_lock:
+                        roll = next(scans)
+                    status, _, seconds = admin.request('POST', '/api/mark_attendance', json_body={'event_id': event_id, 'roll_number': roll})
+                    return 'mark_attendance', status, seconds
+                if kind < 9:
+                    status, _, seconds = admin.request('GET', f"/api/stats?event_id={event_id}")
+                    return 'stats', status, seconds
+                status, _, seconds = admin.request('GET', f"/api/attendees?event_id={event_id}&limit=100")
+                return 'attendees', status, seconds
+
+            latencies, errors, elapsed = run_load(args.clients, args.requests, make_request)
+        finally:
+            clean_up_event([admin], event_id, rolls)
+            stop_server(process)
+
+        throughput = sum(len(v) for v in latencies.values()) / elapsed
+        for i, (endpoint, values) in enumerate(sorted(latencies.items())):
+            print(f"{mode if i == 0 else '':>10} {f'{throughput:.0f}' if i == 0 else '':>8} {endpoint:>16} {len(values):>6} "
+                  f"{percentile(values, 50) * 1000:>8.1f} {percentile(values, 99) * 1000:>8.1f} {errors.get(endpoint, 0):>7}")
+
+
+def latency_summary(values):
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        'p50_ms': round(percentile(values, 50) * 1000, 2),
+        'p95_ms': round(percentile(values, 95) * 1000, 2),
+        'p99_ms': round(percentile(values, 99) * 1000, 2)
+    }
+
+
+def broadcast_lags(acks, updates):
+    """Seconds from each acknowledged scan until the listener saw a total including it.
+
+    acks are the response times of successful scans, updates the (time, total)
+    update_counts messages one listener received. Returns (lags, missed).
+    """
+    acks, lags = sorted(acks), []
+    position = 0
+    for rank, acked in enumerate(acks, 1):
+        while position < len(updates) and updates[position][1] < rank:
+            position += 1
+        if position == len(updates):
+            return lags, len(acks) - len(lags)
+        # A count can reach a dashboard before the scanner has read its response
+        lags.append(max(0.0, updates[position][0] - acked))
+    return lags, 0
+
+
+def bench_load(args):
+    if not 1 <= args.scanners <= 40:
+        raise SystemExit('--scanners must be between 1 and 40 (GDGMEMBER1..40)')
+    process = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        process, base_url = start_server(args.mode, args.mongo_uri)
+
+    admin, scanners, event_id = HttpClient(base_url), [], None
+    rolls = [f"22A21A05{i:05d}" for i in range(args.scanners * args.scans)]
+    try:
+        admin.login(args.username, args.password)
+        event_id = prepare_event(admin, rolls, 'bench load')
+
+        for i in range(1, args.scanners + 1):
+            member = HttpClient(base_url)
+            # Logged out again in the finally block, also when a later login fails
+            scanners.append(member)
+            member.login(f"GDGMEMBER{i}", f"COREMEMBER#{i}")
+
+        listeners = []
+        for _ in range(args.listeners):
+            listener = SocketListener(base_url, cookie=admin.cookie_header())
+            listener.emit('join_event', {'event_id': event_id})
+            listeners.append({'socket': listener, 'updates': []})
+
+        latencies = {'mark_attendance': [], 'stats': []}
+        errors = {'mark_attendance': 0, 'stats': 0}
+        acks = []
+        lock = threading.Lock()
+        scanning = threading.Event()
+        scanning.set()
+
+        def scan(member, my_rolls):
+            for roll in my_rolls:
+                status, _, seconds = member.request('POST', '/api/mark_attendance', json_body={'event_id': event_id, 'roll_number': roll})
+                with lock:
+                    latencies['mark_attendance'].append(seconds)
+                    if status == 200:
+                        acks.append(time.perf_counter())
+                    else:
+                        errors['mark_attendance'] += 1
+
+        def poll():
+            while scanning.is_set():
+                status, _, seconds = admin.request('GET', f"/api/stats?event_id={event_id}")
+                with lock:
+                    latencies['stats'].append(seconds)
+                    if status != 200:
+                        errors['stats'] += 1
+                time.sleep(args.poll_interval)
+
+        def listen(entry):
+            # Keep reading until the final count arrives or the grace period after the scans ends
+            while True:
+                message = entry['socket'].receive(0.2)
+                if message and message[0] == 'update_counts' and message[1].get('event_id') == event_id:
+                    entry['updates'].append((time.perf_counter(), message[1]['total']))
+                    if message[1]['total'] >= len(rolls):
+                        return
+                if not scanning.is_set() and time.perf_counter() > drain_deadline[0]:
+                    return
+
+        drain_deadline = [float('inf')]
+        listen_threads = [threading.Thread(target=listen, args=(entry,)) for entry in listeners]
+        poll_threads = [threading.Thread(target=poll) for _ in range(args.pollers)]
+        scan_threads = [
+            threading.Thread(target=scan, args=(member, rolls[i * args.scans:(i + 1) * args.scans]))
+            for i, member in enumerate(scanners)
+        ]
+        for t in listen_threads + poll_threads:
+            t.start()
+        start = time.perf_counter()
+        for t in scan_threads:
+            t.start()
+        for t in scan_threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        drain_deadline[0] = time.perf_counter() + args.timeout
+        scanning.clear()
+        for t in poll_threads + listen_threads:
+            t.join()
+        for entry in listeners:
+            entry['socket'].close()
+    finally:
+        clean_up_event([admin] + scanners, event_id, rolls)
+        if process:
+            stop_server(process)
+
+    lags, missed = [], 0
+    for entry in listeners:
+        listener_lags, listener_missed = broadcast_lags(acks, entry['updates'])
+        lags += listener_lags
+        missed += listener_missed
+
+    results = {
+        'config': {
+            'mode': 'external' if args.url else args.mode,
+            'mongo': 'mongomock' if (args.mongo_uri or '').startswith('mongomock://') else 'mongodb',
+            'scanners': args.scanners,
+            'scans_per_scanner': args.scans,
+            'listeners': args.listeners,
+            'pollers': args.pollers,
+            'poll_interval': args.poll_interval
+        },
+        'elapsed_s': round(elapsed, 3),
+        'scans_per_s': round(len(latencies['mark_attendance']) / elapsed, 1),
+        'endpoints': {
+            name: dict(latency_summary(values), errors=errors[name]) for name, values in latencies.items()
+        },
+        'broadcast_lag': dict(latency_summary(lags), missed=missed)
+    }
+
+    print(f"{results['config']['scanners']} scanners x {args.scans} scans in {elapsed:.2f}s: {results['scans_per_s']} scans/s")
+    print(f"{'':>16} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    rows = [(name, summary, summary['errors']) for name, summary in results['endpoints'].items()]
+    rows.append(('broadcast_lag', results['broadcast_lag'], f"{missed} missed"))
+    for name, summary, extra in rows:
+        print(f"{name:>16} {summary['count']:>7} {summary['p50_ms']:>8.1f} {summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f} {extra:>7}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nchange vs {args.baseline}:")
+        print(f"{'scans/s':>16} {baseline['scans_per_s']:>8} -> {results['scans_per_s']}")
+        sections = dict(results['endpoints'], broadcast_lag=results['broadcast_lag'])
+        old_sections = dict(baseline['endpoints'], broadcast_lag=baseline['broadcast_lag'])
+        for name, summary in sections.items():
+            old = old_sections.get(name)
+            if old:
+                deltas = ' '.join(f"{key[:-3]} {old[key]:.1f}->{summary[key]:.1f}ms" for key in ('p50_ms', 'p95_ms', 'p99_ms'))
+                print(f"{name:>16} {deltas}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    roster = sub.add_parser('roster', help='upload_students cleaning and bulk upsert')
+    roster.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    roster.add_argument('--mongo', action='store_true', help='also time the bulk_write upserts')
+    roster.set_defaults(func=bench_roster)
+
+    pdf = sub.add_parser('pdf', help='download_pdf rendering time and memory')
+    pdf.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    pdf.add_argument('--skip-legacy', action='store_true', help='only run the streaming canvas renderer')
+    pdf.add_argument('--memory', action='store_true', help='also report peak traced memory (slow)')
+    pdf.set_defaults(func=bench_pdf)
+
+    fanout = sub.add_parser('fanout', help='live counts reach a dashboard on another worker')
+    fanout.add_argument('--scans', type=int, default=20)
+    fanout.add_argument('--timeout', type=float, default=5, help='seconds to wait for the final count')
+    fanout.set_defaults(func=bench_fanout)
+
+    concurrency = sub.add_parser('concurrency', help='HTTP throughput and latency per ASYNC_MODE')
+    concurrency.add_argument('--modes', nargs='+', default=['threading', 'eventlet'], choices=['threading', 'eventlet', 'gevent'])
+    concurrency.add_argument('--clients', type=int, default=50, help='concurrent HTTP clients')
+    concurrency.add_argument('--requests', type=int, default=3000, help='requests per mode')
+    concurrency.add_argument('--mongo-uri', default=os.getenv('MONGO_URI'), help='database the servers use (mongomock:// for in-memory)')
+    concurrency.add_argument('--username', default='GDGADMIN')
+    concurrency.add_argument('--password', default='COREADMIN#3')
+    concurrency.set_defaults(func=bench_concurrency)
+
+    json_ = sub.add_parser('json', help='attendee list serialization and response compression')
+    json_.add_argument('--rows', type=int, default=5000)
+    json_.add_argument('--repeat', type=int, default=20, help='runs per measurement; the best is reported')
+    json_.set_defaults(func=bench_json)
+
+    load = sub.add_parser('load', help='event-day load test with scanners, stats polls and socket listeners')
+    load.add_argument('--scanners', type=int, default=40, help='scanning devices, one GDGMEMBER account each (max 40)')
+    load.add_argument('--scans', type=int, default=50, help='scans per scanner')
+    load.add_argument('--listeners', type=int, default=10, help='dashboards listening on the event room')
+    load.add_argument('--pollers', type=int, default=10, help='dashboards polling /api/stats')
+    load.add_argument('--poll-interval', type=float, default=1.0, help='seconds between stats polls per poller')
+    load.add_argument('--timeout', type=float, default=5, help='seconds to wait for the last broadcasts')
+    load.add_argument('--mode', default='eventlet', choices=['threading', 'eventlet', 'gevent'], help='ASYNC_MODE of the started server')
+    load.add_argument('--url', help='use an already running server instead of starting one')
+    load.add_argument('--mongo-uri', default=os.getenv('MONGO_URI'), help='database the server uses (mongomock:// for in-memory)')
+    load.add_argument('--username', default='GDGADMIN')
+    load.add_argument('--password', default='COREADMIN#3')
+    load.add_argument('--output', help='write the results as JSON')
+    load.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    load.set_defaults(func=bench_load)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""Attendance report renderers (PDF, Excel, CSV) and the on-disk export cache.
+
+The renderers only depend on reportlab/openpyxl and plain record dicts (as
+returned by a pymongo cursor), so they can be fed straight from the database
+without loading the whole event into memory.
+"""
+import csv
+import hashlib
+import io
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from openpyxl import Workbook
+from pymongo import MongoClient
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+PDF_MARGIN = 72
+PDF_ROW_HEIGHT = 18
+PDF_HEADER_HEIGHT = 24
+PDF_FONT = 'Helvetica'
+PDF_BOLD_FONT = 'Helvetica-Bold'
+PDF_FONT_SIZE = 10
+
+EXPORT_COLUMNS = ['Roll Number', 'Name', 'Branch', 'Time']
+CSV_CHUNK_ROWS = 500
+CACHE_READ_BLOCK = 64 * 1024
+# Unfinished temp files older than this are left over from crashed renders
+CACHE_TMP_MAX_AGE = 3600
+# Rows between two progress callbacks
+PROGRESS_EVERY = 1000
+EXPORT_PROJECTION = {'_id': 0, 'rollNumber': 1, 'name': 1, 'branch': 1, 'timestamp': 1, 'time': 1}
+
+
+def _fit(text, width, font=PDF_FONT, size=PDF_FONT_SIZE):
+    """Shorten text with an ellipsis so it fits in a table cell."""
+    text = str(text or '')
+    if stringWidth(text, font, size) <= width:
+        return text
+    while text and stringWidth(text + '...', font, size) > width:
+        text = text[:-1]
+    return text + '...'
+
+
+def render_attendance_pdf(records, out, event_name, department, total, date_str, on_progress=None):
+    """Draw the attendance PDF page by page straight onto a canvas.
+
+    records can be any iterable of attendance dicts (e.g. a pymongo cursor);
+    only the current row is held in memory. The table header is repeated on
+    every page. on_progress(rows_done) is called every PROGRESS_EVERY rows.
+    """
+    page_width, page_height = letter
+    show_branch = department == 'ALL'
+    if show_branch:
+        headers, col_widths = ['S.No', 'Roll Number', 'Name', 'Branch'], [40, 120, 240, 100]
+    else:
+        headers, col_widths = ['S.No', 'Roll Number', 'Name'], [50, 150, 300]
+    table_width = sum(col_widths)
+    table_left = (page_width - table_width) / 2
+    col_lefts = [table_left + sum(col_widths[:i]) for i in range(len(col_widths))]
+
+    c = canvas.Canvas(out, pagesize=letter)
+    c.setTitle(f"Attendance {department}")
+
+    def draw_title():
+        y = page_height - PDF_MARGIN
+        title_lines = ['ATTENDANCE FOR THE']
+        title_lines += simpleSplit(str(event_name), PDF_BOLD_FONT, 18, page_width - 2 * PDF_MARGIN)
+        title_lines += ['BY', 'GDGoc SVEC X AIKYAM']
+        c.setFont(PDF_BOLD_FONT, 18)
+        for line in title_lines:
+            y -= 24
+            c.drawCentredString(page_width / 2, y, line)
+        y -= 30
+        c.setFont(PDF_BOLD_FONT, 14)
+        c.drawString(PDF_MARGIN, y, f"Category: {'All Branches' if show_branch else department}")
+        c.setFont(PDF_FONT, PDF_FONT_SIZE)
+        y -= 18
+        c.drawString(PDF_MARGIN, y, f"Date: {date_str}")
+        y -= 14
+        c.drawString(PDF_MARGIN, y, f"Total Students: {total}")
+        return y - 18
+
+    def draw_header_row(top):
+        c.setFillColor(colors.grey)
+        c.rect(table_left, top - PDF_HEADER_HEIGHT, table_width, PDF_HEADER_HEIGHT, stroke=0, fill=1)
+        c.setFillColor(colors.whitesmoke)
+        c.setFont(PDF_BOLD_FONT, PDF_FONT_SIZE)
+        for left, width, text in zip(col_lefts, col_widths, headers):
+            c.drawCentredString(left + width / 2, top - PDF_HEADER_HEIGHT + 9, text)
+        return top - PDF_HEADER_HEIGHT
+
+    def draw_grid(row_lines):
+        c.setStrokeColor(colors.black)
+        c.setLineWidth(1)
+        c.grid(col_lefts + [table_left + table_width], row_lines)
+
+    y = draw_header_row(draw_title())
+    row_lines = [y + PDF_HEADER_HEIGHT, y]
+
+    for idx, record in enumerate(records, 1):
+        if y - PDF_ROW_HEIGHT < PDF_MARGIN:
+            draw_grid(row_lines)
+            c.showPage()
+            y = draw_header_row(page_height - PDF_MARGIN)
+            row_lines = [y + PDF_HEADER_HEIGHT, y]
+
+        c.setFillColor(colors.whitesmoke)
+        c.rect(table_left, y - PDF_ROW_HEIGHT, table_width, PDF_ROW_HEIGHT, stroke=0, fill=1)
+        c.setFillColor(colors.black)
+        c.setFont(PDF_FONT, PDF_FONT_SIZE)
+        cells = [str(idx), record.get('rollNumber', ''), record.get('name', '')]
+        if show_branch:
+            cells.append(record.get('branch', ''))
+        for left, width, text in zip(col_lefts, col_widths, cells):
+            c.drawCentredString(left + width / 2, y - PDF_ROW_HEIGHT + 5, _fit(text, width - 6))
+        y -= PDF_ROW_HEIGHT
+        row_lines.append(y)
+        if on_progress and idx % PROGRESS_EVERY == 0:
+            on_progress(idx)
+
+    draw_grid(row_lines)
+    c.showPage()
+    c.save()
+
+
+def export_row(record):
+    ts = record.get('timestamp')
+    return [
+        record.get('rollNumber', 'UNKNOWN'),
+        record.get('name', ''),
+        record.get('branch', ''),
+        ts.strftime('%Y-%m-%dT%H:%M:%SZ') if isinstance(ts, datetime) else str(record.get('time', ''))
+    ]
+
+
+def write_attendance_xlsx(records, out, on_progress=None):
+    """Write records into a write-only (constant memory) workbook."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Present Students')
+    ws.append(EXPORT_COLUMNS)
+    for idx, record in enumerate(records, 1):
+        ws.append(export_row(record))
+        if on_progress and idx % PROGRESS_EVERY == 0:
+            on_progress(idx)
+    wb.save(out)
+
+
+def iter_attendance_csv(records, on_progress=None):
+    """Yield the CSV export in chunks of CSV_CHUNK_ROWS rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the file as UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_COLUMNS)
+    for idx, record in enumerate(records, 1):
+        writer.writerow(export_row(record))
+        if on_progress and idx % PROGRESS_EVERY == 0:
+            on_progress(idx)
+        if idx % CSV_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def run_export_job(mongo_uri, db_name, job_id, fmt, event_id, department, event_name, date_str, out_path):
+    """Render one export into out_path from a worker process.
+
+    The worker uses its own MongoClient and records progress on the job's
+    export_jobs document. Returns the number of rows written.
+    """
+    client = MongoClient(mongo_uri)
+    jobs = client[db_name]['export_jobs']
+    try:
+        db = client[db_name]
+        query = {'eventId': event_id}
+        if department != 'ALL':
+            query['branch'] = department
+
+        total = db['attendance'].count_documents(query)
+        jobs.update_one({'_id': job_id}, {'$set': {'state': 'running', 'done': 0, 'total': total}})
+
+        def progress(done):
+            jobs.update_one({'_id': job_id}, {'$set': {'done': done}})
+
+        records = db['attendance'].find(query, EXPORT_PROJECTION).sort('timestamp', 1).batch_size(PROGRESS_EVERY)
+        with open(out_path, 'wb') as out:
+            if fmt == 'pdf':
+                render_attendance_pdf(records, out, event_name, department, total, date_str, on_progress=progress)
+            elif fmt == 'xlsx':
+                write_attendance_xlsx(records, out, on_progress=progress)
+            else:
+                for chunk in iter_attendance_csv(records, on_progress=progress):
+                    out.write(chunk.encode('utf-8'))
+        # The parent only moves a file into the cache once this is recorded
+        jobs.update_one({'_id': job_id}, {'$set': {'state': 'rendered', 'done': total}})
+        return total
+    except Exception as e:
+        # The parent only sees the exit code; leave the reason on the job
+        try:
+            jobs.update_one({'_id': job_id}, {'$set': {'error': str(e)}})
+        except Exception:
+            pass
+        raise
+    finally:
+        client.close()
+
+
+class ExportCache:
+    """Size-bounded LRU cache of rendered export files on disk.
+
+    Keys include the event's attendance version, so any attendance change makes
+    new downloads miss and the stale files age out. File mtimes track use.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, ext):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.{ext}")
+
+    def _open_cached(self, path):
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return f
+
+    def _discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def lookup(self, key, ext):
+        """Open the cached file for key, or return None on a miss."""
+        return self._open_cached(self._path(key, ext))
+
+    def reserve(self):
+        """Path of a new temp file inside the cache directory to render into."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        return tmp_path
+
+    def commit(self, tmp_path, key, ext):
+        """Move a rendered temp file into the cache and open it."""
+        path = self._path(key, ext)
+        os.replace(tmp_path, path)
+        # Opened before eviction so the file can still be served if it gets evicted
+        f = open(path, 'rb')
+        self.evict()
+        return f
+
+    def discard(self, tmp_path):
+        self._discard(tmp_path)
+
+    def stream(self, key, ext, chunks):
+        """Yield a cached file, or pass chunks through while caching them.
+
+        The file is only stored once every chunk was sent.
+        """
+        path = self._path(key, ext)
+        f = self._open_cached(path)
+        if f:
+            with f:
+                while True:
+                    block = f.read(CACHE_READ_BLOCK)
+                    if not block:
+                        return
+                    yield block
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        completed = False
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in chunks:
+                    data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+                    out.write(data)
+                    yield data
+            os.replace(tmp_path, path)
+            completed = True
+        finally:
+            if not completed:
+                self._discard(tmp_path)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used files until the cache fits in max_bytes."""
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith('.tmp'):
+                if now - st.st_mtime > CACHE_TMP_MAX_AGE:
+                    self._discard(path)
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._discard(path)
+            total -= size
@@ -1,17 +1,32 @@
 import os
+import subprocess
+import sys
+from dotenv import load_dotenv
 
 # Gunicorn configuration file
 # See: https://docs.gunicorn.org/en/stable/configure.html
 
+# Same .env as app.py, so ASYNC_MODE and SOCKETIO_MESSAGE_QUEUE agree
+load_dotenv()
+
 # Bind to the port provided by environment or default to 5000
 bind = "0.0.0.0:" + os.getenv("PORT", "5000")
 
-# Worker type - Eventlet is recommended for SocketIO/Flask-SocketIO
-worker_class = "eventlet"
+# Worker type - Eventlet is recommended for SocketIO/Flask-SocketIO.
+# Follows ASYNC_MODE so gunicorn and app.py's SocketIO use the same model.
+async_mode = os.getenv("ASYNC_MODE", "eventlet")
+worker_class = {"eventlet": "eventlet", "gevent": "gevent", "threading": "gthread"}[async_mode]
+if async_mode == "threading":
+    threads = int(os.getenv("GUNICORN_THREADS", "16"))
 
 # Number of workers - For Eventlet, 1 is usually enough per container
 # as it handles concurrency via green threads.
-workers = 1
+# More workers need SOCKETIO_MESSAGE_QUEUE so live counts reach dashboards
+# connected to the other workers.
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+if workers > 1 and not os.getenv("SOCKETIO_MESSAGE_QUEUE"):
+    print(f"WEB_CONCURRENCY={workers} ignored: set SOCKETIO_MESSAGE_QUEUE to run more than one worker")
+    workers = 1
 
 # Timeout for workers
 timeout = 120
@@ -20,3 +35,22 @@ timeout = 120
 accesslog = "-"
 errorlog = "-"
 loglevel = "info"
+
+
+def on_starting(server):
+    # Apply pending database migrations once per deploy, before any worker is
+    # forked. A separate process keeps app.py (and its eventlet/gevent patching
+    # and MongoClient) out of the master, and gunicorn's worker timeout out of
+    # long migrations; the lock in the migrations collection still serializes
+    # several instances. Workers are not started on a database whose
+    # migrations failed.
+    result = subprocess.run([sys.executable, "-m", "flask", "--app", "app", "prestart"], cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        server.log.error("flask --app app prestart failed with exit code %s", result.returncode)
+        raise RuntimeError("database migrations failed; see the prestart output above")
+
+
+def post_worker_init(worker):
+    # Resume this worker's background jobs (event purges, rollups)
+    from app import startup
+    startup()
@@ -0,0 +1,59 @@
+"""Socket.IO message queue backends for running more than one server process.
+
+Rooms joined through on_join only exist in the process that holds the
+socket, so with several gunicorn workers (or instances) every broadcast has to
+go through a pub/sub backend that all of them listen on. Redis, Kafka and
+ZeroMQ URLs are handed to Flask-SocketIO as its message_queue; loopback:// is
+an in-process stand-in that lets several servers in one process (see
+`python bench.py fanout`) exchange broadcasts without an external service.
+"""
+import json
+import queue
+import threading
+
+import socketio
+
+LOOPBACK_SCHEME = 'loopback://'
+DEFAULT_CHANNEL = 'flask-socketio'
+
+
+class LoopbackManager(socketio.PubSubManager):
+    """Pub/sub client manager whose "queue" is shared by all servers in this process."""
+    name = 'loopback'
+
+    # channel -> message queues of every listening manager
+    _subscribers = {}
+    _lock = threading.Lock()
+
+    def __init__(self, url=LOOPBACK_SCHEME, channel=DEFAULT_CHANNEL, write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.url = url
+        self.queue = queue.Queue()
+
+    def initialize(self):
+        # Only managers that listen are subscribed, so write-only ones never pile up messages
+        if not self.write_only:
+            with self._lock:
+                self._subscribers.setdefault(self.channel, []).append(self.queue)
+        super().initialize()
+
+    def _publish(self, data):
+        # Serialized like the real backends, so receivers never share objects with the sender
+        message = json.dumps(data)
+        with self._lock:
+            subscribers = list(self._subscribers.get(self.channel, []))
+        for q in subscribers:
+            q.put(message)
+
+    def _listen(self):
+        while True:
+            yield self.queue.get()
+
+
+def socketio_queue_options(url, channel=DEFAULT_CHANNEL):
+    """Keyword arguments for SocketIO() that route broadcasts through the queue at url."""
+    if not url:
+        return {}
+    if url.startswith(LOOPBACK_SCHEME):
+        return {'client_manager': LoopbackManager(url, channel=channel)}
+    return {'message_queue': url, 'channel': channel}
@@ -0,0 +1,229 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Counters and histograms are updated on the hot paths; gauges that mirror
+state kept elsewhere (cache counters, room sizes) are read through callbacks
+when /metrics is scraped. Every worker process keeps its own values.
+"""
+import threading
+import time
+
+from flask import g, request
+from pymongo import monitoring
+
+# Seconds; covers a cached session check up to a slow export
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}" for key, v in values]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][i] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labels)
+
+    def render(self):
+        with self.lock:
+            values = sorted((key, dict(entry, counts=list(entry['counts']))) for key, entry in self.values.items())
+        lines = self.header()
+        label_names = self.labels + ('le',)
+        for key, entry in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry['counts']):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(label_names, key + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(label_names, key + ('+Inf',))} {entry['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(entry['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {entry['count']}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class CallbackMetric(Metric):
+    """Metric read at scrape time; fn returns a number or a {label values tuple: number} dict.
+
+    Used for state that is already counted elsewhere (kind 'counter') or is a
+    current level (kind 'gauge').
+    """
+
+    def __init__(self, name, help_text, fn, labels=(), kind='gauge'):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}" for key, v in sorted(values.items())
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def callback(self, name, help_text, fn, labels=(), kind='gauge'):
+        return self.register(CallbackMetric(name, help_text, fn, labels, kind))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Time spent handling HTTP requests.', ('route', 'method', 'status'))
+MONGO_COMMAND_DURATION = registry.histogram(
+    'mongo_command_duration_seconds', 'MongoDB command round trips.', ('collection', 'command'))
+MONGO_COMMAND_FAILURES = registry.counter(
+    'mongo_command_failures_total', 'MongoDB commands that returned an error.', ('collection', 'command'))
+SOCKETIO_EMITS = registry.counter(
+    'socketio_emits_total', 'Socket.IO events emitted by this process.', ('event',))
+EXPORT_DURATION = registry.histogram(
+    'export_render_seconds', 'Time from starting an export job until its file was ready.', ('format', 'state'))
+UPLOAD_DURATION = registry.histogram(
+    'roster_upload_seconds', 'Roster upload processing time, from parsing the sheet to the bulk upsert.')
+UPLOAD_ROWS = registry.counter(
+    'roster_upload_rows_total', 'Roster rows processed by upload_students, by outcome.', ('outcome',))
+
+
+def init_app(app):
+    """Record the latency of every request, labelled by its URL rule rather than the raw path."""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_DURATION.observe(time.perf_counter() - start, route=route, method=request.method, status=response.status_code)
+        return response
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every MongoDB command per collection and command name."""
+
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        if not isinstance(collection, str):
+            collection = ''
+        with self.lock:
+            self.pending[(event.connection_id, event.request_id)] = collection
+
+    def _collection(self, event):
+        with self.lock:
+            return self.pending.pop((event.connection_id, event.request_id), '')
+
+    def succeeded(self, event):
+        MONGO_COMMAND_DURATION.observe(
+            event.duration_micros / 1e6, collection=self._collection(event), command=event.command_name)
+
+    def failed(self, event):
+        collection = self._collection(event)
+        MONGO_COMMAND_DURATION.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+        MONGO_COMMAND_FAILURES.inc(collection=collection, command=event.command_name)
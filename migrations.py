@@ -0,0 +1,133 @@
+"""Versioned database migrations, applied once per database.
+
+Migrations register with @migration(version, description) and run() applies
+the pending ones in version order, recording each applied version in the
+migrations collection. A lease document in the same collection makes sure
+only one process (gunicorn master, instance or CLI) applies them while the
+others wait for it to finish; a heartbeat thread keeps renewing the lease
+while the holder works, however long a migration takes. Migrations must be
+idempotent: a process that dies halfway through leaves its current
+migration unrecorded, and the next run repeats it.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+LOCK_ID = 'lock'
+# A lock holder that died is taken over after this many seconds
+LEASE_SECONDS = 300
+WAIT_POLL_SECONDS = 1
+
+_registry = {}
+
+
+def migration(version, description):
+    """Register the decorated function as migration `version`."""
+    def register(fn):
+        if version in _registry:
+            registered = _registry[version][1]
+            # A second copy of the same module (bench.py loads app.py once per worker) keeps the first
+            if (registered.__code__.co_filename, registered.__qualname__) == (fn.__code__.co_filename, fn.__qualname__):
+                return fn
+            raise ValueError(f"Duplicate migration version {version}")
+        _registry[version] = (description, fn)
+        return fn
+    return register
+
+
+def applied_versions(collection):
+    return {doc['_id']: doc for doc in collection.find({'_id': {'$ne': LOCK_ID}})}
+
+
+def status(collection):
+    """[(version, description, applied_at or None)] for every registered migration."""
+    applied = applied_versions(collection)
+    return [
+        (version, description, applied.get(version, {}).get('applied_at'))
+        for version, (description, _) in sorted(_registry.items())
+    ]
+
+
+def pending(collection):
+    applied = applied_versions(collection)
+    return [(version, description, fn) for version, (description, fn) in sorted(_registry.items()) if version not in applied]
+
+
+def _acquire(collection, owner, lease):
+    now = datetime.utcnow()
+    try:
+        # Matches only a free (expired) lock; a held one makes the upsert collide on _id
+        collection.find_one_and_update(
+            {'_id': LOCK_ID, 'expires_at': {'$lt': now}},
+            {'$set': {'owner': owner, 'expires_at': now + timedelta(seconds=lease)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def _renew(collection, owner, lease):
+    collection.update_one(
+        {'_id': LOCK_ID, 'owner': owner},
+        {'$set': {'expires_at': datetime.utcnow() + timedelta(seconds=lease)}}
+    )
+
+
+def _heartbeat(collection, owner, lease, stop):
+    # Renew well before expiry, so a slow migration never looks abandoned
+    while not stop.wait(lease / 3):
+        try:
+            _renew(collection, owner, lease)
+        except Exception:
+            pass
+
+
+def _release(collection, owner):
+    collection.delete_one({'_id': LOCK_ID, 'owner': owner})
+
+
+def run(collection, log=print, lease=LEASE_SECONDS, wait_timeout=600, sleep=time.sleep):
+    """Apply pending migrations, or wait while another process applies them.
+
+    Returns the versions applied by this call.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    deadline = time.monotonic() + wait_timeout
+    while True:
+        if not pending(collection):
+            return []
+        if _acquire(collection, owner, lease):
+            break
+        if time.monotonic() > deadline:
+            raise RuntimeError('Timed out waiting for migrations running in another process')
+        sleep(WAIT_POLL_SECONDS)
+
+    applied = []
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(collection, owner, lease, stop), daemon=True)
+    heartbeat.start()
+    try:
+        # Re-read under the lock: the previous holder may have applied some
+        for version, description, fn in pending(collection):
+            log(f"Applying migration {version}: {description}")
+            start = time.monotonic()
+            fn()
+            collection.insert_one({
+                '_id': version,
+                'description': description,
+                'applied_at': datetime.utcnow(),
+                'duration_s': round(time.monotonic() - start, 3),
+                'owner': owner
+            })
+            applied.append(version)
+    finally:
+        stop.set()
+        heartbeat.join()
+        _release(collection, owner)
+    return applied
@@ -0,0 +1,186 @@
+"""Query-plan audit of the app's MongoDB access patterns.
+
+app.QUERY_SHAPES lists the queries the app sends, with sample values.
+audit() explains each of them against a scratch database that was seeded
+with seed() and carries app.INDEXES, then flags collection scans, in-memory
+sorts and projections that should be answered from an index alone but fetch
+the documents. explain needs a real MongoDB server; mongomock has no planner.
+"""
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+# Sample values used by the query shapes; they match the seeded documents
+AUDIT_EVENT_ID = '5f0000000000000000000001'
+OTHER_EVENT_ID = '5f0000000000000000000002'
+AUDIT_BRANCH = 'CSE'
+SEED_BRANCHES = ['CSE', 'ECE', 'EEE', 'AIML', 'MECH', 'CIVIL', 'IT']
+SEED_ADMINS = 41
+
+PROBLEMS = {
+    'COLLSCAN': 'collection scan',
+    'SORT': 'in-memory sort',
+    'FETCH': 'projection not covered by an index',
+}
+
+
+def query_shape(name, collection, op='find', filter=None, projection=None, sort=None, limit=0,
+                pipeline=None, key=None, covered=False, index=None, allow=()):
+    """Describe one query of the app.
+
+    covered marks queries whose projection should be answered from an index
+    alone; index is the index proposed when the plan is flagged; allow lists
+    problem codes (see PROBLEMS) accepted for this shape.
+    """
+    return {
+        'name': name, 'collection': collection, 'op': op, 'filter': filter or {},
+        'projection': projection, 'sort': sort, 'limit': limit, 'pipeline': pipeline, 'key': key,
+        'covered': covered, 'index': index, 'allow': set(allow),
+    }
+
+
+def seed(db, rows):
+    """Register `rows` students and give two events their roster and attendance, plus the small collections."""
+    base = datetime(2025, 1, 1, 9, 0)
+    db['events'].insert_many([
+        {'_id': ObjectId(event_id), 'name': f"Audit {event_id[-1]}", 'created_at': base + timedelta(days=n)}
+        for n, event_id in enumerate([AUDIT_EVENT_ID, OTHER_EVENT_ID])
+    ])
+    db['student_registry'].insert_many([
+        {'_id': f"23A{i:05d}", 'name': f"Student {i}", 'branch': SEED_BRANCHES[i % len(SEED_BRANCHES)], 'updated_at': base}
+        for i in range(rows)
+    ])
+    for event_id in (AUDIT_EVENT_ID, OTHER_EVENT_ID):
+        students, attendance = [], []
+        for i in range(rows):
+            roll_number = f"23A{i:05d}"
+            branch = SEED_BRANCHES[i % len(SEED_BRANCHES)]
+            students.append({'rollNumber': roll_number, 'eventId': event_id})
+            timestamp = base + timedelta(seconds=i)
+            attendance.append({
+                'rollNumber': roll_number, 'eventId': event_id, 'name': f"Student {i}", 'branch': branch,
+                'timestamp': timestamp, 'time': timestamp.strftime('%I:%M %p'), 'date': timestamp.strftime('%Y-%m-%d')
+            })
+        db['students'].insert_many(students)
+        db['attendance'].insert_many(attendance)
+        db['event_stats'].insert_one({'_id': event_id, 'total': rows, 'branch_counts': {}, 'version': 1})
+        minutes = sorted({r['timestamp'].replace(second=0) for r in attendance})
+        db['arrival_buckets'].insert_many([
+            {'eventId': event_id, 'minute': minute, 'total': 60, 'branch_counts': {}} for minute in minutes
+        ])
+    db['student_participation'].insert_many([
+        {'_id': f"23A{i:05d}", 'events': 1 + i % 3, 'history': {AUDIT_EVENT_ID: base}}
+        for i in range(rows)
+    ])
+    usernames = ['GDGADMIN'] + [f"GDGMEMBER{i}" for i in range(1, SEED_ADMINS)]
+    db['admins'].insert_many([
+        {'username': username, 'username_key': username.casefold(), 'password': 'x'} for username in usernames
+    ])
+    db['export_jobs'].insert_one({'_id': 'audit-job', 'state': 'done', 'created_at': base})
+    db['idempotency_keys'].insert_one({'_id': 'audit-key', 'status': 'done', 'created_at': base})
+
+
+def explain_command(shape):
+    name, op = shape['collection'], shape['op']
+    if op == 'find':
+        command = {'find': name, 'filter': shape['filter']}
+        if shape['projection']:
+            command['projection'] = shape['projection']
+        if shape['sort']:
+            command['sort'] = dict(shape['sort'])
+        if shape['limit']:
+            command['limit'] = shape['limit']
+    elif op == 'count':
+        command = {'count': name, 'query': shape['filter']}
+    elif op == 'distinct':
+        command = {'distinct': name, 'key': shape['key'], 'query': shape['filter']}
+    elif op == 'aggregate':
+        command = {'aggregate': name, 'pipeline': shape['pipeline'], 'cursor': {}}
+    elif op == 'delete':
+        command = {'delete': name, 'deletes': [{'q': shape['filter'], 'limit': 0}]}
+    else:
+        raise ValueError(f"Unknown query op {op!r}")
+    return command
+
+
+def winning_plans(explain):
+    """Every winningPlan in an explain result; aggregations nest one per $cursor stage or shard."""
+    plans = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == 'winningPlan' and isinstance(value, dict):
+                    # Slot-based engine plans keep the classic tree under queryPlan
+                    plans.append(value.get('queryPlan', value))
+                else:
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(explain)
+    return plans
+
+
+def plan_stages(plan):
+    """Stage names of a plan tree, root first."""
+    stages = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if isinstance(node.get('stage'), str):
+                stages.append(node['stage'])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(plan)
+    return stages
+
+
+def plan_problems(shape, stages):
+    problems = []
+    if 'COLLSCAN' in stages:
+        problems.append('COLLSCAN')
+    if 'SORT' in stages:
+        problems.append('SORT')
+    if shape['covered'] and 'FETCH' in stages:
+        problems.append('FETCH')
+    return [p for p in problems if p not in shape['allow']]
+
+
+def audit(db, shapes):
+    """Explain every shape; returns [(shape, stages, problems)]."""
+    results = []
+    for shape in shapes:
+        explain = db.command('explain', explain_command(shape), verbosity='queryPlanner')
+        stages = []
+        for plan in winning_plans(explain):
+            stages += plan_stages(plan)
+        results.append((shape, stages, plan_problems(shape, stages)))
+    return results
+
+
+def proposed_indexes(results):
+    """[(collection, keys)] of the indexes proposed for flagged shapes, without duplicates."""
+    proposals = []
+    for shape, _, problems in results:
+        if problems and shape['index']:
+            proposal = (shape['collection'], list(shape['index']))
+            if proposal not in proposals:
+                proposals.append(proposal)
+    return proposals
+
+
+def format_report(results):
+    lines = []
+    for shape, stages, problems in results:
+        status = 'FLAG' if problems else 'ok'
+        plan = ' <- '.join(stages) or '?'
+        lines.append(f"{status:<4}  {shape['collection']:<16} {shape['name']:<36} {plan}")
+        for problem in problems:
+            lines.append(f"      - {PROBLEMS[problem]}")
+    return lines
@@ -0,0 +1,115 @@
+"""JSON serialization and response compression shared by every route.
+
+JSON goes through orjson when it is installed (pip install orjson) and
+through the standard library otherwise; both write ObjectId as its hex
+string and datetime as ISO 8601, so views can return MongoDB documents
+as they are. Responses of a compressible type larger than min_size are
+compressed with brotli or gzip, whichever the client prefers; without
+the brotli package (in requirements.txt) only gzip is offered. Streamed
+and file responses are passed through untouched.
+"""
+import gzip
+import json
+from datetime import date, datetime
+
+from bson import ObjectId
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {'application/json', 'application/javascript', 'image/svg+xml'}
+# Fast settings: on a busy venue network the request should not wait on the CPU
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider writing ObjectId and datetime natively, with orjson when available."""
+
+    def _orjson_options(self):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=_default, option=self._orjson_options()).decode()
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is not None:
+            # Bytes straight into the response, without a str round trip
+            body = orjson.dumps(obj, default=_default, option=self._orjson_options())
+        else:
+            body = self.dumps(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def _encoding():
+    accept = request.accept_encodings
+    if brotli is not None and accept['br'] and accept['br'] >= accept['gzip']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def init_app(app, min_size=1024):
+    """Install the JSON provider and compress eligible responses of at least min_size bytes."""
+    app.json_provider_class = JSONProvider
+    app.json = JSONProvider(app)
+
+    @app.after_request
+    def _compress(response):
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or not ((response.mimetype or '').startswith('text/') or response.mimetype in COMPRESSIBLE_TYPES)
+        ):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = _encoding()
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            # Same content in another encoding: still matches the uncompressed representation's tag weakly
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,157 @@
+"""Cross-event participation rollups, maintained incrementally with $merge.
+
+Two summary collections are derived from attendance:
+
+* student_participation: one document per roll number with the events the
+  student attended (history: event id -> check-in time), their count,
+  first/last check-in and the latest name/branch.
+* event_participation: one document per event with its per-branch counts.
+
+Each run also stores how many students attended how many events on the
+state document, so the analytics summary does not scan the students.
+
+Each run only aggregates attendance with a timestamp between the stored
+watermark and now minus SETTLE_SECONDS, so its cost follows the new
+records rather than the whole history. The student merge is keyed by event
+id and event documents are recomputed whole, so re-running a window (after
+a crash before the watermark moved) or an attendance record deleted and
+added again changes no count. Deletions are only
+picked up by a full rebuild, which aggregates everything into fresh
+collections and swaps them in. Needs MongoDB 4.2+ ($merge).
+"""
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+STATE_ID = 'attendance'
+# Records younger than this are left for the next run, so inserts still in flight are not skipped
+SETTLE_SECONDS = 60
+LEASE_SECONDS = 600
+
+STUDENTS = 'student_participation'
+EVENTS = 'event_participation'
+# The top-students list; a full rebuild creates it before swapping the collection in
+STUDENT_INDEXES = [[('events', -1)]]
+
+
+def student_pipeline(match, into):
+    return [
+        {'$match': match},
+        {'$sort': {'timestamp': 1}},
+        {'$group': {
+            '_id': '$rollNumber',
+            'name': {'$last': '$name'},
+            'branch': {'$last': '$branch'},
+            'first_at': {'$min': '$timestamp'},
+            'last_at': {'$max': '$timestamp'},
+            'history': {'$push': {'k': '$eventId', 'v': '$timestamp'}}
+        }},
+        {'$set': {'history': {'$arrayToObject': '$history'}}},
+        {'$set': {'events': {'$size': {'$objectToArray': '$history'}}}},
+        {'$merge': {
+            'into': into,
+            'on': '_id',
+            'whenMatched': [
+                {'$set': {
+                    # Keyed by event id: an event seen again only updates its check-in time
+                    'history': {'$mergeObjects': ['$history', '$$new.history']},
+                    'first_at': {'$min': ['$first_at', '$$new.first_at']},
+                    'last_at': {'$max': ['$last_at', '$$new.last_at']},
+                    'name': {'$cond': [{'$gte': ['$$new.last_at', '$last_at']}, '$$new.name', '$name']},
+                    'branch': {'$cond': [{'$gte': ['$$new.last_at', '$last_at']}, '$$new.branch', '$branch']}
+                }},
+                {'$set': {'events': {'$size': {'$objectToArray': '$history'}}}}
+            ],
+            'whenNotMatched': 'insert'
+        }}
+    ]
+
+
+def event_pipeline(match, into):
+    return [
+        {'$match': match},
+        {'$group': {'_id': {'eventId': '$eventId', 'branch': {'$ifNull': ['$branch', 'UNKNOWN']}}, 'count': {'$sum': 1}}},
+        {'$group': {
+            '_id': '$_id.eventId',
+            'branch_counts': {'$push': {'k': '$_id.branch', 'v': '$count'}},
+            'total': {'$sum': '$count'}
+        }},
+        {'$set': {'branch_counts': {'$arrayToObject': '$branch_counts'}}},
+        {'$merge': {'into': into, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ]
+
+
+def events_per_student(db):
+    """[{'events': n, 'students': count}] over student_participation, fewest events first."""
+    pipeline = [{'$group': {'_id': '$events', 'students': {'$sum': 1}}}, {'$sort': {'_id': 1}}]
+    return [{'events': d['_id'], 'students': d['students']} for d in db[STUDENTS].aggregate(pipeline)]
+
+
+def _acquire(state, owner, now, lease):
+    try:
+        # Matches only a free lease; a held one makes the upsert collide on _id
+        return state.find_one_and_update(
+            {'_id': STATE_ID, '$or': [{'lease_until': None}, {'lease_until': {'$lt': now}}]},
+            {'$set': {'owner': owner, 'lease_until': now + timedelta(seconds=lease)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return None
+
+
+def run(db, owner, full=False, lease=LEASE_SECONDS, now=None):
+    """Fold attendance newer than the watermark into the summary collections.
+
+    Returns a summary of the run, or None when another process holds the lease.
+    """
+    now = now or datetime.now()
+    state = db['rollups']
+    doc = _acquire(state, owner, now, lease)
+    if doc is None:
+        return None
+    try:
+        low = None if full else doc.get('watermark')
+        high = now - timedelta(seconds=SETTLE_SECONDS)
+        match = {'timestamp': {'$lt': high}}
+        if low:
+            match['timestamp']['$gte'] = low
+
+        if full:
+            students_into, events_into = f"{STUDENTS}_rebuild", f"{EVENTS}_rebuild"
+            db[students_into].drop()
+            db[events_into].drop()
+            event_ids = None
+        else:
+            students_into, events_into = STUDENTS, EVENTS
+            event_ids = db['attendance'].distinct('eventId', match)
+
+        db['attendance'].aggregate(student_pipeline(match, students_into), allowDiskUse=True)
+        # Events touched in the window are recounted whole, which also reflects deletions in them
+        if full:
+            db['attendance'].aggregate(event_pipeline({'timestamp': {'$lt': high}}, events_into), allowDiskUse=True)
+        elif event_ids:
+            db['attendance'].aggregate(event_pipeline({'eventId': {'$in': event_ids}}, events_into), allowDiskUse=True)
+
+        if full:
+            if students_into in db.list_collection_names():
+                for keys in STUDENT_INDEXES:
+                    db[students_into].create_index(keys)
+            for into, target in ((students_into, STUDENTS), (events_into, EVENTS)):
+                if into in db.list_collection_names():
+                    db[into].rename(target, dropTarget=True)
+                else:
+                    db[target].drop()
+
+        update = {'watermark': high, 'updated_at': datetime.now(), 'events_per_student': events_per_student(db)}
+        if full:
+            update['full_at'] = update['updated_at']
+        state.update_one({'_id': STATE_ID}, {'$set': update})
+        return {'from': low, 'to': high, 'full': full, 'events': None if full else len(event_ids)}
+    finally:
+        state.update_one({'_id': STATE_ID, 'owner': owner}, {'$unset': {'owner': '', 'lease_until': ''}})
+
+
+def state(db):
+    return db['rollups'].find_one({'_id': STATE_ID}) or {}
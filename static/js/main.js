@@ -14,20 +14,74 @@ let currentBranchFilter = 'ALL';
 let html5QrcodeScanner;
 let pendingRollNumber = null;
 
+// Scans that could not reach the server are kept here and retried in batches
+const SCAN_QUEUE_KEY = 'pendingScans';
+const SCAN_BATCH_SIZE = 500;
+let pendingScans = JSON.parse(localStorage.getItem(SCAN_QUEUE_KEY) || '[]');
+let flushingScans = false;
+// Set when the session expired; saved scans wait until the admin logs in again
+let scanQueuePaused = false;
+let addStudentKey = null;
+const ATTENDEES_PAGE_SIZE = 500;
+// Attendance version the open attendees list reflects; attendee_delta entries with later seq are applied in order
+let attendeesVersion = null;
+let attendeeRolls = new Set();
+let pendingDeltas = new Map();
+// A missing delta may still be in flight from another worker; reload the list if it has not arrived by then
+const DELTA_GAP_RESYNC_MS = 2000;
+let deltaGapTimer = null;
+let addStudentAttempt = null;
+// Check-ins per minute of the selected event (ISO minute -> count), shown for the last TIMELINE_MINUTES
+const TIMELINE_MINUTES = 30;
+let arrivalBuckets = {};
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
 // Initial Load
 document.addEventListener("DOMContentLoaded", () => {
     loadEvents();
     initScanner();
+    flushScanQueue();
 });
+window.addEventListener('online', flushScanQueue);
+setInterval(flushScanQueue, 5000);
 
 // Socket IO Listeners
 socket.on('update_counts', (data) => {
     // Only update if the event ID matches the currently selected one
     if (data.event_id === currentEventId) {
         updateStats(data);
+        if (data.version > attendeesVersion) checkDeltaGap(data.version);
     }
 });
 
+socket.on('attendee_delta', (data) => {
+    if (data.event_id !== currentEventId || document.getElementById('viewListModal').style.display !== 'block') return;
+    // Deltas arriving while the list loads wait for its version
+    data.deltas.forEach(d => { if (attendeesVersion === null || d.seq > attendeesVersion) pendingDeltas.set(d.seq, d); });
+    applyPendingDeltas();
+});
+
+// Rooms do not survive a reconnect, and deltas sent meanwhile are lost
+socket.on('connect', () => {
+    if (!currentEventId) return;
+    socket.emit('join_event', { event_id: currentEventId });
+    if (attendeesVersion !== null) filterList(currentBranchFilter);
+});
+
+socket.on('update_timeline', (data) => {
+    if (data.event_id !== currentEventId) return;
+    data.buckets.forEach(b => { arrivalBuckets[b.minute] = b.count; });
+    renderTimeline();
+});
+
+// Progress of export jobs started from this account
+socket.on('export_progress', (job) => updateExportStatus(job));
+socket.on('event_purge', (purge) => updatePurgeStatus(purge));
+
 function loadEvents() {
     fetch('/api/events')
         .then(res => res.json())
@@ -113,6 +167,7 @@ function deleteEvent(eventId, eventName) {
         .then(data => {
             if (data.status === 'SUCCESS') {
                 alert(data.message);
+                updatePurgeStatus(data.purge);
                 if (currentEventId === eventId) {
                     currentEventId = null;
                     localStorage.removeItem('selectedEventId');
@@ -126,6 +181,20 @@ function deleteEvent(eventId, eventName) {
         .catch(err => console.error(err));
 }
 
+function updatePurgeStatus(purge) {
+    const el = document.getElementById('purgeStatus');
+    if (!el || !purge) return;
+    const done = (purge.deleted.students || 0) + (purge.deleted.attendance || 0);
+    const total = (purge.total.students || 0) + (purge.total.attendance || 0);
+    if (purge.state === 'done') {
+        el.innerText = `"${purge.name}" removed (${done} records)`;
+        el.className = 'scan-result success';
+    } else {
+        el.innerText = `Removing "${purge.name}"... ${done}/${total} records`;
+        el.className = 'scan-result';
+    }
+}
+
 function handleEventChange() {
     const select = document.getElementById('eventSelect');
     currentEventId = select.value;
@@ -137,6 +206,7 @@ function handleEventChange() {
         socket.emit('join_event', { event_id: currentEventId });
 
         refreshStats();
+        refreshTimeline();
         updateDownloadLinks();
         // If attendees list modal is open, refresh it
         if (document.getElementById('viewListModal').style.display === 'block') {
@@ -156,6 +226,35 @@ function refreshStats() {
         .catch(err => console.error(err));
 }
 
+function refreshTimeline() {
+    if (!currentEventId) return;
+    const eventId = currentEventId;
+    fetch(`/api/stats/timeline?event_id=${eventId}`)
+        .then(response => response.json())
+        .then(data => {
+            if (eventId !== currentEventId) return;
+            arrivalBuckets = {};
+            data.buckets.forEach(b => { arrivalBuckets[b.minute] = b.count; });
+            renderTimeline();
+        })
+        .catch(err => console.error(err));
+}
+
+function renderTimeline() {
+    const el = document.getElementById('arrivalTimeline');
+    if (!el) return;
+    const minutes = Object.keys(arrivalBuckets).sort().slice(-TIMELINE_MINUTES);
+    const peak = Math.max(1, ...minutes.map(m => arrivalBuckets[m]));
+    el.innerHTML = '';
+    minutes.forEach(minute => {
+        const bar = document.createElement('div');
+        bar.className = 'timeline-bar';
+        bar.style.height = `${Math.round(100 * arrivalBuckets[minute] / peak)}%`;
+        bar.title = `${minute.slice(11, 16)}: ${arrivalBuckets[minute]} check-ins`;
+        el.appendChild(bar);
+    });
+}
+
 function updateStats(data) {
     if (!data) return;
     document.getElementById('totalCount').innerText = data.total;
@@ -181,6 +280,8 @@ function resetStats() {
     document.getElementById('totalCount').innerText = '0';
     document.getElementById('totalStudents').innerText = '0';
     document.getElementById('branchGrid').innerHTML = '';
+    arrivalBuckets = {};
+    renderTimeline();
     // Disable branch PDF buttons
     document.querySelectorAll('.branch-pdf-btn').forEach(btn => {
         btn.href = '#';
@@ -200,6 +301,12 @@ function resetStats() {
         pdfLink.style.opacity = '0.5';
         pdfLink.style.pointerEvents = 'none';
     }
+    const csvLink = document.getElementById('downloadCsvLink');
+    if (csvLink) {
+        csvLink.href = '#';
+        csvLink.style.opacity = '0.5';
+        csvLink.style.pointerEvents = 'none';
+    }
 }
 
 function updateDownloadLinks() {
@@ -224,11 +331,19 @@ function updateDownloadLinks() {
         pdfLink.style.pointerEvents = 'auto';
     }
 
+    const csvLink = document.getElementById('downloadCsvLink');
+    if (csvLink) {
+        csvLink.href = `/download_csv/${currentEventId}`;
+        csvLink.style.opacity = '1';
+        csvLink.style.pointerEvents = 'auto';
+    }
+
     // Update PDF buttons
     document.querySelectorAll('.branch-pdf-btn').forEach(btn => {
         const branch = btn.getAttribute('data-branch');
         if (branch) {
             btn.href = `/download_pdf/${currentEventId}/${branch}`;
+            btn.onclick = (e) => startExport(e, 'pdf', branch);
             btn.style.opacity = '1';
             btn.style.pointerEvents = 'auto';
             btn.classList.remove('disabled');
@@ -241,11 +356,76 @@ function updateDownloadLinks() {
     const modalPdfLink = document.getElementById('downloadCurrentPdf');
     if (modalPdfLink) {
         modalPdfLink.href = `/download_pdf/${currentEventId}/${currentBranchFilter || 'ALL'}`;
+        modalPdfLink.onclick = (e) => startExport(e, 'pdf', currentBranchFilter || 'ALL');
         modalPdfLink.style.opacity = '1';
         modalPdfLink.style.pointerEvents = 'auto';
     }
 }
 
+// Background exports: the file is rendered on the server and downloaded when ready
+const downloadedExports = new Set();
+// Without progress for this long, the job's status is fetched (its server may have restarted)
+const EXPORT_CHECK_MS = 15000;
+const exportChecks = new Map();
+
+function startExport(e, format, department = 'ALL') {
+    e.preventDefault();
+    if (!currentEventId) return;
+
+    fetch('/api/exports', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ event_id: currentEventId, format: format, department: department })
+    })
+        .then(res => res.json())
+        .then(job => {
+            if (!job.job_id) {
+                showExportStatus(job.message || 'Could not start export', 'error');
+                return;
+            }
+            updateExportStatus(job);
+        })
+        .catch(err => {
+            console.error(err);
+            showExportStatus('Could not start export', 'error');
+        });
+}
+
+function updateExportStatus(job) {
+    const label = job.format.toUpperCase();
+    watchExport(job);
+    if (job.state === 'done') {
+        if (downloadedExports.has(job.job_id)) return;
+        downloadedExports.add(job.job_id);
+        showExportStatus(`${label} ready (${job.total} records)`, 'success');
+        window.location.href = job.download_url;
+    } else if (job.state === 'failed') {
+        showExportStatus(`${label} export failed: ${job.error || 'unknown error'}`, 'error');
+    } else {
+        const progress = job.total ? ` ${job.done}/${job.total}` : '';
+        showExportStatus(`Preparing ${label}...${progress}`, '');
+    }
+}
+
+function watchExport(job) {
+    clearTimeout(exportChecks.get(job.job_id));
+    exportChecks.delete(job.job_id);
+    if (job.state === 'done' || job.state === 'failed') return;
+    exportChecks.set(job.job_id, setTimeout(() => {
+        fetch(`/api/exports/${job.job_id}`)
+            .then(res => res.json())
+            .then(status => { if (status.job_id) updateExportStatus(status); })
+            .catch(err => console.error(err));
+    }, EXPORT_CHECK_MS));
+}
+
+function showExportStatus(text, cls) {
+    const el = document.getElementById('exportStatus');
+    if (!el) return;
+    el.innerText = text;
+    el.className = `scan-result ${cls}`;
+}
+
 // Event Creation
 function createNewEvent() {
     const nameInput = document.getElementById('newEventName');
@@ -356,10 +536,13 @@ function markAttendance(rollNumber) {
     resultDiv.innerHTML = 'Processing...';
     resultDiv.className = 'scan-result';
 
+    // One key per scan; it stays with the scan if it has to be queued and resent
+    const eventId = currentEventId;
+    const idempotencyKey = newIdempotencyKey();
     fetch('/api/mark_attendance', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ roll_number: rollNumber, event_id: currentEventId })
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': idempotencyKey },
+        body: JSON.stringify({ roll_number: rollNumber, event_id: eventId })
     })
         .then(async response => {
             const isJson = response.headers.get('content-type')?.includes('application/json');
@@ -371,7 +554,7 @@ function markAttendance(rollNumber) {
             } else if (response.status === 409) {
                 resultDiv.innerText = `Duplicate: Already marked for this event.`;
                 resultDiv.className = 'scan-result warning';
-            } else if (response.status === 404) {
+            } else if (response.status === 404 && data?.status === 'NOT_FOUND') {
                 resultDiv.innerText = `Student not found in this event.`;
                 resultDiv.className = 'scan-result error';
                 openAddStudentModal(data ? data.roll_number : rollNumber);
@@ -386,12 +569,80 @@ function markAttendance(rollNumber) {
             }
         })
         .catch(err => {
-            resultDiv.innerText = `Connection Error. Check your internet.`;
-            resultDiv.className = 'scan-result error';
+            queueScan(rollNumber, eventId, idempotencyKey);
+            resultDiv.innerText = `Connection Error. Scan saved and will be sent automatically (${pendingScans.length} pending).`;
+            resultDiv.className = 'scan-result warning';
             console.error('Fetch Error:', err);
         });
 }
 
+function queueScan(rollNumber, eventId, key) {
+    pendingScans.push({ roll_number: rollNumber, event_id: eventId, key: key });
+    saveScanQueue();
+}
+
+function saveScanQueue() {
+    localStorage.setItem(SCAN_QUEUE_KEY, JSON.stringify(pendingScans));
+}
+
+function flushScanQueue() {
+    if (flushingScans || scanQueuePaused || pendingScans.length === 0 || !navigator.onLine) return;
+
+    // One batch per call, all for the same event. A batch keeps its scans and its
+    // Idempotency-Key (the first scan's key) until the server answers, so a resend
+    // replays the stored result instead of reporting the scans as duplicates.
+    const first = pendingScans[0];
+    const eventId = first.event_id;
+    let batch = first.batch_key ? pendingScans.filter(s => s.batch_key === first.batch_key) : [];
+    if (batch.length === 0) {
+        const batchKey = first.key || newIdempotencyKey();
+        batch = pendingScans.filter(s => s.event_id === eventId && !s.batch_key).slice(0, SCAN_BATCH_SIZE);
+        batch.forEach(s => { s.batch_key = batchKey; });
+        saveScanQueue();
+    }
+    flushingScans = true;
+
+    fetch('/api/mark_attendance/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': batch[0].batch_key },
+        body: JSON.stringify({ event_id: eventId, roll_numbers: batch.map(s => s.roll_number) })
+    })
+        .then(async res => {
+            if (res.ok) return res.json();
+            const data = await res.json().catch(() => ({}));
+            return Promise.reject({ status: res.status, error: data.error });
+        })
+        .then(data => {
+            pendingScans = pendingScans.filter(s => !batch.includes(s));
+            saveScanQueue();
+
+            const summary = data.summary || {};
+            const resultDiv = document.getElementById('scanResult');
+            resultDiv.innerText = `Sent ${batch.length} saved scans: ${summary.SUCCESS || 0} marked, ` +
+                `${summary.DUPLICATE || 0} duplicate, ${summary.NOT_FOUND || 0} not found.`;
+            resultDiv.className = 'scan-result success';
+        })
+        .catch(err => {
+            // Network errors, 5xx, 409 (same batch still in progress) and 429 are retried later
+            const status = err && err.status;
+            const resultDiv = document.getElementById('scanResult');
+            if (status === 401) {
+                scanQueuePaused = true;
+                resultDiv.innerText = `Session expired. Please login again to send ${pendingScans.length} saved scans.`;
+                resultDiv.className = 'scan-result error';
+            } else if (status >= 400 && status < 500 && status !== 409 && status !== 429) {
+                // The server will never accept this batch; drop it so later scans are not stuck behind it
+                pendingScans = pendingScans.filter(s => !batch.includes(s));
+                saveScanQueue();
+                resultDiv.innerText = `Could not send ${batch.length} saved scans: ${err.error || `error ${status}`}.`;
+                resultDiv.className = 'scan-result error';
+            } else {
+                console.error('Scan queue flush failed:', err);
+            }
+        })
+        .finally(() => { flushingScans = false; });
+}
+
 // Modal Functions
 function openModal(modalId) {
     document.getElementById(modalId).style.display = "block";
@@ -494,6 +745,8 @@ function closeModal(modalId) {
         document.querySelectorAll('.modal').forEach(m => m.style.display = 'none');
         pendingRollNumber = null;
     }
+    // A closed list is reloaded when it is opened again
+    if (document.getElementById('viewListModal').style.display !== 'block') resetAttendeeDeltas();
     if (html5QrcodeScanner) {
         try { html5QrcodeScanner.resume(); } catch (e) { }
     }
@@ -510,9 +763,16 @@ function submitNewStudent() {
     const name = document.getElementById('newStudentName').value;
     if (!name || !pendingRollNumber || !currentEventId) return;
 
+    // Re-submitting the same student (e.g. after a timeout) reuses the key
+    const attempt = `${currentEventId}:${pendingRollNumber}:${name}`;
+    if (!addStudentKey || addStudentAttempt !== attempt) {
+        addStudentKey = newIdempotencyKey();
+        addStudentAttempt = attempt;
+    }
+
     fetch('/api/add_student', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': addStudentKey },
         body: JSON.stringify({ roll_number: pendingRollNumber, name: name, event_id: currentEventId })
     })
         .then(response => response.json())
@@ -554,27 +814,108 @@ function filterList(branch) {
         } else {
             downloadBtn.style.display = 'inline-block';
             downloadBtn.href = `/download_pdf/${currentEventId}/${branch}`;
+            downloadBtn.onclick = (e) => startExport(e, 'pdf', branch);
             downloadBtn.innerText = `Download ${branch} PDF`;
         }
     }
 
-    fetch(`/api/attendees?event_id=${currentEventId}&branch=${branch}`)
+    resetAttendeeDeltas();
+    const eventId = currentEventId;
+    const rows = [];
+    let version = null;
+    const loadPage = (cursor) => fetch(attendeesUrl(branch, cursor, ATTENDEES_PAGE_SIZE))
         .then(res => res.json())
-        .then(renderTable)
-        .catch(err => console.error(err));
+        .then(page => {
+            // Later pages may already hold newer rows; deltas for them are skipped by roll number
+            if (version === null) version = page.version;
+            rows.push(...page.items);
+            if (page.has_more) return loadPage(page.next_cursor);
+            if (eventId !== currentEventId || branch !== currentBranchFilter) return;
+            renderTable(rows);
+            attendeesVersion = version;
+            applyPendingDeltas();
+        });
+    loadPage(null).catch(err => console.error(err));
+}
+
+function attendeesUrl(branch, cursor, limit) {
+    let url = `/api/attendees?event_id=${currentEventId}&branch=${branch}`;
+    if (limit) url += `&limit=${limit}`;
+    if (cursor) url += `&since=${encodeURIComponent(cursor)}`;
+    return url;
+}
+
+function resetAttendeeDeltas() {
+    attendeesVersion = null;
+    attendeeRolls = new Set();
+    pendingDeltas.clear();
+    clearTimeout(deltaGapTimer);
+    deltaGapTimer = null;
+}
+
+// Apply queued deltas while they continue the list's version without a gap
+function applyPendingDeltas() {
+    if (attendeesVersion === null) return;
+    let delta;
+    while ((delta = pendingDeltas.get(attendeesVersion + 1))) {
+        pendingDeltas.delete(delta.seq);
+        attendeesVersion = delta.seq;
+        if (delta.op === 'add') addAttendeeRow(delta);
+        else removeAttendeeRow(delta.rollNumber);
+    }
+    pendingDeltas.forEach((_, seq) => { if (seq <= attendeesVersion) pendingDeltas.delete(seq); });
+    if (pendingDeltas.size) checkDeltaGap(Math.max(...pendingDeltas.keys()));
+}
+
+function checkDeltaGap(version) {
+    if (attendeesVersion === null || version <= attendeesVersion || deltaGapTimer) return;
+    deltaGapTimer = setTimeout(() => {
+        deltaGapTimer = null;
+        if (attendeesVersion !== null && version > attendeesVersion) filterList(currentBranchFilter);
+    }, DELTA_GAP_RESYNC_MS);
+}
+
+function addAttendeeRow(delta) {
+    if (attendeeRolls.has(delta.rollNumber)) return;
+    if (currentBranchFilter !== 'ALL' && delta.branch !== currentBranchFilter) return;
+    const tbody = document.getElementById('attendeesTableBody');
+    const s_no = tbody.querySelectorAll('tr[data-roll]').length + 1;
+    appendRows([{ s_no: s_no, rollResult: delta.rollNumber, name: delta.name, branch: delta.branch }]);
+}
+
+function removeAttendeeRow(rollNumber) {
+    if (!attendeeRolls.delete(rollNumber)) return;
+    const rows = Array.from(document.querySelectorAll('#attendeesTableBody tr[data-roll]'));
+    const index = rows.findIndex(tr => tr.dataset.roll === rollNumber);
+    if (index < 0) return;
+    rows[index].remove();
+    rows.slice(index + 1).forEach(tr => { tr.cells[0].textContent = Number(tr.cells[0].textContent) - 1; });
+    if (rows.length === 1) renderTable([]);
 }
 
 function renderTable(data) {
     const tbody = document.getElementById('attendeesTableBody');
     tbody.innerHTML = '';
+    attendeeRolls = new Set();
 
     if (data.length === 0) {
-        tbody.innerHTML = '<tr><td colspan="5" style="text-align:center; padding: 1rem;">No attendees found.</td></tr>';
+        tbody.innerHTML = '<tr class="empty-row"><td colspan="5" style="text-align:center; padding: 1rem;">No attendees found.</td></tr>';
         return;
     }
+    appendRows(data);
+}
+
+function appendRows(data) {
+    const tbody = document.getElementById('attendeesTableBody');
+    if (data.length > 0) {
+        const emptyRow = tbody.querySelector('.empty-row');
+        if (emptyRow) emptyRow.remove();
+    }
 
     data.forEach(row => {
+        attendeeRolls.add(row.rollResult);
         const tr = document.createElement('tr');
+        tr.dataset.roll = row.rollResult;
         tr.innerHTML = `
             <td style="padding: 0.5rem; border-bottom: 1px solid #dadce0;">${row.s_no}</td>
             <td style="padding: 0.5rem; border-bottom: 1px solid #dadce0;">${row.rollResult}</td>
@@ -599,8 +940,8 @@ function deleteFromList(rollNumber) {
         .then(res => res.json())
         .then(data => {
             if (data.status === 'SUCCESS') {
+                // The row goes away with the attendee_delta broadcast
                 alert(data.message);
-                filterList(currentBranchFilter);
             } else {
                 alert("Delete Failed: " + data.message);
             }
@@ -0,0 +1,78 @@
+"""Test setup: app.py runs on threads against an in-memory mongomock database."""
+import importlib.util
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ['ASYNC_MODE'] = 'threading'
+os.environ['MONGO_URI'] = 'mongomock://localhost/attendance_test'
+os.environ.pop('SOCKETIO_MESSAGE_QUEUE', None)
+os.environ.setdefault('EXPORT_CACHE_DIR', tempfile.mkdtemp(prefix='gdgoc_exports_'))
+
+import mongomock
+import pytest
+
+
+def load_app(name=None):
+    """Import app.py; with a name, as an independent copy like another gunicorn worker."""
+    # app.py opens app.log in the working directory on import
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix='gdgoc_test_'))
+    try:
+        if name:
+            spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, 'app.py'))
+            app = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(app)
+        else:
+            import app
+    finally:
+        os.chdir(cwd)
+    app.app.config['TESTING'] = True
+    # Indexes (unique attendance per event and roll number) and accounts, as on a deploy
+    app.prestart()
+    return app
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    return load_app()
+
+
+@pytest.fixture
+def mongo_db():
+    return mongomock.MongoClient().db
+
+
+def log_in(client, username='GDGADMIN'):
+    with client.session_transaction() as s:
+        s['logged_in'] = True
+        s['username'] = username
+    return client
+
+
+@pytest.fixture
+def client(app_module):
+    return log_in(app_module.app.test_client())
+
+
+@pytest.fixture
+def event_id(app_module):
+    """A new event; every test gets its own, so rosters and stats never overlap."""
+    event_id = str(app_module.events_col.insert_one({'name': 'Test event', 'created_at': datetime.now()}).inserted_id)
+    yield event_id
+    app_module.attendee_changes.pop(event_id)
+
+
+@pytest.fixture
+def enroll(app_module):
+    """enroll(event_id, {roll_number: (name, branch)}) registers students on an event's roster."""
+    def enroll(event_id, students):
+        records = [{'rollNumber': roll, 'name': name, 'branch': branch} for roll, (name, branch) in students.items()]
+        app_module.bulk_upsert_students(records, event_id)
+        app_module.roster_index.add_many(event_id, records)
+        return records
+    return enroll
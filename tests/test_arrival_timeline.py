@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import pytest
+
+START = datetime(2025, 1, 1, 9, 0)
+
+
+@pytest.fixture
+def arrivals(app_module, event_id):
+    """Attendance at fixed times (9:00:10 and 9:00:50 CSE, 9:02:30 ECE) and the event's rebuilt buckets."""
+    app_module.attendance_col.insert_many([
+        {'rollNumber': roll, 'eventId': event_id, 'branch': branch, 'timestamp': START.replace(minute=minute, second=second)}
+        for roll, branch, minute, second in [
+            ('22A21A0501', 'CSE', 0, 10), ('22A21A0502', 'CSE', 0, 50), ('22A21A0403', 'ECE', 2, 30)
+        ]
+    ])
+    app_module.rebuild_arrival_buckets(event_id)
+    return event_id
+
+
+def timeline(client, event_id, **params):
+    return client.get('/api/stats/timeline', query_string={'event_id': event_id, **params})
+
+
+def total_arrivals(app_module, event_id):
+    return sum(bucket['total'] for bucket in app_module.arrival_buckets_col.find({'eventId': event_id}))
+
+
+def test_scan_and_delete_update_the_buckets(app_module, client, event_id, enroll):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE'), '22A21A0402': ('Ravi', 'ECE')})
+
+    client.post('/api/mark_attendance', json={'event_id': event_id, 'roll_number': '22A21A0501'})
+    client.post('/api/mark_attendance/batch', json={'event_id': event_id, 'roll_numbers': ['22A21A0402']})
+
+    assert total_arrivals(app_module, event_id) == 2
+    record = app_module.attendance_col.find_one({'eventId': event_id, 'rollNumber': '22A21A0501'})
+    bucket = app_module.arrival_buckets_col.find_one({'eventId': event_id, 'minute': app_module._arrival_minute(record['timestamp'])})
+    assert bucket['branch_counts']['CSE'] == 1
+
+    res = client.post('/api/delete_student', json={'event_id': event_id, 'roll_number': '22A21A0501'})
+
+    assert res.status_code == 200
+    assert total_arrivals(app_module, event_id) == 1
+    bucket = app_module.arrival_buckets_col.find_one({'_id': bucket['_id']})
+    assert bucket['branch_counts']['CSE'] == 0
+
+
+def test_timeline_lists_minutes_with_arrivals(client, arrivals):
+    res = timeline(client, arrivals)
+
+    assert res.status_code == 200
+    assert res.json == {
+        'event_id': arrivals,
+        'branch': 'ALL',
+        'bucket_seconds': 60,
+        'buckets': [
+            {'minute': '2025-01-01T09:00:00', 'count': 2, 'branch_counts': {'CSE': 2}},
+            {'minute': '2025-01-01T09:02:00', 'count': 1, 'branch_counts': {'ECE': 1}},
+        ]
+    }
+
+
+def test_timeline_filters_by_since_and_branch(client, arrivals):
+    res = timeline(client, arrivals, since='2025-01-01T09:01:30')
+    assert [bucket['minute'] for bucket in res.json['buckets']] == ['2025-01-01T09:02:00']
+
+    res = timeline(client, arrivals, branch='ece')
+    assert res.json['branch'] == 'ECE'
+    assert [bucket['count'] for bucket in res.json['buckets']] == [0, 1]
+
+
+def test_timeline_rejects_bad_requests(app_module, client, arrivals):
+    assert timeline(client, arrivals, since='yesterday').status_code == 400
+    assert client.get('/api/stats/timeline').status_code == 400
+    assert app_module.app.test_client().get('/api/stats/timeline', query_string={'event_id': arrivals}).status_code == 401
+
+
+def test_incremental_buckets_match_a_rebuild(app_module, event_id, arrivals):
+    app_module.arrival_buckets_col.delete_many({'eventId': event_id})
+    app_module.record_arrivals(event_id, list(app_module.attendance_col.find({'eventId': event_id})))
+    incremental = app_module.get_arrival_buckets(event_id)
+
+    app_module.rebuild_arrival_buckets(event_id)
+
+    assert app_module.get_arrival_buckets(event_id) == incremental
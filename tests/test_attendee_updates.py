@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+
+def test_cursor_round_trip(app_module):
+    record = {'_id': ObjectId(), 'timestamp': datetime(2025, 1, 2, 9, 30, 15, 250000)}
+    cursor = app_module.encode_attendee_cursor(record, 42)
+    assert '=' not in cursor
+    assert app_module.decode_attendee_cursor(cursor) == (record['timestamp'], record['_id'], 42)
+
+
+def test_cursor_without_timestamp(app_module):
+    record = {'_id': ObjectId()}
+    cursor = app_module.encode_attendee_cursor(record, 1)
+    assert app_module.decode_attendee_cursor(cursor) == (None, record['_id'], 1)
+
+
+def test_cursor_rejects_garbage(app_module):
+    with pytest.raises(Exception):
+        app_module.decode_attendee_cursor('not-a-cursor')
+
+
+def test_attendee_changes_sorted_by_seq(app_module):
+    changes = app_module.AttendeeChanges(limit=10)
+    changes.add('e1', [{'seq': 3}, {'seq': 4}])
+    changes.add('e1', [{'seq': 1}, {'seq': 2}])
+    changes.add('e2', [{'seq': 7}])
+    assert [d['seq'] for d in changes.pop('e1')] == [1, 2, 3, 4]
+    assert changes.pop('e1') is None
+    assert [d['seq'] for d in changes.pop('e2')] == [7]
+
+
+def test_attendee_changes_overflow_until_popped(app_module):
+    changes = app_module.AttendeeChanges(limit=3)
+    changes.add('e1', [{'seq': 1}, {'seq': 2}])
+    changes.add('e1', [{'seq': 3}, {'seq': 4}])
+    changes.add('e1', [{'seq': 5}])
+    # Past the limit the event sends no deltas, so dashboards reload on the version jump
+    assert changes.pop('e1') is None
+    changes.add('e1', [{'seq': 6}])
+    assert [d['seq'] for d in changes.pop('e1')] == [6]
+
+
+def test_deltas_take_the_versions_of_their_records(app_module, event_id):
+    app_module.rebuild_event_stats(event_id)
+    start = app_module.get_attendance_version(event_id)
+
+    version = app_module.update_event_stats(event_id, attendance={'CSE': 2})
+    assert version == start + 2
+    app_module.record_attendee_deltas(event_id, version, [{'rollNumber': 'A'}, {'rollNumber': 'B'}], 'add')
+
+    version = app_module.update_event_stats(event_id, attendance={'CSE': -1})
+    assert version == start + 3
+    app_module.record_attendee_deltas(event_id, version, [{'rollNumber': 'A'}], 'remove')
+
+    deltas = app_module.attendee_changes.pop(event_id)
+    assert [(d['seq'], d['op'], d['rollNumber']) for d in deltas] == [
+        (start + 1, 'add', 'A'), (start + 2, 'add', 'B'), (start + 3, 'remove', 'A')
+    ]
+    assert app_module.get_event_stats(event_id)['version'] == start + 3
+
+
+def test_no_deltas_without_a_version(app_module, event_id):
+    app_module.record_attendee_deltas(event_id, None, [{'rollNumber': 'A'}], 'add')
+    assert app_module.attendee_changes.pop(event_id) is None
+
+
+def test_stats_of_unknown_events_are_not_created(app_module):
+    missing = str(ObjectId())
+    assert app_module.get_event_stats(missing)['total'] == 0
+    assert app_module.get_attendance_version(missing) == 0
+    assert app_module.event_stats_col.find_one({'_id': missing}) is None
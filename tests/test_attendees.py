@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def marked(app_module, event_id):
+    """Five attendance records, two of them at the same time; the ECE ones are the odd rolls."""
+    start = datetime(2025, 1, 1, 9, 0)
+    records = [
+        {'rollNumber': f'22A21A{"04" if i % 2 else "05"}{i:02d}', 'name': f'Student {i}', 'eventId': event_id,
+         'branch': 'ECE' if i % 2 else 'CSE', 'timestamp': start + timedelta(seconds=min(i, 3))}
+        for i in range(5)
+    ]
+    app_module.attendance_col.insert_many(records)
+    app_module.rebuild_event_stats(event_id)
+    return [r['rollNumber'] for r in records]
+
+
+def attendees(client, event_id, **params):
+    query = '&'.join(f'{k}={v}' for k, v in params.items())
+    return client.get(f'/api/attendees?event_id={event_id}&{query}')
+
+
+def test_pages_follow_the_cursor(client, event_id, marked):
+    rolls, s_nos, cursor = [], [], None
+    while True:
+        params = {'limit': 2, **({'since': cursor} if cursor else {})}
+        page = attendees(client, event_id, **params).json
+        rolls += [r['rollResult'] for r in page['items']]
+        s_nos += [r['s_no'] for r in page['items']]
+        cursor = page['next_cursor']
+        if not page['has_more']:
+            break
+    assert rolls == marked
+    assert s_nos == [1, 2, 3, 4, 5]
+
+
+def test_branch_filter(client, event_id, marked):
+    page = attendees(client, event_id, branch='ECE').json
+    assert [r['rollResult'] for r in page['items']] == marked[1::2]
+    assert all(r['branch'] == 'ECE' for r in page['items'])
+
+
+def test_without_limit_a_full_page_is_returned(app_module, client, event_id, marked, monkeypatch):
+    monkeypatch.setattr(app_module, 'ATTENDEES_PAGE_LIMIT', 3)
+    page = attendees(client, event_id).json
+    assert len(page['items']) == 3
+    assert page['has_more'] is True
+    assert page['version'] == app_module.get_attendance_version(event_id)
+
+
+@pytest.mark.parametrize('params', [{'limit': 'abc'}, {'limit': 0}, {'limit': 1001}, {'since': 'not-a-cursor'}])
+def test_invalid_limit_or_cursor(client, event_id, marked, params):
+    assert attendees(client, event_id, **params).status_code == 400
+
+
+def test_etag_until_attendance_changes(app_module, client, event_id, marked, enroll):
+    first = attendees(client, event_id, limit=10)
+    etag = first.headers['ETag']
+
+    again = client.get(f'/api/attendees?event_id={event_id}&limit=10', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+
+    enroll(event_id, {'22A21A0599': ('New', 'CSE')})
+    client.post('/api/mark_attendance', json={'event_id': event_id, 'roll_number': '22A21A0599'})
+    changed = client.get(f'/api/attendees?event_id={event_id}&limit=10', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.json['items'][-1]['rollResult'] == '22A21A0599'
+    assert changed.headers['ETag'] != etag
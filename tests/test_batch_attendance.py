@@ -0,0 +1,36 @@
+def batch(client, event_id, roll_numbers):
+    return client.post('/api/mark_attendance/batch', json={'event_id': event_id, 'roll_numbers': roll_numbers})
+
+
+def test_batch_reports_each_roll_number(app_module, client, event_id, enroll):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE'), '22A21A0402': ('Ravi', 'ECE'), '22A21A0403': ('Mira', 'ECE')})
+    client.post('/api/mark_attendance', json={'event_id': event_id, 'roll_number': '22A21A0403'})
+
+    res = batch(client, event_id, ['22a21a0501', '22A21A0402', '22A21A0501', '22A21A0403', '22A21A0599', '22A', ''])
+
+    assert res.status_code == 200
+    assert [(r['roll_number'], r['status']) for r in res.json['results']] == [
+        ('22A21A0501', 'SUCCESS'),
+        ('22A21A0402', 'SUCCESS'),
+        ('22A21A0501', 'DUPLICATE'),
+        ('22A21A0403', 'DUPLICATE'),
+        ('22A21A0599', 'NOT_FOUND'),
+        ('22A', 'INVALID'),
+        ('', 'INVALID'),
+    ]
+    assert res.json['results'][0]['name'] == 'Asha'
+    assert 'name' not in res.json['results'][3]
+    assert res.json['summary'] == {'SUCCESS': 2, 'DUPLICATE': 2, 'NOT_FOUND': 1, 'INVALID': 2}
+
+    marked = {r['rollNumber']: r['branch'] for r in app_module.attendance_col.find({'eventId': event_id})}
+    assert marked == {'22A21A0501': 'CSE', '22A21A0402': 'ECE', '22A21A0403': 'ECE'}
+    stats = app_module.get_event_stats(event_id)
+    assert (stats['total'], stats['branch_counts']['CSE'], stats['branch_counts']['ECE']) == (3, 1, 2)
+
+
+def test_batch_request_validation(app_module, client, event_id):
+    assert batch(client, event_id, []).status_code == 400
+    assert client.post('/api/mark_attendance/batch', json={'event_id': event_id, 'roll_numbers': '22A21A0501'}).status_code == 400
+    too_many = [f"22A21A05{i:02d}" for i in range(app_module.ATTENDANCE_BATCH_LIMIT + 1)]
+    assert batch(client, event_id, too_many).status_code == 400
+    assert batch(app_module.app.test_client(), event_id, ['22A21A0501']).status_code == 401
@@ -0,0 +1,63 @@
+import pytest
+
+
+@pytest.fixture
+def delete_event(app_module, client, monkeypatch):
+    """delete_event(event_id) tombstones an event; the test runs the purge itself."""
+    monkeypatch.setattr(app_module.event_purger, 'start', lambda: None)
+
+    def delete_event(event_id):
+        return client.delete(f'/api/events/{event_id}')
+    return delete_event
+
+
+def purge_all(app_module, monkeypatch, batch_size=1):
+    # No workers can still hold a cached roster, so the purge need not wait for them
+    monkeypatch.setattr(app_module, 'ROSTER_INDEX_TTL', 0)
+    purger = app_module.EventPurger(batch_size, pause=0, interval=0, lease=60)
+    while (event := purger._claim()) is not None:
+        assert purger.purge(event)
+
+
+def test_deleted_event_rejects_scans_and_is_hidden(app_module, client, event_id, enroll, delete_event):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE'), '22A21A0502': ('Ravi', 'CSE')})
+    client.post('/api/mark_attendance', json={'event_id': event_id, 'roll_number': '22A21A0501'})
+
+    res = delete_event(event_id)
+
+    assert res.status_code == 202
+    assert res.json['purge']['state'] == 'pending'
+    assert res.json['purge']['total'] == {'students': 2, 'attendance': 1}
+    not_found = {'error': 'Event not found'}
+    res = client.post('/api/mark_attendance', json={'event_id': event_id, 'roll_number': '22A21A0502'})
+    assert (res.status_code, res.json) == (404, not_found)
+    res = client.post('/api/mark_attendance/batch', json={'event_id': event_id, 'roll_numbers': ['22A21A0502']})
+    assert (res.status_code, res.json) == (404, not_found)
+    res = client.post('/api/add_student', json={'event_id': event_id, 'roll_number': '22A21A0502', 'name': 'Ravi'})
+    assert (res.status_code, res.json) == (404, not_found)
+    assert app_module.attendance_col.count_documents({'eventId': event_id}) == 1
+    assert event_id not in [event['_id'] for event in client.get('/api/events').json]
+
+
+def test_event_is_deleted_once(event_id, delete_event):
+    assert delete_event(event_id).status_code == 202
+
+    assert delete_event(event_id).status_code == 404
+    assert delete_event('not-an-id').status_code == 400
+
+
+def test_purge_removes_the_roster_and_attendance(app_module, client, event_id, enroll, delete_event, monkeypatch):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE'), '22A21A0502': ('Ravi', 'CSE'), '22A21A0403': ('Mira', 'ECE')})
+    client.post('/api/mark_attendance/batch', json={'event_id': event_id, 'roll_numbers': ['22A21A0501', '22A21A0403']})
+    delete_event(event_id)
+
+    purge_all(app_module, monkeypatch, batch_size=2)
+
+    for collection in (app_module.students_col, app_module.attendance_col, app_module.arrival_buckets_col):
+        assert collection.count_documents({'eventId': event_id}) == 0
+    assert app_module.event_stats_col.find_one({'_id': event_id}) is None
+    status = client.get(f'/api/events/{event_id}/purge').json
+    assert status['state'] == 'done'
+    assert status['deleted'] == {'students': 3, 'attendance': 2}
+    # The registry outlives the event
+    assert app_module.registry_col.find_one({'_id': '22A21A0403'}) is not None
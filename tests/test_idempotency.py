@@ -0,0 +1,98 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def key():
+    # Keys are stored per endpoint and admin, and every test uses the same admin
+    return uuid.uuid4().hex
+
+
+def scan(client, event_id, roll_number, key):
+    return client.post('/api/mark_attendance', json={'event_id': event_id, 'roll_number': roll_number},
+                       headers={'Idempotency-Key': key})
+
+
+def test_retry_replays_the_stored_response(app_module, client, event_id, enroll, key):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE')})
+
+    first = scan(client, event_id, '22A21A0501', key)
+    retry = scan(client, event_id, '22A21A0501', key)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json == first.json == {'status': 'SUCCESS', 'name': 'Asha', 'branch': 'CSE'}
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert app_module.attendance_col.count_documents({'eventId': event_id}) == 1
+    assert app_module.get_event_stats(event_id)['total'] == 1
+
+    stored = app_module.idempotency_col.find_one({'_id': f'mark_attendance_api:GDGADMIN:{key}'})
+    assert (stored['state'], stored['status'], stored['body']) == ('done', 200, first.json)
+
+
+def test_new_key_runs_the_handler_again(client, event_id, enroll, key):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE')})
+    scan(client, event_id, '22A21A0501', key)
+
+    res = scan(client, event_id, '22A21A0501', key + '-2')
+
+    assert res.status_code == 409
+    assert 'Idempotent-Replayed' not in res.headers
+
+
+def test_key_reused_for_another_request(client, event_id, enroll, key):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE'), '22A21A0502': ('Ravi', 'CSE')})
+    scan(client, event_id, '22A21A0501', key)
+
+    res = scan(client, event_id, '22A21A0502', key)
+
+    assert res.status_code == 422
+
+
+def test_request_in_progress(app_module, client, event_id, enroll, key):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE')})
+    body = f'{{"event_id": "{event_id}", "roll_number": "22A21A0501"}}'.encode()
+    pending = {
+        '_id': f'mark_attendance_api:GDGADMIN:{key}', 'state': 'pending',
+        'request_hash': app_module.hashlib.sha256(body).hexdigest(), 'created_at': datetime.now()
+    }
+    app_module.idempotency_col.insert_one(pending)
+
+    def send():
+        return client.post('/api/mark_attendance', data=body, content_type='application/json',
+                           headers={'Idempotency-Key': key})
+    assert send().status_code == 409
+    assert app_module.attendance_col.count_documents({'eventId': event_id}) == 0
+
+    # A request that never finished is taken over after IDEMPOTENCY_PENDING_TIMEOUT
+    stale = datetime.now() - timedelta(seconds=app_module.IDEMPOTENCY_PENDING_TIMEOUT + 1)
+    app_module.idempotency_col.update_one({'_id': pending['_id']}, {'$set': {'created_at': stale}})
+    assert send().status_code == 200
+    assert app_module.attendance_col.count_documents({'eventId': event_id}) == 1
+
+
+def test_batch_retry_is_replayed(app_module, client, event_id, enroll, key):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE')})
+    body = {'event_id': event_id, 'roll_numbers': ['22A21A0501']}
+
+    first = client.post('/api/mark_attendance/batch', json=body, headers={'Idempotency-Key': key})
+    retry = client.post('/api/mark_attendance/batch', json=body, headers={'Idempotency-Key': key})
+
+    assert retry.json == first.json
+    assert retry.json['summary'] == {'SUCCESS': 1}
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+
+
+def test_server_errors_are_not_stored(app_module, client, event_id, enroll, monkeypatch, key):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE')})
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('write failed')
+    monkeypatch.setattr(app_module.attendance_col, 'insert_one', fail)
+    assert scan(client, event_id, '22A21A0501', key).status_code == 500
+    assert app_module.idempotency_col.find_one({'_id': f'mark_attendance_api:GDGADMIN:{key}'}) is None
+
+    monkeypatch.undo()
+    assert scan(client, event_id, '22A21A0501', key).status_code == 200
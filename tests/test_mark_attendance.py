@@ -0,0 +1,72 @@
+def scan(client, event_id, roll_number, **kwargs):
+    return client.post('/api/mark_attendance', json={'event_id': event_id, 'roll_number': roll_number}, **kwargs)
+
+
+def test_scan_marks_a_roster_student(app_module, client, event_id, enroll):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE')})
+
+    res = scan(client, event_id, ' 22a21a0501 ')
+
+    assert res.status_code == 200
+    assert res.json == {'status': 'SUCCESS', 'name': 'Asha', 'branch': 'CSE'}
+    record = app_module.attendance_col.find_one({'eventId': event_id})
+    assert (record['rollNumber'], record['name'], record['branch']) == ('22A21A0501', 'Asha', 'CSE')
+    assert record['date'] == app_module.get_today_str()
+    stats = app_module.get_event_stats(event_id)
+    assert (stats['total'], stats['branch_counts']['CSE'], stats['total_students']) == (1, 1, 1)
+
+
+def test_duplicate_scan_is_rejected(app_module, client, event_id, enroll):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE')})
+    scan(client, event_id, '22A21A0501')
+
+    res = scan(client, event_id, '22A21A0501')
+
+    assert res.status_code == 409
+    assert res.json['already_marked'] is True
+    assert app_module.attendance_col.count_documents({'eventId': event_id}) == 1
+    assert app_module.get_event_stats(event_id)['total'] == 1
+
+
+def test_student_not_on_the_roster(app_module, client, event_id, enroll):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE')})
+
+    res = scan(client, event_id, '22A21A0599')
+
+    assert res.status_code == 404
+    assert res.json == {'status': 'NOT_FOUND', 'roll_number': '22A21A0599'}
+    assert app_module.attendance_col.count_documents({'eventId': event_id}) == 0
+
+
+def test_invalid_scans(client, event_id):
+    assert scan(client, event_id, '22A21').status_code == 400
+    assert client.post('/api/mark_attendance', json={'event_id': event_id}).status_code == 400
+    assert scan(client.application.test_client(), event_id, '22A21A0501').status_code == 401
+
+
+def test_member_added_by_another_worker_is_found(app_module, client, event_id, enroll):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE')})
+    # Loads the roster into this process's index
+    scan(client, event_id, '22A21A0501')
+    # Written by another worker: not in this process's cached roster
+    app_module.registry_col.replace_one({'_id': '22A21A0402'}, {'name': 'Ravi', 'branch': 'ECE'}, upsert=True)
+    app_module.students_col.insert_one({'rollNumber': '22A21A0402', 'eventId': event_id})
+
+    res = scan(client, event_id, '22A21A0402')
+
+    assert res.status_code == 200
+    assert res.json['name'] == 'Ravi'
+
+
+def test_failed_roster_load_is_retried(app_module, client, event_id, enroll, monkeypatch):
+    enroll(event_id, {'22A21A0501': ('Asha', 'CSE')})
+    app_module.roster_index.drop(event_id)
+
+    def timeout(roll_numbers):
+        raise TimeoutError('MongoDB timed out')
+    monkeypatch.setattr(app_module, 'registry_lookup', timeout)
+    assert scan(client, event_id, '22A21A0501').status_code == 500
+    assert event_id not in app_module.roster_index.load_locks
+
+    monkeypatch.undo()
+    assert scan(client, event_id, '22A21A0501').status_code == 200
@@ -0,0 +1,122 @@
+import queue
+import time
+import uuid
+
+import socketio
+
+from conftest import load_app, log_in
+from message_queue import LoopbackManager, socketio_queue_options
+
+
+def make_server(channel, write_only=False):
+    """A Socket.IO server on the loopback queue whose received broadcasts land in .received."""
+    manager = LoopbackManager(channel=channel, write_only=write_only)
+    server = socketio.Server(async_mode='threading', client_manager=manager)
+    server.received = queue.Queue()
+    manager._handle_emit = server.received.put
+    server.manager_initialized = True
+    manager.initialize()
+    return server
+
+
+def test_broadcast_reaches_other_servers():
+    channel = uuid.uuid4().hex
+    sender, receiver = make_server(channel), make_server(channel)
+    data = {'event_id': 'e1', 'total': 3}
+
+    sender.emit('update_counts', data, room='e1')
+
+    message = receiver.received.get(timeout=2)
+    assert message['event'] == 'update_counts'
+    assert message['room'] == 'e1'
+    # Payloads travel as argument lists, serialized like on the real backends
+    assert message['data'] == [data]
+    assert message['data'][0] is not data
+    assert message['host_id'] == sender.manager.host_id
+
+
+def test_sender_handles_its_own_broadcast_once():
+    channel = uuid.uuid4().hex
+    sender, receiver = make_server(channel), make_server(channel)
+
+    sender.emit('update_counts', {'total': 1}, room='e1')
+
+    assert receiver.received.get(timeout=2)['data'] == [{'total': 1}]
+    # Delivered locally by emit(); the copy from the queue is skipped by host_id
+    assert sender.received.get(timeout=2)['data'] == [{'total': 1}]
+    assert sender.received.empty()
+
+
+def test_channels_are_isolated():
+    sender = make_server(uuid.uuid4().hex)
+    other = make_server(uuid.uuid4().hex)
+
+    sender.emit('update_counts', {'total': 1}, room='e1')
+
+    sender.received.get(timeout=2)
+    assert other.received.empty()
+
+
+def test_write_only_manager_does_not_subscribe():
+    channel = uuid.uuid4().hex
+    make_server(channel, write_only=True)
+    assert channel not in LoopbackManager._subscribers
+
+    make_server(channel)
+    assert len(LoopbackManager._subscribers[channel]) == 1
+
+
+def test_socketio_queue_options():
+    assert socketio_queue_options(None) == {}
+    assert socketio_queue_options('redis://localhost:6379/0', channel='c') == {
+        'message_queue': 'redis://localhost:6379/0', 'channel': 'c'
+    }
+    options = socketio_queue_options('loopback://', channel='c')
+    assert isinstance(options['client_manager'], LoopbackManager)
+    assert options['client_manager'].channel == 'c'
+
+
+
+def wait_for_counts(listener, event_id, total, timeout=5):
+    """The update_counts payload for event_id with `total` that listener received, or None."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        message = listener.receive(deadline - time.monotonic())
+        if message and message[0] == 'update_counts' and message[1].get('event_id') == event_id:
+            if message[1]['total'] == total:
+                return message[1]
+    return None
+
+
+def test_scan_on_one_worker_updates_a_dashboard_on_another(app_module, monkeypatch):
+    # Reuses bench.py's fanout helpers: Flask-SocketIO's test client refuses to
+    # run on a message queue, so worker B is served on a local port instead
+    from bench import SocketListener, serve_worker
+
+    monkeypatch.setenv('SOCKETIO_MESSAGE_QUEUE', 'loopback://')
+    monkeypatch.setenv('COUNTS_FLUSH_INTERVAL_MS', '0')
+    worker_a, worker_b = load_app('fanout_worker_a'), load_app('fanout_worker_b')
+    assert isinstance(worker_b.socketio.server.manager, LoopbackManager)
+
+    event_id = str(worker_a.events_col.insert_one({'name': 'Fanout'}).inserted_id)
+    worker_a.bulk_upsert_students([{'rollNumber': '22A21A0501', 'name': 'Asha', 'branch': 'CSE'}], event_id)
+
+    base_url = serve_worker(worker_b)
+    dashboard, bystander = SocketListener(base_url), SocketListener(base_url)
+    try:
+        dashboard.emit('join_event', {'event_id': event_id})
+        # The join is handled before the scan's broadcast arrives
+        time.sleep(0.2)
+        scanner = log_in(worker_a.app.test_client())
+
+        res = scanner.post('/api/mark_attendance', json={'event_id': event_id, 'roll_number': '22A21A0501'})
+
+        assert res.status_code == 200
+        counts = wait_for_counts(dashboard, event_id, total=1)
+        assert counts is not None
+        assert counts['branch_counts']['CSE'] == 1
+        # Only clients in the event room get its counts
+        assert wait_for_counts(bystander, event_id, total=1, timeout=0.3) is None
+    finally:
+        dashboard.close()
+        bystander.close()
@@ -0,0 +1,141 @@
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import migrations
+from migrations import LOCK_ID
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(migrations, '_registry', registry)
+    return registry
+
+
+@pytest.fixture
+def collection(mongo_db):
+    return mongo_db['migrations']
+
+
+def lock(collection):
+    return collection.find_one({'_id': LOCK_ID})
+
+
+def test_acquire_while_held_and_after_expiry(collection):
+    assert migrations._acquire(collection, 'a', lease=60)
+    assert not migrations._acquire(collection, 'b', lease=60)
+    assert lock(collection)['owner'] == 'a'
+
+    collection.update_one({'_id': LOCK_ID}, {'$set': {'expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+    assert migrations._acquire(collection, 'b', lease=60)
+    assert lock(collection)['owner'] == 'b'
+
+
+def test_only_the_owner_renews_and_releases(collection):
+    migrations._acquire(collection, 'a', lease=1)
+    expires_at = lock(collection)['expires_at']
+
+    migrations._renew(collection, 'b', lease=60)
+    migrations._release(collection, 'b')
+    assert lock(collection)['expires_at'] == expires_at
+
+    migrations._renew(collection, 'a', lease=60)
+    assert lock(collection)['expires_at'] > expires_at
+    migrations._release(collection, 'a')
+    assert lock(collection) is None
+
+
+def test_run_applies_pending_migrations_once(registry, collection):
+    calls = []
+    migrations.migration(2, 'second')(lambda: calls.append(2))
+    migrations.migration(1, 'first')(lambda: calls.append(1))
+
+    assert migrations.run(collection, log=lambda message: None) == [1, 2]
+    assert migrations.run(collection, log=lambda message: None) == []
+    assert calls == [1, 2]
+    assert [version for version, _, applied_at in migrations.status(collection) if applied_at] == [1, 2]
+    assert lock(collection) is None
+
+
+def test_duplicate_versions_are_rejected(registry):
+    def first():
+        pass
+
+    def other():
+        pass
+    migrations.migration(1, 'first')(first)
+    with pytest.raises(ValueError):
+        migrations.migration(1, 'other')(other)
+
+
+def test_failed_migration_is_retried_next_run(registry, collection):
+    def broken():
+        raise RuntimeError('boom')
+    migrations.migration(1, 'broken')(broken)
+
+    with pytest.raises(RuntimeError):
+        migrations.run(collection, log=lambda message: None)
+    assert lock(collection) is None
+    assert [version for version, _, _ in migrations.pending(collection)] == [1]
+
+
+def test_run_waits_for_the_lease_holder(registry, collection):
+    migrations.migration(1, 'first')(lambda: pytest.fail('applied twice'))
+    migrations._acquire(collection, 'other', lease=60)
+
+    def other_finishes(seconds):
+        collection.insert_one({'_id': 1, 'description': 'first', 'applied_at': datetime.utcnow()})
+        migrations._release(collection, 'other')
+
+    assert migrations.run(collection, log=lambda message: None, sleep=other_finishes) == []
+
+
+def test_run_times_out_while_the_lease_is_held(registry, collection):
+    migrations.migration(1, 'first')(lambda: None)
+    migrations._acquire(collection, 'other', lease=60)
+
+    with pytest.raises(RuntimeError):
+        migrations.run(collection, log=lambda message: None, wait_timeout=-1, sleep=lambda seconds: None)
+    assert lock(collection)['owner'] == 'other'
+
+
+def test_heartbeat_keeps_a_slow_migration_leased(registry, collection):
+    leased = []
+
+    def slow():
+        time.sleep(0.5)
+        leased.append(lock(collection)['expires_at'] > datetime.utcnow())
+        # Another process cannot take over while the holder is alive
+        leased.append(not migrations._acquire(collection, 'other', lease=60))
+    migrations.migration(1, 'slow')(slow)
+
+    assert migrations.run(collection, log=lambda message: None, lease=0.3) == [1]
+    assert leased == [True, True]
+
+
+def test_prestart_raises_when_a_migration_fails(app_module, monkeypatch):
+    def broken(collection, log):
+        raise RuntimeError('boom')
+    monkeypatch.setattr(migrations, 'run', broken)
+    app_module.admins_col.update_one({'username': 'GDGADMIN'}, {'$set': {'is_logged_in': True}})
+
+    with pytest.raises(RuntimeError):
+        app_module.prestart()
+    # Nothing after the migrations ran
+    assert app_module.admins_col.find_one({'username': 'GDGADMIN'})['is_logged_in']
+    app_module.admins_col.update_one({'username': 'GDGADMIN'}, {'$set': {'is_logged_in': False}})
+
+
+def test_gunicorn_refuses_to_start_after_a_failed_prestart(monkeypatch):
+    import gunicorn_config
+
+    class Server:
+        class log:
+            error = staticmethod(lambda message, *args: None)
+    monkeypatch.setattr(gunicorn_config.subprocess, 'run', lambda args, **kwargs: subprocess.CompletedProcess(args, 1))
+
+    with pytest.raises(RuntimeError):
+        gunicorn_config.on_starting(Server())
@@ -0,0 +1,102 @@
+import query_audit
+from query_audit import query_shape
+
+
+def ixscan(index='eventId_1_rollNumber_1'):
+    return {'stage': 'IXSCAN', 'indexName': index}
+
+
+def test_winning_plans_finds_nested_and_sbe_plans():
+    explain = {
+        'stages': [
+            {'$cursor': {'queryPlanner': {'winningPlan': {'stage': 'FETCH', 'inputStage': ixscan()}}}},
+            {'$group': {}},
+        ],
+        'shards': {
+            's1': {'queryPlanner': {'winningPlan': {'queryPlan': {'stage': 'COLLSCAN'}, 'slotBasedPlan': {}}}}
+        },
+    }
+    plans = query_audit.winning_plans(explain)
+    assert [query_audit.plan_stages(plan) for plan in plans] == [['FETCH', 'IXSCAN'], ['COLLSCAN']]
+
+
+def test_plan_stages_walks_every_branch():
+    plan = {'stage': 'SORT_MERGE', 'inputStages': [
+        {'stage': 'FETCH', 'inputStage': ixscan()},
+        {'stage': 'PROJECTION_COVERED', 'inputStage': ixscan()},
+    ]}
+    assert query_audit.plan_stages(plan) == ['SORT_MERGE', 'FETCH', 'IXSCAN', 'PROJECTION_COVERED', 'IXSCAN']
+
+
+def test_plan_problems():
+    shape = query_shape('roster', 'students', covered=True)
+    assert query_audit.plan_problems(shape, ['PROJECTION_COVERED', 'IXSCAN']) == []
+    assert query_audit.plan_problems(shape, ['FETCH', 'IXSCAN']) == ['FETCH']
+    assert query_audit.plan_problems(shape, ['SORT', 'COLLSCAN']) == ['COLLSCAN', 'SORT']
+
+    allowed = query_shape('admins', 'admins', allow=['COLLSCAN'])
+    assert query_audit.plan_problems(allowed, ['COLLSCAN']) == []
+
+
+def test_proposed_indexes_skips_clean_and_duplicate_shapes():
+    index = [('eventId', 1), ('rollNumber', 1)]
+    first = query_shape('roster load', 'students', index=index)
+    second = query_shape('student count', 'students', index=index)
+    clean = query_shape('registry', 'student_registry', index=[('_id', 1)])
+    unindexed = query_shape('admins', 'admins')
+    results = [
+        (first, ['COLLSCAN'], ['COLLSCAN']),
+        (second, ['COLLSCAN'], ['COLLSCAN']),
+        (clean, ['IDHACK'], []),
+        (unindexed, ['COLLSCAN'], ['COLLSCAN']),
+    ]
+    assert query_audit.proposed_indexes(results) == [('students', index)]
+
+
+def test_explain_command():
+    shape = query_shape('attendees', 'attendance', filter={'eventId': 'e1'}, projection={'_id': 1},
+                        sort=[('timestamp', 1), ('_id', 1)], limit=101)
+    assert query_audit.explain_command(shape) == {
+        'find': 'attendance', 'filter': {'eventId': 'e1'}, 'projection': {'_id': 1},
+        'sort': {'timestamp': 1, '_id': 1}, 'limit': 101,
+    }
+    count = query_shape('count', 'students', op='count', filter={'eventId': 'e1'})
+    assert query_audit.explain_command(count) == {'count': 'students', 'query': {'eventId': 'e1'}}
+
+
+def test_report_flags_problems():
+    shape = query_shape('roster load', 'students', covered=True)
+    lines = query_audit.format_report([(shape, ['FETCH', 'IXSCAN'], ['FETCH'])])
+    assert lines[0].startswith('FLAG')
+    assert 'FETCH <- IXSCAN' in lines[0]
+    assert lines[1].strip() == '- ' + query_audit.PROBLEMS['FETCH']
+
+
+def test_seed_matches_the_sample_values(mongo_db):
+    query_audit.seed(mongo_db, 10)
+    for event_id in (query_audit.AUDIT_EVENT_ID, query_audit.OTHER_EVENT_ID):
+        assert mongo_db['students'].count_documents({'eventId': event_id}) == 10
+        assert mongo_db['attendance'].count_documents({'eventId': event_id}) == 10
+    assert mongo_db['attendance'].count_documents({'branch': query_audit.AUDIT_BRANCH}) > 0
+    assert mongo_db['student_registry'].count_documents({}) == 10
+    assert mongo_db['admins'].count_documents({}) == query_audit.SEED_ADMINS
+
+
+def test_app_query_shapes_are_well_formed(app_module):
+    collections = {name for name, _, _ in app_module.INDEXES}
+    for shape in app_module.QUERY_SHAPES:
+        query_audit.explain_command(shape)
+        assert set(shape['allow']) <= set(query_audit.PROBLEMS)
+        if shape['index']:
+            assert shape['collection'] in collections
+
+
+def test_every_proposed_index_is_created(app_module):
+    # A shape's index is covered by an INDEXES entry on its collection that starts with the same keys
+    for shape in app_module.QUERY_SHAPES:
+        if shape['index']:
+            index = list(shape['index'])
+            assert any(
+                name == shape['collection'] and list(keys[:len(index)]) == index
+                for name, keys, _ in app_module.INDEXES
+            ), f"{shape['name']}: no index on {shape['collection']} starts with {index}"
@@ -0,0 +1,60 @@
+import pandas as pd
+
+
+def test_prepare_roster_cleans_and_detects_branches(app_module):
+    df = pd.DataFrame({
+        'Roll Number': [' 22a21a0501 ', 22.0, '22A21A6102'],
+        'Name': [' Asha ', 'Short', 'Ravi'],
+    })
+    records, report = app_module.prepare_roster(df)
+    assert records == [
+        {'rollNumber': '22A21A0501', 'name': 'Asha', 'branch': 'CSE'},
+        {'rollNumber': '22', 'name': 'Short', 'branch': 'UNKNOWN'},
+        {'rollNumber': '22A21A6102', 'name': 'Ravi', 'branch': 'AIML'},
+    ]
+    assert report == {'rows': 3, 'duplicates': 0, 'duplicate_rows': [], 'invalid': 0, 'invalid_rows': []}
+
+
+def test_prepare_roster_matches_the_per_row_rules(app_module):
+    rolls = ['22a21a0501', '22A21A0402', '22A21A0103', '22A21A9904']
+    records, _ = app_module.prepare_roster(pd.DataFrame({'Roll Number': rolls, 'Name': ['N'] * len(rolls)}))
+    for roll, record in zip(rolls, records):
+        clean = app_module.clean_roll_number(roll)
+        assert record['rollNumber'] == clean
+        assert record['branch'] == app_module.normalize_branch(app_module.detect_branch(clean))
+
+
+def test_prepare_roster_branch_column_and_aliases(app_module):
+    df = pd.DataFrame({
+        'Roll Number': ['22A21A0501', '22A21A0502', '22A21A0503'],
+        'Name': ['A', 'B', 'C'],
+        'Branch': [' aim ', None, 'ece'],
+    })
+    records, _ = app_module.prepare_roster(df)
+    assert [r['branch'] for r in records] == ['AIML', 'CSE', 'ECE']
+
+
+def test_prepare_roster_reports_skipped_rows(app_module):
+    df = pd.DataFrame({
+        'Roll Number': ['22A21A0501', None, '22a21a0501', '  ', '22A21A0502'],
+        'Name': ['A', 'B', 'A again', 'D', None],
+    })
+    records, report = app_module.prepare_roster(df)
+    assert [r['rollNumber'] for r in records] == ['22A21A0501']
+    # Excel rows: the header is row 1
+    assert report == {'rows': 5, 'duplicates': 1, 'duplicate_rows': [4], 'invalid': 3, 'invalid_rows': [3, 5, 6]}
+
+
+def test_bulk_upsert_students_writes_only_changes(app_module, event_id):
+    records = [
+        {'rollNumber': '22A21A0511', 'name': 'Asha', 'branch': 'CSE'},
+        {'rollNumber': '22A21A0412', 'name': 'Ravi', 'branch': 'ECE'},
+    ]
+    first = app_module.bulk_upsert_students(records, event_id)
+    assert (first['inserted'], first['updated'], first['unchanged']) == (2, 0, 0)
+
+    records[1] = dict(records[1], name='Ravi K')
+    second = app_module.bulk_upsert_students(records, event_id)
+    assert (second['inserted'], second['updated'], second['unchanged']) == (0, 1, 1)
+    assert app_module.students_col.count_documents({'eventId': event_id}) == 2
+    assert app_module.registry_col.find_one({'_id': '22A21A0412'})['name'] == 'Ravi K'
@@ -0,0 +1,85 @@
+import io
+import uuid
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def roll():
+    # The registry is shared by every event, so each test registers its own student
+    return '22A21A05' + uuid.uuid4().hex[:4].upper()
+
+
+def add_student(client, event_id, roll_number, name):
+    return client.post('/api/add_student', json={'event_id': event_id, 'roll_number': roll_number, 'name': name})
+
+
+def roster_sheet(rows):
+    buffer = io.BytesIO()
+    pd.DataFrame(rows, columns=['Roll Number', 'Name', 'Branch']).to_excel(buffer, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+def test_add_student_registers_and_marks_a_new_student(app_module, client, event_id, roll):
+    res = add_student(client, event_id, roll.lower(), 'Asha')
+
+    assert res.status_code == 200
+    assert app_module.registry_col.find_one({'_id': roll}, {'_id': 0, 'name': 1, 'branch': 1}) == {'name': 'Asha', 'branch': 'CSE'}
+    assert app_module.students_col.count_documents({'eventId': event_id, 'rollNumber': roll}) == 1
+    record = app_module.attendance_col.find_one({'eventId': event_id, 'rollNumber': roll})
+    assert (record['name'], record['branch']) == ('Asha', 'CSE')
+    stats = app_module.get_event_stats(event_id)
+    assert (stats['total'], stats['total_students']) == (1, 1)
+
+
+def test_add_student_keeps_the_registered_name_and_branch(app_module, client, event_id, roll):
+    app_module.registry_col.insert_one({'_id': roll, 'name': 'Asha Rao', 'branch': 'ECE'})
+
+    res = add_student(client, event_id, roll, 'A. Rao')
+
+    assert res.status_code == 200
+    assert app_module.registry_col.find_one({'_id': roll})['name'] == 'Asha Rao'
+    record = app_module.attendance_col.find_one({'eventId': event_id, 'rollNumber': roll})
+    assert (record['name'], record['branch']) == ('Asha Rao', 'ECE')
+    assert app_module.get_event_stats(event_id)['branch_counts']['ECE'] == 1
+
+
+def test_duplicate_add_student_leaves_the_registry_and_roster_untouched(app_module, client, event_id, roll):
+    add_student(client, event_id, roll, 'Asha')
+
+    res = add_student(client, event_id, roll, 'Someone else')
+
+    assert res.status_code == 409
+    assert res.json['already_marked'] is True
+    assert app_module.registry_col.find_one({'_id': roll})['name'] == 'Asha'
+    assert app_module.students_col.count_documents({'eventId': event_id, 'rollNumber': roll}) == 1
+    stats = app_module.get_event_stats(event_id)
+    assert (stats['total'], stats['total_students']) == (1, 1)
+
+
+def test_add_student_to_a_missing_event(client, roll):
+    res = add_student(client, '5f0000000000000000000000', roll, 'Asha')
+
+    assert res.status_code == 404
+
+
+def test_upload_students_writes_the_registry_and_roster(app_module, client, event_id, roll):
+    other = roll[:-4] + uuid.uuid4().hex[:4].upper()
+    sheet = roster_sheet([[roll, 'Asha', 'CSE'], [other, 'Ravi', 'ECE'], [roll, 'Asha', 'CSE'], [None, 'Nobody', 'CSE']])
+
+    res = client.post('/api/upload_students', data={'event_id': event_id, 'file': (sheet, 'roster.xlsx')})
+
+    assert res.status_code == 200
+    assert res.json['count'] == 2
+    assert (res.json['result']['inserted'], res.json['result']['duplicates'], res.json['result']['invalid']) == (2, 1, 1)
+    assert app_module.registry_col.find_one({'_id': other})['name'] == 'Ravi'
+    assert app_module.students_col.count_documents({'eventId': event_id}) == 2
+    assert app_module.get_event_stats(event_id)['total_students'] == 2
+
+    # The same sheet again writes nothing
+    sheet = roster_sheet([[roll, 'Asha', 'CSE'], [other, 'Ravi', 'ECE']])
+    res = client.post('/api/upload_students', data={'event_id': event_id, 'file': (sheet, 'roster.xlsx')})
+    assert res.json['result']['unchanged'] == 2
+    assert app_module.get_event_stats(event_id)['total_students'] == 2